@@ -45,6 +45,8 @@ def create_app(config_name=None):
         with app.app_context():
             db.create_all()
             print("✅ Database tables created")
+            for table, column in models.upgrade_schema():
+                print(f"✅ Added column {table}.{column}")
             
     except ImportError as e:
         print(f"❌ Could not import models.py: {e}")
@@ -85,8 +87,9 @@ def register_page_routes(app):
     def match_page(match_id):
         try:
             from models import Match
+            from simengine.formats import get_format
             match = Match.query.filter_by(match_id=match_id).first_or_404()
-            return render_template('match.html', match=match)
+            return render_template('match.html', match=match, match_format=get_format(match.match_type))
         except ImportError:
             return "Error: Could not load match data", 500
 
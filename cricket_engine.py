@@ -9,6 +9,14 @@ from simengine.batting_score import BattingScore
 from simengine.bowling_figures import BowlingFigures
 from simengine.player_and_team import TeamObject, PlayerObject
 from simengine.innings import InningsState, Game
+from simengine.rng import MatchRNG
+from simengine.matchup_table import MatchupTable
+from simengine import joint_outcomes
+from simengine import innings_dp
+from simengine import match_runner
+from simengine import super_over
+from simengine.replay import DecisionLog
+from simengine.formats import get_format
 
 EASY_BOWLING_ON = False
 
@@ -17,19 +25,27 @@ class CricketGameEngine:
     Integration wrapper for Python cricket simulation logic.
     '''
     
-    def __init__(self, match):
+    def __init__(self, match, seed=None):
         from models import Match  # Match is the database model
         self.match = match
-        self.max_overs = 20 if self.match.match_type == 'T20' else 50
+        # Every random draw for this match comes from this stream, so a seed reproduces the match
+        self.rng = MatchRNG(seed)
+        self.match_format = get_format(self.match.match_type)
+        self.max_overs = self.match_format.overs
+        # With the seed, the captains' decisions are all that is needed to replay the match (simengine/replay.py)
+        self.decision_log = DecisionLog(balls_per_over=self.match_format.balls_per_over)
 
         home_team = self._build_team(match.team1)
         away_team = self._build_team(match.team2)
 
-        self.game = Game(home_team, away_team)        
+        self.game = Game(home_team, away_team, self.rng)
         
         # Apply location adjustments using location_short_code
         self.location_multipliers = self.apply_location_adjustments(match.location_short_code)
 
+        # Every striker x bowler pairing of both innings, compiled once the adjusted attributes are known
+        self.refresh_matchup_tables()
+
         # Weather and pitch conditions (can change during match)
         self.pitch_condition = 'normal'  # normal, dry, wet, deteriorating
         self.weather_condition = 'clear'  # clear, overcast, rainy
@@ -83,14 +99,22 @@ class CricketGameEngine:
             'pace': 1.0
         }
 
+    def toss(self, calling_team_id: int, call: str) -> str:
+        '''Toss the coin from the match's random stream'''
+        self.decision_log.record('toss', calling_team_id, call)
+        return 'heads' if self.rng.random() < 0.5 else 'tails'
+
+    def record_toss_decision(self, decision: str):
+        self.decision_log.record('toss_decision', decision)
+
     def start_first_innings(self, batting_first_id, batting_second_id):
         batting_team = self.game.home_team if batting_first_id == self.game.home_team.team_id else self.game.away_team
         bowling_team = self.game.away_team if batting_first_id == self.game.home_team.team_id else self.game.home_team
-        first_innings = InningsState(1, self.max_overs, batting_team, bowling_team, self.game.home_team.players[0], self.game.home_team.players[1], 0, EASY_BOWLING_ON)
+        first_innings = InningsState(1, self.max_overs, batting_team, bowling_team, self.game.home_team.players[0], self.game.home_team.players[1], 0, EASY_BOWLING_ON, self.rng, self.match_format)
         self.game.set_first_innings(first_innings)
 
     def start_second_innings(self):
-        second_innings = InningsState(2, self.max_overs, self.game.first_innings.fielding_team, self.game.first_innings.batting_team, self.game.home_team.players[0], self.game.home_team.players[1], self.game.first_innings.total_runs + 1, EASY_BOWLING_ON)
+        second_innings = InningsState(2, self.max_overs, self.game.first_innings.fielding_team, self.game.first_innings.batting_team, self.game.home_team.players[0], self.game.home_team.players[1], self.game.first_innings.total_runs + 1, EASY_BOWLING_ON, self.rng, self.match_format)
         self.game.set_second_innings(second_innings)
 
     
@@ -126,7 +150,7 @@ class CricketGameEngine:
         # Update ball count
         if delivery_result.extras == 0:
             self.current_ball += 1
-            if self.current_ball > 6:
+            if self.current_ball > self.match_format.balls_per_over:
                 self.current_ball = 1
                 self.current_over += 1
                 
@@ -142,7 +166,7 @@ class CricketGameEngine:
             self.consecutive_boundaries = 0
 
         # Innings state update
-        if self.wickets_lost == 10 or self.balls_faced == self.max_overs * 6:
+        if self.wickets_lost == 10 or self.balls_faced == self.match_format.total_balls:
             self.current_innings = 2
             self.current_over = 0
             self.current_ball = 0
@@ -167,12 +191,108 @@ class CricketGameEngine:
         # Reset partnership when new batsmen come in
         self.partnership_runs = 0
     
+    def refresh_matchup_tables(self):
+        '''Compile the matchup tables for the game's teams; ground adjustments and home advantage replace the teams with adjusted views'''
+        self.matchup_tables = {
+            self.game.home_team.team_id: MatchupTable(self.game.home_team, self.game.away_team, EASY_BOWLING_ON, self.max_overs),
+            self.game.away_team.team_id: MatchupTable(self.game.away_team, self.game.home_team, EASY_BOWLING_ON, self.max_overs)
+        }
+
+    def _lookup_matchup(self, striker: PlayerObject, bowler: PlayerObject, fielder: PlayerObject, wicketkeeper: PlayerObject):
+        for table in self.matchup_tables.values():
+            if striker.player_id in table.batter_slots:
+                return table.lookup(striker, bowler, fielder, wicketkeeper)
+        return None
+
+    def next_ball_distribution(self, striker_id: int, bowler_id: int, wicketkeeper_id: Optional[int] = None,
+                               fielder_id: Optional[int] = None, is_free_hit: bool = False) -> Dict[str, Any]:
+        '''Exact outcome probabilities and expected values for the next ball, without sampling'''
+        striker = self._fetch_player(striker_id)
+        bowler = self._fetch_player(bowler_id)
+        for table in self.matchup_tables.values():
+            if striker.player_id not in table.batter_slots:
+                continue
+            keeper = self._fetch_player(wicketkeeper_id) if wicketkeeper_id else table.wicketkeeper
+            if keeper is table.wicketkeeper and bowler.player_id in table.fielder_slots:
+                striker_slot = table.batter_slots[striker.player_id]
+                bowler_slot = table.fielder_slots[bowler.player_id]
+                if fielder_id:
+                    joint_distributions = [table.lookup_slots(striker_slot, bowler_slot, table.fielder_slots[fielder_id])]
+                else:
+                    joint_distributions = table.bowler_distributions(striker_slot, bowler_slot)
+                return joint_outcomes.summarize_distributions(joint_distributions, is_free_hit)
+            fielder = self._fetch_player(fielder_id) if fielder_id else None
+            return joint_outcomes.next_ball_distribution(striker, bowler, keeper, table.fielding_team, is_free_hit, EASY_BOWLING_ON, self.max_overs, fielder)
+        raise KeyError(f"Player {striker_id} is not in this match")
+
+    def project_innings(self, batting_order_ids: List[int], bowling_plan_ids: List[int], target: int = -1,
+                        runs: int = 0, wickets: int = 0, balls: int = 0, striker: int = 0, non_striker: int = 1) -> Dict[str, Any]:
+        '''Exact distribution of the innings total for a fixed batting order and bowler per over.
+        striker and non_striker are positions in the batting order; balls counts legal deliveries already bowled.'''
+        batting_order = [self._fetch_player(player_id) for player_id in batting_order_ids]
+        bowling_plan = [self._fetch_player(player_id) for player_id in bowling_plan_ids]
+        for table in self.matchup_tables.values():
+            if batting_order[0].player_id in table.batter_slots:
+                projection = innings_dp.solve_innings(batting_order, bowling_plan, table.wicketkeeper, table.fielding_team, self.max_overs,
+                                                      target, EASY_BOWLING_ON, self.match_format.balls_per_over, runs=runs, wickets=wickets, balls=balls,
+                                                      striker=striker, non_striker=non_striker)
+                return projection.to_dict()
+        raise KeyError(f"Player {batting_order_ids[0]} is not in this match")
+
+    def playout_snapshot(self, striker_id: Optional[int] = None, non_striker_id: Optional[int] = None,
+                         bowler_id: Optional[int] = None, is_free_hit: bool = False) -> Optional[match_runner.MatchSnapshot]:
+        '''Capture the live state of the current innings (score, batters, bowler quotas, target) for playouts'''
+        from models import Innings, BattingStats, BowlingStats
+
+        innings = Innings.query.filter_by(match_id=self.match.id, innings_number=self.match.current_innings).first()
+        if not innings:
+            return None
+
+        target = -1
+        if innings.innings_number == 2:
+            first_innings = Innings.query.filter_by(match_id=self.match.id, innings_number=1).first()
+            target = first_innings.total_runs + 1
+
+        striker_id = striker_id or innings.striker_id
+        non_striker_id = non_striker_id or innings.non_striker_id
+        # start_match creates a BattingStats row for every player, so only those who have batted count as used
+        batters_used = [stats.player_id for stats in BattingStats.query.filter_by(innings_id=innings.id).all() if stats.balls_faced or stats.is_out]
+        batters_used += [player_id for player_id in (striker_id, non_striker_id) if player_id and player_id not in batters_used]
+        bowler_balls = {stats.player_id: stats.balls_bowled for stats in BowlingStats.query.filter_by(innings_id=innings.id).all()}
+        balls = int(innings.overs_completed) * self.match_format.balls_per_over + innings.current_over_balls
+
+        return match_runner.MatchSnapshot(innings.innings_number, innings.batting_team_id, innings.total_runs, innings.wickets_lost, balls,
+                                          striker_id, non_striker_id, bowler_id or innings.current_bowler_id, target, batters_used, bowler_balls, is_free_hit)
+
+    def win_probability(self, snapshot: match_runner.MatchSnapshot, playouts: int = 5000, seed: Optional[int] = None, executor=None) -> Dict[str, Any]:
+        '''Win/tie/loss probabilities for the batting side from independent playouts of the rest of the match'''
+        return match_runner.win_probability(self.match.match_id, self.game.home_team, self.game.away_team, self.match_format,
+                                            EASY_BOWLING_ON, snapshot, playouts, seed, executor)
+
+    def play_super_overs(self, seed: Optional[int] = None, max_super_overs: Optional[int] = None) -> Dict[str, Any]:
+        '''Decide a tied match with automatic super overs, repeated while they are tied'''
+        home_team, away_team = self.game.home_team, self.game.away_team
+        batting_second = home_team if self.match.batting_second_id == home_team.team_id else away_team
+        batting_first = away_team if batting_second is home_team else home_team
+        rng = MatchRNG(seed) if seed is not None else self.rng
+        self.decision_log.record('super_over', max_super_overs, seed)
+        winner, super_overs = super_over.resolve_super_overs(batting_second, batting_first, self.matchup_tables, rng,
+                                                             max_super_overs=max_super_overs, easy_bowling_on=EASY_BOWLING_ON)
+        return {
+            'winner_id': winner.team_id if winner else None,
+            'winner': winner.short_name if winner else None,
+            'super_overs': [over.to_dict() for over in super_overs]
+        }
+
     def _fetch_player(self, player_id: int) -> PlayerObject:
-        return self.game.home_team.players_map[player_id] if player_id in self.game.home_team.players_map else self.game.away_team.players_map[player_id]
+        player = self.game.home_team.get_player(player_id) or self.game.away_team.get_player(player_id)
+        if player is None:
+            raise KeyError(f"Player {player_id} is not in this match")
+        return player
         
-    def simulate_delivery(self, bowler_id: int, striker_id: int, non_striker_id: int, fielder_id: int,
+    def simulate_delivery(self, bowler_id: int, striker_id: int, non_striker_id: int, fielder_id: Optional[int],
                          wicketkeeper_id: int,
-                         current_over: int, ball_in_over: int) -> DeliveryResult:
+                         current_over: int, ball_in_over: int, innings_number: Optional[int] = None) -> DeliveryResult:
         '''
         Simulate a single delivery using your existing Python logic.
         
@@ -183,8 +303,10 @@ class CricketGameEngine:
             bowler_id: ID of the bowling player
             striker_id: ID of the striking batsman
             non_striker_id: ID of the non-striking batsman
+            fielder_id: ID of the fielder, or None to draw one from the match's random stream
             current_over: Current over number
             ball_in_over: Ball number in current over (1-6+)
+            innings_number: Innings the delivery belongs to, for the decision log
             
         Returns:
             DeliveryResult with all the outcome data
@@ -199,11 +321,14 @@ class CricketGameEngine:
         # fielder = Player.query.get(fielder_id)
         # wicketkeeper = Player.query.get(wicketkeeper_id)
         
+        # Logged before any draw, so a replay makes the same draws in the same order
+        self.decision_log.record_delivery(innings_number or self.current_innings, striker_id, non_striker_id, bowler_id, wicketkeeper_id, fielder_id)
+
         # Apply location adjustments
         bowler = self._fetch_player(bowler_id)
         striker = self._fetch_player(striker_id)
         non_striker = self._fetch_player(non_striker_id)
-        fielder = self._fetch_player(fielder_id)
+        fielder = self._fetch_player(fielder_id) if fielder_id else self._draw_fielder(bowler)
         wicketkeeper = self._fetch_player(wicketkeeper_id)
 
         bowler_attrs = {
@@ -251,6 +376,8 @@ class CricketGameEngine:
         self.current_bowler = bowler
         self.current_striker = striker
         self.current_non_striker = non_striker
+        self.current_fielder = fielder
+        self.current_wicketkeeper = wicketkeeper
         
 
         # Add free hit adjustments
@@ -263,12 +390,28 @@ class CricketGameEngine:
         
 
 
+        # Precompiled matchup: one draw against the joint outcome distribution
+        joint_distribution = self._lookup_matchup(striker, bowler, fielder, wicketkeeper)
+        if joint_distribution is not None:
+            delivery = joint_distribution.delivery(self.rng.random(), is_free_hit)
+            self.decision_log.record_outcome(delivery)
+            self.update_match_state(delivery)
+            return delivery
+
         # Import events only when needed to avoid circular import issues
         import simengine.events as events
-        delivery = events.delivery(striker_attrs['batting_vs_pace'], striker_attrs['batting_vs_spin'], striker_attrs['batting_aggression'], bowler_attrs['bowling_skill'], bowler_attrs['bowling_type'], wicketkeeper_attrs['fielding_skill'], fielder_attrs['fielding_skill'], is_free_hit, EASY_BOWLING_ON, self.max_overs)
+        delivery = events.delivery(striker_attrs['batting_vs_pace'], striker_attrs['batting_vs_spin'], striker_attrs['batting_aggression'], bowler_attrs['bowling_skill'], bowler_attrs['bowling_type'], wicketkeeper_attrs['fielding_skill'], fielder_attrs['fielding_skill'], is_free_hit, EASY_BOWLING_ON, self.max_overs, self.rng)
+        self.decision_log.record_outcome(delivery)
         self.update_match_state(delivery)
         return delivery
 
+    def _draw_fielder(self, bowler: PlayerObject) -> PlayerObject:
+        '''Any of the bowler's side, with the same draw as pick_fielder'''
+        for table in self.matchup_tables.values():
+            if bowler.player_id in table.fielder_slots:
+                return table.fielding_team.players[int(self.rng.random() * 11)]
+        raise KeyError(f"Player {bowler.player_id} is not in this match")
+
         
         # For now, return a random outcome for demonstration
         # return self._generate_mock_delivery()
@@ -348,7 +491,7 @@ class CricketGameEngine:
         bowling_team_players = innings.bowling_team.players
         
         # Get max overs per bowler based on match type
-        max_overs_for_bowler = self.max_overs // 5
+        max_overs_for_bowler = self.match_format.bowler_overs
         
         available_bowlers = []
         for player in bowling_team_players:
@@ -103,6 +103,10 @@ class Match(db.Model):
     # Match result
     winner_id = db.Column(db.Integer, db.ForeignKey('team.id'))
     result_text = db.Column(db.String(200))
+
+    # Replay: the seed of the match's random stream and the captains' decisions (simengine/replay.py)
+    rng_seed = db.Column(db.String(40))
+    decision_log = db.Column(db.Text)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -153,6 +157,9 @@ class Innings(db.Model):
     
     # Innings complete
     is_completed = db.Column(db.Boolean, default=False)
+
+    # Ball-by-ball record, four bytes a delivery (simengine/delivery_codec.py); Delivery rows are only kept for older innings
+    delivery_blob = db.Column(db.LargeBinary)
     
     # Relationships
     batting_team = db.relationship('Team', foreign_keys=[batting_team_id])
@@ -226,4 +233,26 @@ class BowlingStats(db.Model):
     wickets_taken = db.Column(db.Integer, default=0)
     
     # Relationships
-    player = db.relationship('Player')
\ No newline at end of file
+    player = db.relationship('Player')
+
+# Schema upgrades
+# db.create_all() creates missing tables but never alters an existing one, so columns added to a
+# model after its table was first created are added here, to databases that do not have them yet
+ADDED_COLUMNS = [
+    ('match', 'rng_seed', 'VARCHAR(40)'),
+    ('match', 'decision_log', 'TEXT'),
+    ('innings', 'delivery_blob', 'BLOB'),
+]
+
+def upgrade_schema(engine=None):
+    '''Add any ADDED_COLUMNS missing from existing tables; returns the (table, column) pairs added'''
+    from sqlalchemy import inspect, text
+    engine = engine if engine is not None else db.engine
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as connection:
+        for table, column, column_type in ADDED_COLUMNS:
+            if inspector.has_table(table) and column not in [existing['name'] for existing in inspector.get_columns(table)]:
+                connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {column_type}'))
+                added.append((table, column))
+    return added
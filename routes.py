@@ -4,12 +4,47 @@ from flask import request, jsonify, render_template
 from flask_socketio import emit
 from cricket_engine import CricketGameEngine
 from simengine.delivery_result import DeliveryResult
+from dataclasses import asdict
+from simengine.formats import FORMATS, get_format
+from simengine import tournament
+from simengine import replay
+from simengine import delivery_codec
 import uuid
 import random
+import json
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import os
 
 # Global storage for active game engines
 active_engines = {}  # match_id -> CricketGameEngine instance
 
+# Worker pool for win-probability playouts, started on first use
+playout_executor = None
+
+def get_playout_executor():
+    global playout_executor
+    if playout_executor is None:
+        playout_executor = ProcessPoolExecutor()
+    return playout_executor
+
+def reset_playout_executor():
+    global playout_executor
+    if playout_executor is not None:
+        playout_executor.shutdown(wait=False, cancel_futures=True)
+    playout_executor = None
+
+# Tournament simulations run inside the request, so their size is capped
+MAX_TOURNAMENT_SEASONS = 1000
+MAX_TOURNAMENT_ROUNDS = 4
+
+def integer_field(data, name, default, low, high):
+    '''The named JSON field as an int in [low, high], or None when it is anything else'''
+    value = data.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, int) or value < low or value > high:
+        return None
+    return value
+
 def register_api_routes(app, db, socketio):
     '''Register all API routes with the Flask app'''
     from models import db, Team, Player, Match, Innings, Delivery, BattingStats, BowlingStats, Location
@@ -164,6 +199,53 @@ def register_api_routes(app, db, socketio):
             }
         })
 
+    @app.route('/api/formats', methods=['GET'])
+    def get_formats():
+        """Get all supported match formats"""
+        return jsonify([match_format.to_dict() for match_format in FORMATS.values()])
+
+    # Tournament APIs
+    @app.route('/api/tournaments/simulate', methods=['POST'])
+    def simulate_tournament():
+        """Points-table, qualification and title odds for a league of every full team"""
+        data = request.json or {}
+
+        match_type = data.get('match_type', 'T20')
+        if match_type not in FORMATS:
+            return jsonify({'error': f'Unknown match type {match_type}'}), 400
+        if match_type == 'Test':
+            return jsonify({'error': 'Tournaments are limited-overs only'}), 400
+
+        max_workers = os.cpu_count() or 1
+        fields = {}
+        for (name, default, low, high) in (('seasons', MAX_TOURNAMENT_SEASONS, 1, MAX_TOURNAMENT_SEASONS),
+                                           ('rounds', 2, 1, MAX_TOURNAMENT_ROUNDS),
+                                           ('playoff_teams', 4, 2, 64),
+                                           ('workers', max_workers, 1, 1024)):
+            fields[name] = integer_field(data, name, default, low, high)
+            if fields[name] is None:
+                return jsonify({'error': f'{name} must be an integer between {low} and {high}'}), 400
+        seed = data.get('seed')
+        if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+            return jsonify({'error': 'seed must be a non-negative integer'}), 400
+
+        teams = tournament.teams_from_models(Team.query.all())
+        try:
+            summary = tournament.simulate_tournament(
+                teams,
+                fields['seasons'],
+                seed=seed,
+                # Never more processes than the server has cores, whatever was asked for
+                workers=min(fields['workers'], max_workers),
+                match_format=match_type,
+                rounds=fields['rounds'],
+                playoff_teams=fields['playoff_teams']
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return jsonify({'match_type': match_type, **summary})
+
     # Match Management APIs
     @app.route('/api/matches', methods=['POST'])
     def create_match():
@@ -176,6 +258,9 @@ def register_api_routes(app, db, socketio):
         
         if data['team1_id'] == data['team2_id']:
             return jsonify({'error': 'Teams must be different'}), 400
+
+        if data['match_type'] not in FORMATS:
+            return jsonify({'error': f"Unknown match type {data['match_type']}"}), 400
         
         team1 = Team.query.get(data['team1_id'])
         team2 = Team.query.get(data['team2_id'])
@@ -207,6 +292,10 @@ def register_api_routes(app, db, socketio):
         if match.match_id not in active_engines:
             engine = CricketGameEngine(match)
             active_engines[match.match_id] = engine
+            # The seed and the decision log replay the match (GET /api/matches/<match_id>/replay)
+            match.rng_seed = str(engine.rng.seed)
+            match.decision_log = engine.decision_log.to_json()
+            db.session.commit()
         
         return jsonify({
             'match_id': match.match_id,
@@ -230,9 +319,13 @@ def register_api_routes(app, db, socketio):
         if call not in ['heads', 'tails']:
             return jsonify({'error': 'Call must be heads or tails'}), 400
         
-        # Simulate toss
-        import random
-        toss_result = random.choice(['heads', 'tails'])
+        # Simulate toss, drawing from the match's own random stream when its engine is live
+        engine = active_engines.get(match_id)
+        if engine:
+            toss_result = engine.toss(calling_team_id, call)
+            match.decision_log = engine.decision_log.to_json()
+        else:
+            toss_result = random.choice(['heads', 'tails'])
         toss_won = (call == toss_result)
         
         if toss_won:
@@ -289,6 +382,9 @@ def register_api_routes(app, db, socketio):
         engine = active_engines[match_id]
         print("DEBUG: Using existing CricketGameEngine")
 
+        engine.record_toss_decision(decision)
+        match.decision_log = engine.decision_log.to_json()
+        db.session.commit()
         engine.start_first_innings(match.batting_first_id, match.batting_second_id)
 
         
@@ -378,7 +474,8 @@ def register_api_routes(app, db, socketio):
             
             print(f"DEBUG: Player IDs - Bowler: {bowler_id}, Striker: {striker_id}, Non-striker: {non_striker_id}, Fielder: {fielder_id}, Wicketkeeper: {wicketkeeper_id}")
             
-            if not all([bowler_id, striker_id, non_striker_id, fielder_id]):
+            # Without a fielder_id the engine draws the fielder, which keeps it out of the decision log
+            if not all([bowler_id, striker_id, non_striker_id]):
                 return jsonify({'error': 'Missing player IDs'}), 400
             
             # Get current innings
@@ -399,10 +496,11 @@ def register_api_routes(app, db, socketio):
             engine = active_engines[match_id]
             print("DEBUG: Using existing CricketGameEngine")
             
-            # Calculate current over and ball
-            total_balls = len(current_innings.deliveries)
-            current_over = (total_balls // 6) + 1
-            ball_in_over = (total_balls % 6) + 1
+            # Calculate current over and ball (Delivery rows are only there for innings begun before the packed blob)
+            total_balls = len(current_innings.deliveries) + delivery_codec.delivery_count(current_innings.delivery_blob)
+            balls_per_over = engine.match_format.balls_per_over
+            current_over = (total_balls // balls_per_over) + 1
+            ball_in_over = (total_balls % balls_per_over) + 1
             
             print(f"DEBUG: Simulating delivery - Over: {current_over}, Ball: {ball_in_over}")
             
@@ -411,34 +509,26 @@ def register_api_routes(app, db, socketio):
             
             # Simulate delivery using your cricket logic
             delivery_result = engine.simulate_delivery(
-                bowler_id, striker_id, non_striker_id, fielder_id, wicketkeeper_id, current_over, ball_in_over
+                bowler_id, striker_id, non_striker_id, fielder_id, wicketkeeper_id, current_over, ball_in_over, current_innings.innings_number
             )
+            match.decision_log = engine.decision_log.to_json()
             
             # Update persistent state in the engine
             engine.update_match_state(delivery_result)
             
             print(f"DEBUG: Delivery result: {delivery_result}")
             
-            # Save delivery to database
-            delivery = Delivery(
-                innings_id=current_innings.id,
-                over_number=current_over,
-                ball_number=ball_in_over,
-                bowler_id=bowler_id,
-                striker_id=striker_id,
-                non_striker_id=non_striker_id,
-                delivery_type=delivery_result.delivery_type,
-                stroke_type=delivery_result.stroke_type,
-                runs_scored=delivery_result.runs_scored,
-                extras=delivery_result.extras,
-                is_wicket=delivery_result.is_wicket,
-                dismissal_type=delivery_result.dismissal_type,
-                total_runs_after=current_innings.total_runs + delivery_result.runs_scored + delivery_result.extras,
-                wickets_after=current_innings.wickets_lost + (1 if delivery_result.is_wicket else 0)
+            # Save delivery to the innings' packed ball-by-ball blob; over, ball and score after it follow from its position
+            if current_innings.delivery_blob is None:
+                current_innings.delivery_blob = delivery_codec.new_blob(
+                    [player.id for player in current_innings.batting_team.players],
+                    [player.id for player in current_innings.bowling_team.players]
+                )
+            involved = {'fielder': engine.current_fielder, 'wicketkeeper': engine.current_wicketkeeper}.get(delivery_result.fielder_involved)
+            current_innings.delivery_blob = delivery_codec.append_delivery(
+                current_innings.delivery_blob, striker_id, non_striker_id, bowler_id, involved.player_id if involved else None, delivery_result
             )
             
-            db.session.add(delivery)
-            
             # Update innings state
             current_innings.total_runs += delivery_result.runs_scored + delivery_result.extras
             if delivery_result.is_wicket:
@@ -447,7 +537,7 @@ def register_api_routes(app, db, socketio):
             # Update overs completed (only count legal deliveries)
             if delivery_result.extras == 0:
                 current_innings.current_over_balls += 1
-                if current_innings.current_over_balls >= 6:
+                if current_innings.current_over_balls >= balls_per_over:
                     current_innings.overs_completed += 1
                     current_innings.current_over_balls = 0
             
@@ -511,7 +601,7 @@ def register_api_routes(app, db, socketio):
             # Emit delivery update via WebSocket
             socketio.emit('delivery_update', {
                 'match_id': match_id,
-                'delivery_result': delivery_result.__dict__,
+                'delivery_result': asdict(delivery_result),
                 'total_runs': current_innings.total_runs,
                 'wickets_lost': current_innings.wickets_lost,
                 'overs_completed': current_innings.overs_completed
@@ -520,7 +610,7 @@ def register_api_routes(app, db, socketio):
             print("DEBUG: Delivery simulation completed successfully")
             
             return jsonify({
-                'delivery_result': delivery_result.__dict__,
+                'delivery_result': asdict(delivery_result),
                 'match_state': {
                     'total_runs': current_innings.total_runs,
                     'wickets_lost': current_innings.wickets_lost,
@@ -534,6 +624,143 @@ def register_api_routes(app, db, socketio):
             traceback.print_exc()
             return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
+    @app.route('/api/matches/<match_id>/next-ball', methods=['GET'])
+    def get_next_ball(match_id):
+        """Exact outcome probabilities and expected values for the next delivery"""
+        if match_id not in active_engines:
+            return jsonify({'error': 'Match engine not found'}), 404
+
+        striker_id = request.args.get('striker_id', type=int)
+        bowler_id = request.args.get('bowler_id', type=int)
+        if not striker_id or not bowler_id:
+            return jsonify({'error': 'striker_id and bowler_id are required'}), 400
+
+        engine = active_engines[match_id]
+        try:
+            distribution = engine.next_ball_distribution(
+                striker_id,
+                bowler_id,
+                wicketkeeper_id=request.args.get('wicketkeeper_id', type=int),
+                fielder_id=request.args.get('fielder_id', type=int),
+                is_free_hit=request.args.get('free_hit', 'false').lower() == 'true'
+            )
+        except KeyError as e:
+            return jsonify({'error': f'Unknown player: {str(e)}'}), 400
+
+        return jsonify({
+            'match_id': match_id,
+            'striker_id': striker_id,
+            'bowler_id': bowler_id,
+            **distribution
+        })
+
+    @app.route('/api/matches/<match_id>/win-probability', methods=['GET'])
+    def get_win_probability(match_id):
+        """Win, tie and loss probabilities from playouts of the rest of the match"""
+        if match_id not in active_engines:
+            return jsonify({'error': 'Match engine not found'}), 404
+
+        match = Match.query.filter_by(match_id=match_id).first_or_404()
+        if match.status not in ['first_innings', 'second_innings']:
+            return jsonify({'error': 'Match not in progress'}), 400
+
+        playouts = request.args.get('playouts', 5000, type=int)
+        if playouts < 1 or playouts > 100000:
+            return jsonify({'error': 'playouts must be between 1 and 100000'}), 400
+
+        engine = active_engines[match_id]
+        snapshot = engine.playout_snapshot(
+            striker_id=request.args.get('striker_id', type=int),
+            non_striker_id=request.args.get('non_striker_id', type=int),
+            bowler_id=request.args.get('bowler_id', type=int),
+            is_free_hit=request.args.get('free_hit', 'false').lower() == 'true'
+        )
+        if not snapshot:
+            return jsonify({'error': 'Current innings not found'}), 400
+        if not snapshot.striker_id or not snapshot.non_striker_id:
+            return jsonify({'error': 'Batters at the crease are not set'}), 400
+
+        try:
+            probabilities = engine.win_probability(snapshot, playouts, request.args.get('seed', type=int), get_playout_executor())
+        except KeyError as e:
+            return jsonify({'error': f'Unknown player: {str(e)}'}), 400
+        except BrokenProcessPool:
+            # A worker died; the next request starts a fresh pool
+            reset_playout_executor()
+            return jsonify({'error': 'Playout workers stopped unexpectedly, please retry'}), 503
+        except Exception as e:
+            print(f"ERROR in get_win_probability: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return jsonify({'error': f'Playouts failed: {str(e)}'}), 500
+
+        response = {
+            'match_id': match_id,
+            'innings_number': snapshot.innings_no,
+            'total_runs': snapshot.runs,
+            'wickets_lost': snapshot.wickets,
+            'balls': snapshot.balls,
+            'target': snapshot.target,
+            **probabilities
+        }
+        socketio.emit('win_probability_update', response, room=match_id)
+        return jsonify(response)
+
+    @app.route('/api/matches/<match_id>/super-over', methods=['POST'])
+    def play_super_over(match_id):
+        """Decide a tied match with simulated super overs"""
+        if match_id not in active_engines:
+            return jsonify({'error': 'Match engine not found'}), 404
+
+        match = Match.query.filter_by(match_id=match_id).first_or_404()
+        first_innings = Innings.query.filter_by(match_id=match.id, innings_number=1).first()
+        second_innings = Innings.query.filter_by(match_id=match.id, innings_number=2).first()
+        if match.status not in ['second_innings', 'super_over'] or not first_innings or not second_innings:
+            return jsonify({'error': 'Super overs follow a completed second innings'}), 400
+        if first_innings.total_runs != second_innings.total_runs:
+            return jsonify({'error': 'Match is not tied'}), 400
+
+        data = request.json or {}
+        max_super_overs = data.get('max_super_overs')
+        if max_super_overs is not None and (not isinstance(max_super_overs, int) or max_super_overs < 1):
+            return jsonify({'error': 'max_super_overs must be a positive integer'}), 400
+
+        engine = active_engines[match_id]
+        result = engine.play_super_overs(data.get('seed'), max_super_overs)
+        match.decision_log = engine.decision_log.to_json()
+        if result['winner_id'] is None:
+            match.status = 'super_over'
+            match.result_text = 'Super overs tied'
+        else:
+            match.status = 'completed'
+            match.winner_id = result['winner_id']
+            match.result_text = f"Match tied; {result['winner']} won the super over"
+        db.session.commit()
+
+        response = {'match_id': match_id, 'status': match.status, 'result_text': match.result_text, **result}
+        socketio.emit('super_over_result', response, room=match_id)
+        return jsonify(response)
+
+    @app.route('/api/matches/<match_id>/replay', methods=['GET'])
+    def replay_match(match_id):
+        """Regenerate the ball-by-ball record from the seed and decision log, or the state after ball X"""
+        match = Match.query.filter_by(match_id=match_id).first_or_404()
+        if not match.rng_seed or match.decision_log is None:
+            return jsonify({'error': 'Match has no seed and decision log to replay'}), 400
+
+        entries = json.loads(match.decision_log)
+        ball = request.args.get('ball', type=int)
+        # A fresh engine with the same seed makes the same draws as the live one
+        engine = CricketGameEngine(match, int(match.rng_seed))
+        try:
+            if ball is not None:
+                state = replay.rewind(engine, entries, ball)
+                return jsonify({'match_id': match_id, 'ball': ball, 'state': state.to_dict()})
+            deliveries = list(replay.replay_deliveries(engine, entries))
+        except KeyError as e:
+            return jsonify({'error': f'Squads have changed since the match was played: {str(e)}'}), 409
+        return jsonify({'match_id': match_id, 'deliveries': deliveries})
+
     @app.route('/api/matches/<match_id>/innings/<int:innings_number>/stats', methods=['GET'])
     def get_innings_stats(match_id, innings_number):
         """Get batting and bowling stats for a specific innings"""
@@ -547,6 +774,9 @@ def register_api_routes(app, db, socketio):
             
             if not innings:
                 return jsonify({'error': 'Innings not found'}), 404
+
+            if innings.delivery_blob:
+                return jsonify(innings_stats_from_blob(innings))
             
             # Get batting stats
             batting_stats_list = []
@@ -601,6 +831,58 @@ def register_api_routes(app, db, socketio):
             return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
     
+    def innings_stats_from_blob(innings):
+        """Batting and bowling stats decoded from the innings' packed deliveries"""
+        batting_ids, bowling_ids, scorecard, dismissals = delivery_codec.innings_scorecard(innings.delivery_blob)
+        names = {player.id: player.name for player in Player.query.filter(Player.id.in_(batting_ids + bowling_ids)).all()}
+
+        batting_stats_list = []
+        for slot, (player_id, row) in enumerate(zip(batting_ids, scorecard.batting)):
+            method, bowler_slot, fielder_slot = dismissals.get(slot, ('', None, delivery_codec.NO_SLOT))
+            fielder_name = names.get(bowling_ids[fielder_slot], '') if fielder_slot != delivery_codec.NO_SLOT else ''
+            batting_stats_list.append({
+                'player_id': player_id,
+                'player_name': names.get(player_id, ''),
+                'runs_scored': int(row['runs']),
+                'balls_faced': int(row['balls_faced']),
+                'not_out': slot not in dismissals,
+                'sixes_hit': int(row['sixes']),
+                'fours_hit': int(row['fours']),
+                'dots': int(row['dots']),
+                'method_of_dismissal': method,
+                'bowled_by_player_name': names.get(bowling_ids[bowler_slot], '') if bowler_slot is not None else '',
+                'caught_by_player_name': fielder_name if method in ('caught', 'caught behind') else '',
+                'stumped_by_player_name': fielder_name if method == 'stumped' else ''
+            })
+
+        bowling_stats_list = []
+        for player_id, row in zip(bowling_ids, scorecard.bowling):
+            bowling_stats_list.append({
+                'player_id': player_id,
+                'player_name': names.get(player_id, ''),
+                'deliveries': int(row['balls_bowled']),
+                'dot_balls': int(row['dot_balls']),
+                'runs_conceded': int(row['runs_conceded']),
+                'wickets_taken': int(row['wickets'])
+            })
+
+        return {
+            'innings_number': innings.innings_number,
+            'batting_stats': batting_stats_list,
+            'bowling_stats': bowling_stats_list
+        }
+
+    @app.route('/api/matches/<match_id>/innings/<int:innings_number>/deliveries', methods=['GET'])
+    def get_innings_deliveries(match_id, innings_number):
+        """Ball-by-ball record of an innings, decoded from its packed blob"""
+        match = Match.query.filter_by(match_id=match_id).first_or_404()
+        innings = Innings.query.filter_by(match_id=match.id, innings_number=innings_number).first()
+        if not innings:
+            return jsonify({'error': 'Innings not found'}), 404
+        if not innings.delivery_blob:
+            return jsonify({'innings_number': innings_number, 'deliveries': []})
+        return jsonify({'innings_number': innings_number, 'deliveries': delivery_codec.delivery_records(innings.delivery_blob, get_format(match.match_type).balls_per_over)})
+
     # Additional API endpoints for dashboard
     @app.route('/api/matches/recent', methods=['GET'])
     def get_recent_matches():
@@ -1,3 +1,5 @@
+from types import MappingProxyType
+
 def base_event_matrix_t20(easy_bowling_on):
 	#TODO: Incorporate risk
 
@@ -124,3 +126,19 @@ def base_event_matrix_test(easy_bowling_on):
 	 "easy_bowling_on": easy_bowling_on}
 	 
 	return probability_matrix
+
+
+# Read-only registry of the base matrices above, built once at import. The simulation
+# copies these into its own buffers instead of calling the builders for every delivery.
+BASE_MATRIX_NAMES = ("bowl_probabilities", "stroke_probabilities", "miss_probabilities", "hit_probabilities", "slog_probabilities", "caught_out_probabilities")
+
+def freeze_base_matrix(probability_matrix):
+	return MappingProxyType({name: tuple(probability_matrix[name]) for name in BASE_MATRIX_NAMES})
+
+BASE_EVENT_MATRICES = MappingProxyType({
+	"t20": freeze_base_matrix(base_event_matrix_t20(False)),
+	"odi": freeze_base_matrix(base_event_matrix_odi(False)),
+	"test": freeze_base_matrix(base_event_matrix_test(False))})
+
+def get_base_event_matrix(matrix_format):
+	return BASE_EVENT_MATRICES[matrix_format]
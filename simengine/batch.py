@@ -0,0 +1,373 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import permutations
+
+import numpy as np
+
+from simengine.formats import FORMATS, get_format
+from simengine.probability_helpers import EventMatrixCache
+from simengine.rng import MatchRNG
+from simengine.scorecard import batting_scorecards, bowling_scorecards, reduce_batting, reduce_bowling
+from simengine.tournament import load_squads, home_fixture_runner
+
+# Batch simulation from the command line:
+#
+#   python -m simengine.batch --matches 100000 --fixture KKR:RCB --fixture MI:CSK --seed 7
+#
+# Every fixture is split into shards of matches. Shards run across a process pool and each
+# finished shard is written to the checkpoint directory, so rerunning the same command after
+# an interruption only plays the shards that are missing. Shard aggregates are plain counters
+# and sums, so merging them gives exactly the totals of one long run.
+
+
+# ACCUMULATORS
+
+class RunningStat:
+	def __init__(self, count=0, total=0, total_squares=0, minimum=None, maximum=None):
+		self.count = count
+		self.total = total
+		self.total_squares = total_squares
+		self.minimum = minimum
+		self.maximum = maximum
+
+	def add(self, value):
+		self.count += 1
+		self.total += value
+		self.total_squares += value * value
+		self.minimum = value if self.minimum is None else min(self.minimum, value)
+		self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+	def merge(self, other):
+		self.count += other.count
+		self.total += other.total
+		self.total_squares += other.total_squares
+		for value in (other.minimum, other.maximum):
+			if value is not None:
+				self.minimum = value if self.minimum is None else min(self.minimum, value)
+				self.maximum = value if self.maximum is None else max(self.maximum, value)
+		return self
+
+	def mean(self):
+		return self.total / self.count if self.count else 0.0
+
+	def standard_deviation(self):
+		if self.count < 2:
+			return 0.0
+		return max(0.0, (self.total_squares - self.total * self.total / self.count) / (self.count - 1)) ** 0.5
+
+	def to_list(self):
+		return [self.count, self.total, self.total_squares, self.minimum, self.maximum]
+
+	@classmethod
+	def from_list(cls, values):
+		return cls(*values)
+
+# Per-player counters, in this order
+PLAYER_FIELDS = ("innings", "runs", "balls_faced", "outs", "fours", "sixes", "balls_bowled", "runs_conceded", "wickets")
+# Innings held as ball logs before their scorecards are summed into the counters
+PENDING_INNINGS = 4096
+
+class BatchAggregate:
+	def __init__(self):
+		self.matches = 0
+		# fixture label -> {team short name or "tie": count}; ties decided by super overs count as wins
+		self.results = {}
+		self.super_over_matches = 0
+		# team short name -> RunningStat of innings totals and of wickets lost, plus wins and matches
+		self.team_runs = {}
+		self.team_wickets = {}
+		self.team_wins = {}
+		self.team_matches = {}
+		# "TEAM:Player Name" -> counters in PLAYER_FIELDS order
+		self.players = {}
+		# Ball logs of innings not yet summed into players, by team: (player keys by slot, batting logs, bowling logs)
+		self.pending = {}
+		self.pending_innings = 0
+
+	def add_innings(self, innings):
+		team = innings.batting_team.short_name
+		self.team_runs.setdefault(team, RunningStat()).add(innings.total_runs)
+		self.team_wickets.setdefault(team, RunningStat()).add(innings.total_wickets)
+		self.pending_logs(innings.batting_team)[1].append(innings.ball_log)
+		self.pending_logs(innings.fielding_team)[2].append(innings.ball_log)
+		self.pending_innings += 1
+		if self.pending_innings >= PENDING_INNINGS:
+			self.sum_scorecards()
+
+	def pending_logs(self, team):
+		if team.short_name not in self.pending:
+			self.pending[team.short_name] = ([team.short_name + ":" + player.name for player in team.players], [], [])
+		return self.pending[team.short_name]
+
+	def sum_scorecards(self):
+		# The pending innings' scorecards are tallied in one pass per team and side and summed with
+		# one np.add.reduce, then folded into the per-player counters
+		for (keys, batting_logs, bowling_logs) in self.pending.values():
+			if batting_logs:
+				(batting_totals, innings) = reduce_batting(batting_scorecards(batting_logs, len(keys)))
+				for (key, came_in, (runs, balls_faced, _, fours, sixes, outs)) in zip(keys, innings.tolist(), batting_totals.tolist()):
+					if came_in:
+						counters = self.players.setdefault(key, [0] * len(PLAYER_FIELDS))
+						for (index, value) in ((0, came_in), (1, runs), (2, balls_faced), (3, outs), (4, fours), (5, sixes)):
+							counters[index] += value
+			if bowling_logs:
+				for (key, (balls_bowled, _, runs_conceded, wickets, _, _)) in zip(keys, reduce_bowling(bowling_scorecards(bowling_logs, len(keys))).tolist()):
+					if balls_bowled or runs_conceded:
+						counters = self.players.setdefault(key, [0] * len(PLAYER_FIELDS))
+						for (index, value) in ((6, balls_bowled), (7, runs_conceded), (8, wickets)):
+							counters[index] += value
+		self.pending = {}
+		self.pending_innings = 0
+
+	def add_match(self, fixture_label, result):
+		self.matches += 1
+		outcome = "tie" if result.winner is None else result.winner.short_name
+		fixture_results = self.results.setdefault(fixture_label, {})
+		fixture_results[outcome] = fixture_results.get(outcome, 0) + 1
+		for team in (result.batting_first, result.batting_second):
+			self.team_matches[team.short_name] = self.team_matches.get(team.short_name, 0) + 1
+		if result.winner is not None:
+			self.team_wins[outcome] = self.team_wins.get(outcome, 0) + 1
+		if result.super_overs:
+			self.super_over_matches += 1
+		self.add_innings(result.first_innings)
+		self.add_innings(result.second_innings)
+
+	def merge(self, other):
+		self.sum_scorecards()
+		other.sum_scorecards()
+		self.matches += other.matches
+		self.super_over_matches += other.super_over_matches
+		for (fixture_label, outcomes) in other.results.items():
+			fixture_results = self.results.setdefault(fixture_label, {})
+			for (outcome, count) in outcomes.items():
+				fixture_results[outcome] = fixture_results.get(outcome, 0) + count
+		for (mine, theirs) in ((self.team_runs, other.team_runs), (self.team_wickets, other.team_wickets)):
+			for (team, stat) in theirs.items():
+				mine.setdefault(team, RunningStat()).merge(stat)
+		for (mine, theirs) in ((self.team_wins, other.team_wins), (self.team_matches, other.team_matches)):
+			for (team, count) in theirs.items():
+				mine[team] = mine.get(team, 0) + count
+		for (player, counters) in other.players.items():
+			mine = self.players.setdefault(player, [0] * len(PLAYER_FIELDS))
+			for index in range(len(PLAYER_FIELDS)):
+				mine[index] += counters[index]
+		return self
+
+	def to_dict(self):
+		self.sum_scorecards()
+		return {
+			"matches": self.matches,
+			"results": self.results,
+			"super_over_matches": self.super_over_matches,
+			"team_runs": {team: stat.to_list() for (team, stat) in self.team_runs.items()},
+			"team_wickets": {team: stat.to_list() for (team, stat) in self.team_wickets.items()},
+			"team_wins": self.team_wins,
+			"team_matches": self.team_matches,
+			"players": self.players}
+
+	@classmethod
+	def from_dict(cls, data):
+		aggregate = cls()
+		aggregate.matches = data["matches"]
+		aggregate.results = data["results"]
+		aggregate.super_over_matches = data["super_over_matches"]
+		aggregate.team_runs = {team: RunningStat.from_list(values) for (team, values) in data["team_runs"].items()}
+		aggregate.team_wickets = {team: RunningStat.from_list(values) for (team, values) in data["team_wickets"].items()}
+		aggregate.team_wins = data["team_wins"]
+		aggregate.team_matches = data["team_matches"]
+		aggregate.players = data["players"]
+		return aggregate
+
+	def summary(self, balls_per_over=6):
+		self.sum_scorecards()
+		teams = {}
+		for (team, stat) in sorted(self.team_runs.items()):
+			teams[team] = {
+				"matches": self.team_matches.get(team, 0),
+				"win_rate": self.team_wins.get(team, 0) / max(1, self.team_matches.get(team, 0)),
+				"mean_total": stat.mean(),
+				"total_std": stat.standard_deviation(),
+				"highest_total": stat.maximum,
+				"lowest_total": stat.minimum,
+				"mean_wickets": self.team_wickets[team].mean()}
+		players = {}
+		for (player, counters) in sorted(self.players.items()):
+			stats = dict(zip(PLAYER_FIELDS, counters))
+			stats["batting_average"] = stats["runs"] / stats["outs"] if stats["outs"] else None
+			stats["strike_rate"] = 100 * stats["runs"] / stats["balls_faced"] if stats["balls_faced"] else None
+			stats["bowling_average"] = stats["runs_conceded"] / stats["wickets"] if stats["wickets"] else None
+			stats["economy"] = balls_per_over * stats["runs_conceded"] / stats["balls_bowled"] if stats["balls_bowled"] else None
+			players[player] = stats
+		return {"matches": self.matches, "results": self.results, "super_over_matches": self.super_over_matches, "teams": teams, "players": players}
+
+
+# SHARDS
+
+# Worker processes keep squads and compiled fixtures between shards, for the most recent few only.
+# Shards are queued fixture by fixture (plan_shards), so a worker moves on from a fixture for good
+FIXTURE_RUNNER_CACHE_SIZE = 4
+SQUADS_CACHE_SIZE = 2
+_squads = EventMatrixCache(SQUADS_CACHE_SIZE)
+_runners = EventMatrixCache(FIXTURE_RUNNER_CACHE_SIZE)
+
+def fixture_label(fixture):
+	return "%s v %s" % tuple(fixture)
+
+def build_fixture_runner(job, fixture_index):
+	teams = _squads.get(job["squads"], lambda: {team.short_name: team for team in load_squads(job["squads"])})
+	(home, away) = job["fixtures"][fixture_index]
+	return home_fixture_runner(teams[home], teams[away], get_format(job["format"]), job["easy_bowling_on"], MatchRNG([job["seed"], 0, fixture_index]))
+
+def get_fixture_runner(job, fixture_index):
+	key = (job["squads"], job["format"], job["easy_bowling_on"], job["seed"], fixture_index)
+	return _runners.get(key, lambda: build_fixture_runner(job, fixture_index))
+
+def run_shard(job, fixture_index, shard_index, count):
+	runner = get_fixture_runner(job, fixture_index)
+	label = fixture_label(job["fixtures"][fixture_index])
+	aggregate = BatchAggregate()
+	# Streams depend only on the seed and the shard's position, never on which worker ran it
+	for rng in MatchRNG([job["seed"], 1, fixture_index, shard_index]).spawn(count):
+		aggregate.add_match(label, runner.play(rng, job["super_overs"]))
+	return aggregate.to_dict()
+
+def shard_path(checkpoint_dir, fixture_index, shard_index):
+	return os.path.join(checkpoint_dir, "shard-%04d-%06d.json" % (fixture_index, shard_index))
+
+def write_json(path, data):
+	# Write then rename, so an interrupted run never leaves a half-written checkpoint behind
+	with open(path + ".tmp", "w") as output_file:
+		json.dump(data, output_file)
+	os.replace(path + ".tmp", path)
+
+def plan_shards(job):
+	shards = []
+	for fixture_index in range(len(job["fixtures"])):
+		for (shard_index, start) in enumerate(range(0, job["matches"], job["shard_size"])):
+			shards.append((fixture_index, shard_index, min(job["shard_size"], job["matches"] - start)))
+	return shards
+
+def run_batch(job, checkpoint_dir, workers=None, progress=None):
+	os.makedirs(checkpoint_dir, exist_ok=True)
+	manifest_path = os.path.join(checkpoint_dir, "manifest.json")
+	if os.path.exists(manifest_path):
+		with open(manifest_path) as manifest_file:
+			if json.load(manifest_file) != job:
+				raise ValueError(f"{checkpoint_dir} holds checkpoints for a different job; use --fresh or another --checkpoint-dir")
+	else:
+		write_json(manifest_path, job)
+
+	shards = plan_shards(job)
+	pending = [shard for shard in shards if not os.path.exists(shard_path(checkpoint_dir, shard[0], shard[1]))]
+	completed = len(shards) - len(pending)
+	workers = workers or os.cpu_count() or 1
+	if pending and workers == 1:
+		for (fixture_index, shard_index, count) in pending:
+			write_json(shard_path(checkpoint_dir, fixture_index, shard_index), run_shard(job, fixture_index, shard_index, count))
+			completed += 1
+			if progress:
+				progress(completed, len(shards))
+	elif pending:
+		with ProcessPoolExecutor(max_workers=workers) as executor:
+			futures = {executor.submit(run_shard, job, fixture_index, shard_index, count): (fixture_index, shard_index) for (fixture_index, shard_index, count) in pending}
+			for future in as_completed(futures):
+				write_json(shard_path(checkpoint_dir, *futures[future]), future.result())
+				completed += 1
+				if progress:
+					progress(completed, len(shards))
+
+	aggregate = BatchAggregate()
+	for (fixture_index, shard_index, _) in shards:
+		with open(shard_path(checkpoint_dir, fixture_index, shard_index)) as shard_file:
+			aggregate.merge(BatchAggregate.from_dict(json.load(shard_file)))
+	return aggregate
+
+
+# COMMAND LINE
+
+def parse_fixture(text):
+	teams = text.replace(",", ":").split(":")
+	if len(teams) != 2 or not all(teams):
+		raise argparse.ArgumentTypeError(f"fixtures look like HOME:AWAY, got {text}")
+	return [team.strip().upper() for team in teams]
+
+def build_parser():
+	parser = argparse.ArgumentParser(prog="python -m simengine.batch", description="Simulate many matches per fixture, sharded across processes with resumable checkpoints.")
+	parser.add_argument("--matches", type=int, required=True, help="matches to play per fixture")
+	parser.add_argument("--fixture", type=parse_fixture, action="append", default=[], help="HOME:AWAY team short names; repeatable (default: every pairing, home and away)")
+	parser.add_argument("--fixtures-file", help="file with one HOME:AWAY fixture per line")
+	parser.add_argument("--squads", default="players_to_import.csv", help="squad CSV built from team_lists.txt and all_squads.csv")
+	parser.add_argument("--format", default="T20", choices=sorted(FORMATS), help="match format")
+	parser.add_argument("--easy-bowling", action="store_true", help="simulate with easy bowling on")
+	parser.add_argument("--super-overs", action="store_true", help="decide tied matches with super overs")
+	parser.add_argument("--seed", type=int, help="seed for the whole job (default: random, stored in the checkpoint manifest)")
+	parser.add_argument("--shard-size", type=int, default=1000, help="matches per checkpointed shard")
+	parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+	parser.add_argument("--checkpoint-dir", default="batch_checkpoints", help="directory for the manifest and finished shards")
+	parser.add_argument("--fresh", action="store_true", help="discard existing checkpoints instead of resuming")
+	parser.add_argument("--output", help="write the merged summary to this JSON file")
+	return parser
+
+def main(argv=None):
+	args = build_parser().parse_args(argv)
+	if args.matches < 1 or args.shard_size < 1:
+		sys.exit("--matches and --shard-size must be positive")
+	if args.format == "Test":
+		sys.exit("Test matches have four innings; use python -m simengine.long_form")
+
+	teams = {team.short_name: team for team in load_squads(args.squads)}
+	fixtures = list(args.fixture)
+	if args.fixtures_file:
+		with open(args.fixtures_file) as fixtures_file:
+			fixtures += [parse_fixture(line.strip()) for line in fixtures_file if line.strip() and not line.startswith("#")]
+	if not fixtures:
+		fixtures = [[home, away] for (home, away) in permutations(teams, 2)]
+	for team in (team for fixture in fixtures for team in fixture):
+		if team not in teams:
+			sys.exit(f"Unknown team {team} in fixtures; squads has {', '.join(teams)}")
+
+	manifest_path = os.path.join(args.checkpoint_dir, "manifest.json")
+	if args.fresh and os.path.isdir(args.checkpoint_dir):
+		shutil.rmtree(args.checkpoint_dir)
+	seed = args.seed
+	if seed is None and os.path.exists(manifest_path):
+		# Resuming a job that was started without a seed
+		with open(manifest_path) as manifest_file:
+			seed = json.load(manifest_file)["seed"]
+	if seed is None:
+		seed = int(np.random.SeedSequence().entropy)
+
+	job = {
+		"squads": os.path.abspath(args.squads),
+		"format": args.format,
+		"easy_bowling_on": args.easy_bowling,
+		"super_overs": args.super_overs,
+		"fixtures": fixtures,
+		"matches": args.matches,
+		"shard_size": args.shard_size,
+		"seed": seed}
+
+	def progress(completed, total):
+		print(f"\rshards {completed}/{total}", end="", file=sys.stderr, flush=True)
+
+	try:
+		aggregate = run_batch(job, args.checkpoint_dir, args.workers, progress)
+	except ValueError as error:
+		sys.exit(str(error))
+	print(file=sys.stderr)
+
+	summary = aggregate.summary(get_format(args.format).balls_per_over)
+	summary["seed"] = seed
+	if args.output:
+		write_json(args.output, summary)
+	print("%-6s %8s %8s %9s %7s" % ("Team", "Matches", "Win %", "Avg total", "SD"))
+	for (team, stats) in summary["teams"].items():
+		print("%-6s %8d %8.1f %9.1f %7.1f" % (team, stats["matches"], 100 * stats["win_rate"], stats["mean_total"], stats["total_std"]))
+
+if __name__ == "__main__":
+	main()
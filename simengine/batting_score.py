@@ -1,17 +1,7 @@
 from typing import Optional
 
 class BattingScore:
-	player_name = ""
-	runs_scored = 0
-	balls_faced = 0
-	dots = 0
-	not_out = True
-	sixes_hit = 0
-	fours_hit = 0
-	method_of_dismissal = ""
-	bowled_by_player_name = ""
-	caught_by_player_name = ""
-	stumped_by_player_name = ""
+	__slots__ = ("player_name", "runs_scored", "balls_faced", "dots", "not_out", "sixes_hit", "fours_hit", "method_of_dismissal", "bowled_by_player_name", "caught_by_player_name", "stumped_by_player_name")
 	def __init__(self, player_name):
 		self.player_name = player_name
 		self.runs_scored = 0
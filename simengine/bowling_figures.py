@@ -2,11 +2,7 @@ from typing import Optional
 from simengine.global_helpers import overs_formatted
 
 class BowlingFigures:
-	player_name = ""
-	deliveries = 0
-	dot_balls = 0
-	runs_conceded =	0
-	wickets_taken = 0
+	__slots__ = ("player_name", "deliveries", "dot_balls", "runs_conceded", "wickets_taken", "economy_rate")
 
 	def __init__(self, player_name):
 		self.player_name = player_name
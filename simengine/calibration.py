@@ -0,0 +1,207 @@
+import argparse
+from types import MappingProxyType
+
+import numpy as np
+
+from simengine import base_event_matrices as bem
+from simengine import joint_outcomes as jo
+from simengine import probability_helpers as ph
+from simengine.formats import FORMATS, get_format
+from simengine.rng import MatchRNG
+from simengine.tournament import load_squads
+
+# Tunes the base event matrices against target match statistics instead of by hand.
+#
+# A CalibrationSample fixes a pool of real batter x bowler matchups from the squads, and the
+# uniform draws for every simulated delivery, once. Each candidate base matrix is then pushed
+# through the usual player adjustments and leaf compilation, and all deliveries are sampled in
+# one vectorized pass with those same draws (common random numbers). Differences between two
+# candidates therefore come from the matrices, not from sampling noise.
+#
+#   python -m simengine.calibration --format T20 --candidates 2000 --seed 1
+
+# Typical professional figures. Extras are per innings of innings_overs, which for Tests is a
+# realistic innings length rather than the format's cap.
+CALIBRATION_TARGETS = MappingProxyType({
+	"t20": MappingProxyType({"run_rate": 8.2, "wicket_rate": 0.33, "boundary_percentage": 16.0, "extras_per_innings": 8.0, "innings_overs": 20}),
+	"odi": MappingProxyType({"run_rate": 5.5, "wicket_rate": 0.16, "boundary_percentage": 9.5, "extras_per_innings": 12.0, "innings_overs": 50}),
+	"test": MappingProxyType({"run_rate": 3.2, "wicket_rate": 0.10, "boundary_percentage": 5.5, "extras_per_innings": 18.0, "innings_overs": 120})})
+
+TARGET_STATISTICS = ("run_rate", "wicket_rate", "boundary_percentage", "extras_per_innings")
+
+# Per-leaf values for an ordinary (not free hit) delivery; bowler type only changes dismissal names
+_leaf_results = jo.LEAF_RESULTS[(False, False)]
+LEAF_RUNS = np.array([runs + extras for (_, _, runs, extras, _, _, _) in _leaf_results], dtype=np.float64)
+LEAF_EXTRAS = np.array([extras for (_, _, _, extras, _, _, _) in _leaf_results], dtype=np.float64)
+LEAF_WICKETS = np.array([is_wicket for (_, _, _, _, is_wicket, _, _) in _leaf_results], dtype=np.float64)
+LEAF_LEGAL = np.array([delivery_name not in ("wide_ball", "no_ball") for (delivery_name, _, _, _, _, _, _) in _leaf_results], dtype=np.float64)
+LEAF_BOUNDARIES = np.array([runs in (4, 6) and delivery_name not in ("wide_ball", "no_ball") for (delivery_name, _, runs, _, _, _, _) in _leaf_results], dtype=np.float64)
+
+
+class CalibrationSample:
+	def __init__(self, teams, match_format="T20", deliveries=200000, matchups=256, bowlers_per_team=5, seed=0, easy_bowling_on=False):
+		self.match_format = get_format(match_format) if isinstance(match_format, str) else match_format
+		self.matrix_format = ph.get_matrix_format(self.match_format.overs)
+		self.easy_bowling_on = easy_bowling_on
+		rng = MatchRNG(seed).generator
+
+		# Every batter against the front-line bowlers of every other team. Top-order batters face
+		# more of the deliveries, so batting position sets the weight (11 for an opener down to 1).
+		pool = []
+		weights = []
+		for batting_team in teams:
+			for fielding_team in teams:
+				if fielding_team is batting_team:
+					continue
+				keeper = fielding_team.wicketkeeper or fielding_team.players[0]
+				fielding_skill = float(np.median([player.fielding_skill for player in fielding_team.players]))
+				bowlers = sorted((player for player in fielding_team.players if not player.is_wicketkeeper), key=lambda player: player.bowling_skill, reverse=True)[:bowlers_per_team]
+				for (position, batter) in enumerate(batting_team.players):
+					for bowler in bowlers:
+						pool.append((batter.batting_skill["pace"], batter.batting_skill["spin"], batter.batting_aggr, bowler.bowling_skill, bowler.bowler_type, keeper.fielding_skill, fielding_skill))
+						weights.append(len(batting_team.players) - position)
+		weights = np.array(weights, dtype=np.float64)
+		chosen = rng.choice(len(pool), size=min(matchups, len(pool)), replace=False, p=weights / weights.sum())
+		self.matchups = [pool[index] for index in chosen]
+
+		# The common random numbers: which matchup each delivery belongs to, and its uniform draw
+		# (sorted, since only totals are used and sorted lookups are much faster)
+		self.search_values = np.sort(rng.integers(0, len(self.matchups), size=deliveries) + rng.random(deliveries))
+		self.delivery_matchups = self.search_values.astype(np.intp)
+		self.leaf_count = len(jo.LEAVES)
+
+	def leaf_probabilities(self, base_matrix):
+		return jo.compile_leaf_probabilities_batch([ph.build_event_matrix(self.matrix_format, *matchup, self.easy_bowling_on, base_matrix) for matchup in self.matchups])
+
+	def sample_leaves(self, base_matrix):
+		# Row m of the cumulative table is shifted to [m, m + 1], so one searchsorted samples every matchup
+		cumulative = np.cumsum(self.leaf_probabilities(base_matrix), axis=1)
+		cumulative[:, -1] = 1.0
+		cumulative += np.arange(len(self.matchups))[:, None]
+		leaves = np.searchsorted(cumulative.ravel(), self.search_values, side="right") - self.delivery_matchups * self.leaf_count
+		return np.minimum(leaves, self.leaf_count - 1)
+
+	def simulate(self, base_matrix, innings_overs=None):
+		leaves = self.sample_leaves(base_matrix)
+		legal_balls = max(1.0, LEAF_LEGAL[leaves].sum())
+		balls_per_over = self.match_format.balls_per_over
+		innings_overs = innings_overs or self.match_format.overs
+		return {
+			"run_rate": balls_per_over * LEAF_RUNS[leaves].sum() / legal_balls,
+			"wicket_rate": balls_per_over * LEAF_WICKETS[leaves].sum() / legal_balls,
+			"boundary_percentage": 100 * LEAF_BOUNDARIES[leaves].sum() / legal_balls,
+			"extras_per_innings": innings_overs * balls_per_over * LEAF_EXTRAS[leaves].sum() / legal_balls}
+
+
+# SEARCH
+
+def calibration_loss(statistics, targets):
+	# Squared relative errors, so every statistic counts the same whatever its scale
+	return sum(((statistics[name] - targets[name]) / targets[name]) ** 2 for name in TARGET_STATISTICS)
+
+def matrix_distance(base_matrix, reference_matrix):
+	# Mean squared log ratio; four statistics cannot pin down every probability, so the search is
+	# pulled towards the hand-tuned matrix and only moves what the targets need
+	ratios = [np.log(max(value, 1e-6) / max(reference, 1e-6)) for name in bem.BASE_MATRIX_NAMES for (value, reference) in zip(base_matrix[name], reference_matrix[name])]
+	return float(np.mean(np.square(ratios)))
+
+def normalise_matrix(base_matrix):
+	# Sampling gives the last event of each list whatever probability is left over, so the last value
+	# is written out as that remainder; caught probabilities are independent and only clipped
+	matrix = {}
+	for name in bem.BASE_MATRIX_NAMES:
+		values = [max(0.0, float(value)) for value in base_matrix[name]]
+		if name == "caught_out_probabilities":
+			matrix[name] = tuple(min(1.0, value) for value in values)
+			continue
+		leading = values[:-1]
+		if sum(leading) > 1.0:
+			return None
+		matrix[name] = tuple(leading + [1.0 - sum(leading)])
+	return MappingProxyType(matrix)
+
+def perturb_matrix(base_matrix, rng, step):
+	# Log-normal steps keep probabilities positive and move small and large values in proportion
+	candidate = {}
+	for name in bem.BASE_MATRIX_NAMES:
+		values = np.array(base_matrix[name], dtype=np.float64)
+		candidate[name] = values * np.exp(rng.normal(0.0, step, size=len(values)))
+	return normalise_matrix(candidate)
+
+def calibrate(sample, targets=None, candidates=1000, seed=0, step=0.05, start_matrix=None, regularisation=0.01, progress=None):
+	# (1+1) evolution strategy with the one-fifth success rule for the step size
+	targets = targets or CALIBRATION_TARGETS[sample.matrix_format]
+	rng = np.random.default_rng(seed)
+	start_matrix = normalise_matrix(start_matrix or bem.get_base_event_matrix(sample.matrix_format))
+	best_matrix = start_matrix
+	best_statistics = sample.simulate(best_matrix, targets.get("innings_overs"))
+	best_loss = calibration_loss(best_statistics, targets)
+	start_loss = best_loss
+	for candidate_number in range(candidates):
+		candidate = perturb_matrix(best_matrix, rng, step)
+		if candidate is None:
+			step *= 0.85
+			continue
+		statistics = sample.simulate(candidate, targets.get("innings_overs"))
+		loss = calibration_loss(statistics, targets) + regularisation * matrix_distance(candidate, start_matrix)
+		if loss < best_loss:
+			(best_matrix, best_statistics, best_loss) = (candidate, statistics, loss)
+			step *= 1.5
+		else:
+			step *= 0.9
+		step = min(max(step, 1e-4), 0.5)
+		if progress:
+			progress(candidate_number + 1, best_loss)
+	return CalibrationResult(best_matrix, best_statistics, best_loss, start_loss, targets)
+
+class CalibrationResult:
+	def __init__(self, base_matrix, statistics, loss, start_loss, targets):
+		self.base_matrix = base_matrix
+		self.statistics = statistics
+		self.loss = loss
+		self.start_loss = start_loss
+		self.targets = targets
+
+	def to_dict(self):
+		return {
+			"base_matrix": {name: list(values) for (name, values) in self.base_matrix.items()},
+			"statistics": self.statistics,
+			"targets": dict(self.targets),
+			"loss": self.loss,
+			"start_loss": self.start_loss}
+
+	def formatted_matrix(self):
+		# Ready to paste into base_event_matrices.py
+		return "\n".join("\t%s = [%s]" % (name, ", ".join("%.4f" % value for value in self.base_matrix[name])) for name in bem.BASE_MATRIX_NAMES)
+
+
+# COMMAND LINE
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog="python -m simengine.calibration", description="Search base event matrix parameters until simulated statistics match targets.")
+	parser.add_argument("--format", default="T20", choices=sorted(FORMATS), help="match format to calibrate")
+	parser.add_argument("--squads", default="players_to_import.csv", help="squad CSV the matchups are drawn from")
+	parser.add_argument("--candidates", type=int, default=1000, help="candidate matrices to evaluate")
+	parser.add_argument("--deliveries", type=int, default=200000, help="deliveries simulated per candidate")
+	parser.add_argument("--matchups", type=int, default=256, help="batter x bowler matchups in the sample")
+	parser.add_argument("--seed", type=int, default=0, help="seed for the sample and the search")
+	parser.add_argument("--regularisation", type=float, default=0.01, help="weight pulling candidates towards the current matrix")
+	for name in TARGET_STATISTICS:
+		parser.add_argument("--" + name.replace("_", "-"), type=float, help="target %s (default: the format's CALIBRATION_TARGETS)" % name.replace("_", " "))
+	args = parser.parse_args(argv)
+
+	sample = CalibrationSample(load_squads(args.squads), args.format, args.deliveries, args.matchups, seed=args.seed)
+	targets = dict(CALIBRATION_TARGETS[sample.matrix_format])
+	for name in TARGET_STATISTICS:
+		if getattr(args, name) is not None:
+			targets[name] = getattr(args, name)
+	result = calibrate(sample, targets, args.candidates, args.seed, regularisation=args.regularisation)
+
+	print("%-20s %10s %10s" % ("Statistic", "Target", "Simulated"))
+	for name in TARGET_STATISTICS:
+		print("%-20s %10.3f %10.3f" % (name, targets[name], result.statistics[name]))
+	print("loss %.6f (started at %.6f)\n" % (result.loss, result.start_loss))
+	print(result.formatted_matrix())
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,127 @@
+import struct
+
+import numpy as np
+
+from simengine import outcomes as oc
+from simengine.scorecard import InningsScorecard
+
+# Ball-by-ball storage for an innings as one packed blob (Innings.delivery_blob), four bytes a ball.
+#
+#   header   version (1 byte), batting and bowling roster sizes (1 byte each),
+#            then the player ids of both rosters in slot order (4 bytes each)
+#   balls    one little-endian uint32 per delivery, in the order bowled:
+#              bits  0-4   striker slot          bits 15-19  slot of the fielder involved (31: none)
+#              bits  5-9   non-striker slot      bits 20-21  delivery type code
+#              bits 10-14  bowler slot           bits 22-24  stroke type code + 1 (0: no stroke)
+#                                                bits 25-27  index of the runs in HIT_RUNS
+#                                                bits 28-30  dismissal code
+#
+# Extras, wickets, over and ball numbers and the score after each ball all follow from these,
+# and the rosters make a blob readable however the squads change later.
+
+VERSION = 1
+NO_SLOT = 31
+MAX_ROSTER = NO_SLOT
+
+BALL_DTYPE = np.dtype("<u4")
+DECODED_DTYPE = np.dtype([("striker_slot", np.uint8), ("non_striker_slot", np.uint8), ("bowler_slot", np.uint8), ("fielder_slot", np.uint8), ("delivery_type", np.uint8), ("stroke_type", np.int8), ("runs_scored", np.uint8), ("extras", np.uint8), ("is_wicket", np.bool_), ("dismissal_type", np.uint8)])
+
+_RUNS_INDEX = {runs: index for (index, runs) in enumerate(oc.HIT_RUNS)}
+_DELIVERY_CODES = {name: code for (code, name) in enumerate(oc.DELIVERY_TYPE_NAMES)}
+_STROKE_CODES = {name: code for (code, name) in enumerate(oc.STROKE_TYPE_NAMES)}
+_DISMISSAL_CODES = {name: code for (code, name) in enumerate(oc.DISMISSAL_NAMES)}
+_HIT_RUNS = np.array(oc.HIT_RUNS, dtype=np.uint8)
+
+def new_blob(batting_ids, bowling_ids):
+	if len(batting_ids) > MAX_ROSTER or len(bowling_ids) > MAX_ROSTER:
+		raise ValueError(f"Rosters of more than {MAX_ROSTER} players cannot be packed")
+	return struct.pack("<BBB%dI" % (len(batting_ids) + len(bowling_ids)), VERSION, len(batting_ids), len(bowling_ids), *batting_ids, *bowling_ids)
+
+def read_header(blob):
+	# (batting ids, bowling ids, offset of the first ball)
+	(version, batting_size, bowling_size) = struct.unpack_from("<BBB", blob)
+	if version != VERSION:
+		raise ValueError(f"Unknown delivery blob version {version}")
+	ids = struct.unpack_from("<%dI" % (batting_size + bowling_size), blob, 3)
+	return (ids[:batting_size], ids[batting_size:], 3 + 4 * (batting_size + bowling_size))
+
+def delivery_count(blob):
+	if not blob:
+		return 0
+	return (len(blob) - read_header(blob)[2]) // BALL_DTYPE.itemsize
+
+def encode_delivery(striker_slot, non_striker_slot, bowler_slot, fielder_slot, delivery_result):
+	return (striker_slot
+		| non_striker_slot << 5
+		| bowler_slot << 10
+		| (NO_SLOT if fielder_slot is None else fielder_slot) << 15
+		| _DELIVERY_CODES[delivery_result.delivery_type] << 20
+		| (_STROKE_CODES.get(delivery_result.stroke_type, oc.NO_STROKE) + 1) << 22
+		| _RUNS_INDEX[delivery_result.runs_scored] << 25
+		| _DISMISSAL_CODES[delivery_result.dismissal_type if delivery_result.is_wicket else None] << 28)
+
+def append_delivery(blob, striker_id, non_striker_id, bowler_id, fielder_id, delivery_result):
+	# fielder_id: the fielder or keeper named in fielder_involved, if any
+	(batting_ids, bowling_ids, _) = read_header(blob)
+	fielder_slot = bowling_ids.index(fielder_id) if fielder_id is not None else None
+	ball = encode_delivery(batting_ids.index(striker_id), batting_ids.index(non_striker_id), bowling_ids.index(bowler_id), fielder_slot, delivery_result)
+	return blob + struct.pack("<I", ball)
+
+def decode_deliveries(blob):
+	# (batting ids, bowling ids, one DECODED_DTYPE row per ball), unpacked with array arithmetic
+	(batting_ids, bowling_ids, offset) = read_header(blob)
+	balls = np.frombuffer(blob, dtype=BALL_DTYPE, offset=offset)
+	deliveries = np.zeros(len(balls), dtype=DECODED_DTYPE)
+	for (field, shift, mask) in (("striker_slot", 0, 31), ("non_striker_slot", 5, 31), ("bowler_slot", 10, 31), ("fielder_slot", 15, 31), ("delivery_type", 20, 3), ("dismissal_type", 28, 7)):
+		deliveries[field] = (balls >> shift) & mask
+	deliveries["stroke_type"] = ((balls >> 22) & 7).astype(np.int8) - 1
+	deliveries["runs_scored"] = _HIT_RUNS[(balls >> 25) & 7]
+	deliveries["extras"] = deliveries["delivery_type"] <= oc.WIDE_BALL
+	deliveries["is_wicket"] = deliveries["dismissal_type"] != oc.NOT_OUT
+	return (batting_ids, bowling_ids, deliveries)
+
+def fielder_involved(dismissal_type, fielder_slot):
+	if fielder_slot == NO_SLOT:
+		return None
+	return "wicketkeeper" if dismissal_type in (oc.STUMPED, oc.CAUGHT_BEHIND) else "fielder"
+
+def delivery_records(blob, balls_per_over):
+	# The fields of Delivery rows, numbered as the simulate-delivery route numbers them
+	(batting_ids, bowling_ids, deliveries) = decode_deliveries(blob)
+	total_runs = np.cumsum(deliveries["runs_scored"].astype(np.int64) + deliveries["extras"])
+	wickets = np.cumsum(deliveries["is_wicket"])
+	return [{
+		"over_number": index // balls_per_over + 1,
+		"ball_number": index % balls_per_over + 1,
+		"bowler_id": bowling_ids[ball["bowler_slot"]],
+		"striker_id": batting_ids[ball["striker_slot"]],
+		"non_striker_id": batting_ids[ball["non_striker_slot"]],
+		"fielder_id": bowling_ids[ball["fielder_slot"]] if ball["fielder_slot"] != NO_SLOT else None,
+		"delivery_type": oc.DELIVERY_TYPE_NAMES[ball["delivery_type"]],
+		"stroke_type": oc.stroke_name(int(ball["stroke_type"])),
+		"runs_scored": int(ball["runs_scored"]),
+		"extras": int(ball["extras"]),
+		"is_wicket": bool(ball["is_wicket"]),
+		"dismissal_type": oc.DISMISSAL_NAMES[ball["dismissal_type"]],
+		"fielder_involved": fielder_involved(ball["dismissal_type"], ball["fielder_slot"]),
+		"total_runs_after": int(total_runs[index]),
+		"wickets_after": int(wickets[index])} for (index, ball) in enumerate(deliveries)]
+
+def outcome_codes(deliveries):
+	# Outcome codes for scorecard.InningsScorecard, as striker slots, bowler slots and codes;
+	# a no-ball adds its own code to the runs scored off it
+	codes = np.where(deliveries["is_wicket"], oc.OUTCOME_BOWLED - oc.BOWLED + deliveries["dismissal_type"].astype(np.int32), np.searchsorted(_HIT_RUNS, deliveries["runs_scored"]))
+	codes = np.where(deliveries["delivery_type"] == oc.WIDE_BALL, oc.OUTCOME_WIDE, codes)
+	no_balls = deliveries["delivery_type"] == oc.NO_BALL
+	striker_slots = np.concatenate([deliveries["striker_slot"], deliveries["striker_slot"][no_balls]]).astype(np.int32)
+	bowler_slots = np.concatenate([deliveries["bowler_slot"], deliveries["bowler_slot"][no_balls]]).astype(np.int32)
+	return (striker_slots, bowler_slots, np.concatenate([codes, np.full(no_balls.sum(), oc.OUTCOME_NO_BALL)]).astype(np.int32))
+
+def innings_scorecard(blob):
+	# (batting ids, bowling ids, InningsScorecard, dismissals): dismissals maps a batter's slot to
+	# (dismissal name, bowler slot, fielder slot) for the ball they were out to
+	(batting_ids, bowling_ids, deliveries) = decode_deliveries(blob)
+	(striker_slots, bowler_slots, codes) = outcome_codes(deliveries)
+	scorecard = InningsScorecard.from_packed((striker_slots << 16) | (bowler_slots << 8) | codes, len(batting_ids), len(bowling_ids))
+	dismissals = {int(ball["striker_slot"]): (oc.DISMISSAL_NAMES[ball["dismissal_type"]], int(ball["bowler_slot"]), int(ball["fielder_slot"])) for ball in deliveries[deliveries["is_wicket"]]}
+	return (batting_ids, bowling_ids, scorecard, dismissals)
@@ -1,7 +1,9 @@
-from typing import Optional
+from typing import Any, Optional
 from dataclasses import dataclass
+from simengine.outcomes import DELIVERY_TYPE_NAMES, DISMISSAL_NAMES, FIELDER_NAMES, stroke_name
 
-@dataclass
+# Slotted: one is made per simulated ball
+@dataclass(slots=True)
 class DeliveryResult:
     delivery_type: str  # ['no_ball', 'wide_ball', 'fair_delivery', 'good_delivery']
     stroke_type: str    # ['miss', 'dot', 'hit', 'slog']
@@ -10,3 +12,27 @@ class DeliveryResult:
     is_wicket: bool
     dismissal_type: Optional[str] = None  # ['bowled', 'lbw', 'stumped', 'caught']
     fielder_involved: Optional[str] = None  # ['wicketkeeper', 'fielder']
+
+@dataclass
+class DeliveryBatch:
+    # NumPy arrays, one entry per ball; codes are defined in simengine.outcomes
+    delivery_type: Any
+    stroke_type: Any
+    runs_scored: Any
+    extras: Any
+    is_wicket: Any
+    dismissal_type: Any
+    fielder_involved: Any
+
+    def __len__(self):
+        return len(self.delivery_type)
+
+    def to_delivery_result(self, index: int) -> DeliveryResult:
+        return DeliveryResult(
+            delivery_type=DELIVERY_TYPE_NAMES[self.delivery_type[index]],
+            stroke_type=stroke_name(self.stroke_type[index]),
+            runs_scored=int(self.runs_scored[index]),
+            extras=int(self.extras[index]),
+            is_wicket=bool(self.is_wicket[index]),
+            dismissal_type=DISMISSAL_NAMES[self.dismissal_type[index]],
+            fielder_involved=FIELDER_NAMES[self.fielder_involved[index]])
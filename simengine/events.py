@@ -1,98 +1,153 @@
-import random
+import numpy as np
 from . import probability_helpers as ph
+from . import outcomes as oc
+from . import joint_outcomes as jo
 # import ai_helpers as ai
 import time
-from .delivery_result import DeliveryResult
+from .delivery_result import DeliveryResult, DeliveryBatch
+from .rng import resolve_rng
 
 
 # DELIVERY HELPERS
 
-def bowl_to_bat(event_matrix):
+def bowl_to_bat(compiled_matrix, rng=None):
+	rng = resolve_rng(rng)
 	miss_event = -1
 	miss_event_name = ""
 	runs = 0
 	stroke_type = -1
 	stroke_name = ""
 	stroke_result = ""
-	# print("bowl probs: "+ str(event_matrix["bowl_probabilities"]))
-	(delivery_type, delivery_name) = ph.get_delivery_type(random.random(), event_matrix["bowl_probabilities"])
-	if delivery_type != 1:
-		# print("stroke probs: "+str(event_matrix["stroke_probabilities"]))
-		(stroke_type, stroke_name) = ph.get_stroke_type(random.random(), event_matrix["stroke_probabilities"])
-		if (stroke_type == 0):
-			# print("miss probs: "+str(event_matrix["miss_probabilities"]))
-			(miss_event, miss_event_name) = ph.get_miss_result(random.random(), event_matrix["miss_probabilities"])
-		elif (stroke_type == 1):
+	delivery_type = compiled_matrix.bowl.sample(rng.random())
+	if delivery_type != oc.WIDE_BALL:
+		stroke_type = compiled_matrix.stroke.sample(rng.random())
+		stroke_name = oc.STROKE_TYPE_NAMES[stroke_type]
+		if (stroke_type == oc.MISS):
+			miss_event = compiled_matrix.miss.sample(rng.random())
+			miss_event_name = ph.MISS_RESULT_NAMES[miss_event]
+		elif (stroke_type == oc.DOT):
 			stroke_result = "dot"
 		else:
-			(runs, stroke_result) = bat_to_field(stroke_type, event_matrix, delivery_type == 3)
+			(runs, stroke_result) = bat_to_field(stroke_type, compiled_matrix, delivery_type == oc.GOOD_DELIVERY, rng)
 
-	return (delivery_type, delivery_name, stroke_type, stroke_name, miss_event, miss_event_name, runs, stroke_result)
+	return (delivery_type, oc.DELIVERY_TYPE_NAMES[delivery_type], stroke_type, stroke_name, miss_event, miss_event_name, runs, stroke_result)
 
-def bat_to_field(stroke_type, event_matrix, is_good_delivery):
+def bat_to_field(stroke_type, compiled_matrix, is_good_delivery, rng=None):
+	rng = resolve_rng(rng)
 	modifier = 0.9 if is_good_delivery else 1.0
-	if (stroke_type == 2):
-		# print("hit probs: "+str(event_matrix["hit_probabilities"]))
-		return ph.get_hit_result(modifier * random.random(), event_matrix["hit_probabilities"], event_matrix["caught_out_probabilities"])
-	elif (stroke_type == 3):
-		# print("slog probs: "+str(event_matrix["slog_probabilities"]))
-		return ph.get_slog_result(modifier * random.random(), event_matrix["slog_probabilities"], event_matrix["caught_out_probabilities"])
-
-def delivery(batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, is_free_hit, easy_bowling_on, max_overs):
-	is_wicket = False
-	extras = 0
-	is_no_ball = False
-	dismissal_type = None
-	fielder_involved = None
-	
-	event_matrix = ph.create_event_matrix(batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, easy_bowling_on, max_overs)
-	(delivery_type, delivery_name, stroke_type, stroke_name, miss_event, miss_event_name, runs, stroke_result) = bowl_to_bat(event_matrix)
-
-	if (delivery_type == 1):
-		extras = 1
-	else:
-		if (delivery_type == 0):
-			extras = 1
-			is_no_ball = True
-		if miss_event != -1:
-			if miss_event == 0 and not is_no_ball and not is_free_hit:
-				is_wicket = True
-				dismissal_type = "bowled"
-			elif miss_event == 1  and not is_no_ball and not is_free_hit:
-				is_wicket = True
-				dismissal_type = "lbw"
-			elif miss_event == 2  and not is_no_ball and not is_free_hit:
-				is_wicket = True
-				if bowling_type == "spinner":
-					dismissal_type = "stumped"
-					fielder_involved = "wicketkeeper"
-				else:
-					dismissal_type = "caught behind"
-					fielder_involved = "wicketkeeper"
-		else:
-			if (runs == 0):
-				if (stroke_result == "caught") and not is_no_ball and not is_free_hit:
-					is_wicket = True
-					dismissal_type = "caught"
-					fielder_involved = "fielder"
-				elif (stroke_result == "dropped"):
-					if stroke_type == 3:
-						# Implement drop logic here
-						fielder_involved = "fielder"
-						runs = 1
-					else:
-						# Implement drop logic here
-						fielder_involved = "fielder"
-				else:
-					# Simple dot
-					pass
-
-	return DeliveryResult(
-		delivery_type=delivery_name,
-		stroke_type=stroke_name,
+	if (stroke_type == oc.HIT):
+		return ph.get_field_result(compiled_matrix.hit.sample(modifier * rng.random()), compiled_matrix.event_matrix["caught_out_probabilities"], "hit", rng)
+	elif (stroke_type == oc.SLOG):
+		return ph.get_field_result(compiled_matrix.slog.sample(modifier * rng.random()), compiled_matrix.event_matrix["caught_out_probabilities"], "slog", rng)
+
+def delivery_tree(batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, is_free_hit, easy_bowling_on, max_overs, rng=None):
+	compiled_matrix = ph.create_compiled_event_matrix(batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, easy_bowling_on, max_overs)
+	(delivery_type, delivery_name, stroke_type, stroke_name, miss_event, miss_event_name, runs, stroke_result) = bowl_to_bat(compiled_matrix, rng)
+	return DeliveryResult(*jo.resolve_delivery(delivery_type, stroke_type, miss_event, runs, stroke_result, bowling_type, is_free_hit))
+
+# One uniform draw against the joint outcome distribution of the matchup
+def delivery(batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, is_free_hit, easy_bowling_on, max_overs, rng=None):
+	joint_distribution = jo.create_joint_distribution(batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, easy_bowling_on, max_overs)
+	return joint_distribution.delivery(resolve_rng(rng).random(), is_free_hit)
+
+
+# BATCH DELIVERIES
+
+def _sample_events(seeds, cumulative_probs):
+	# Same rule as get_event_number: first event whose running total exceeds the seed
+	events = (seeds[:, None] >= np.maximum.accumulate(cumulative_probs, axis=1)).sum(axis=1)
+	return np.minimum(events, cumulative_probs.shape[1] - 1)
+
+BATCH_BOWLING_TYPES = ("pace", "spin", "spinner")
+
+def _factorize(column):
+	if column.strides == (0,):
+		return (column[:1], np.zeros(column.shape, dtype=np.int64))
+	return np.unique(column, return_inverse=True)
+
+def _batch_matrices(columns, easy_bowling_on, max_overs):
+	# Each distinct attribute row gets one (cached) event matrix; balls index into the stacked matrices
+	row_key = np.zeros(columns[0].shape, dtype=np.int64)
+	column_values = []
+	for column in columns:
+		(values, codes) = _factorize(column)
+		row_key = row_key * len(values) + codes.reshape(-1)
+		column_values.append(values)
+	(unique_keys, row_index) = np.unique(row_key, return_inverse=True)
+	probabilities = {name: [] for name in ("bowl_probabilities", "stroke_probabilities", "miss_probabilities", "hit_probabilities", "slog_probabilities", "caught_out_probabilities")}
+	for key in unique_keys.tolist():
+		row = []
+		for values in reversed(column_values):
+			row.append(values[key % len(values)].item())
+			key //= len(values)
+		(fielding_skill, wicketkeeper_fielding_skill, bowling_type_code, bowling_skill, batting_aggression, batting_vs_spin, batting_vs_pace) = row
+		event_matrix = ph.create_event_matrix(batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, BATCH_BOWLING_TYPES[bowling_type_code], wicketkeeper_fielding_skill, fielding_skill, easy_bowling_on, max_overs)
+		for name in probabilities:
+			probabilities[name].append(event_matrix[name])
+	matrices = {}
+	for name, rows in probabilities.items():
+		rows = np.array(rows, dtype=np.float64)
+		matrices[name] = rows if name == "caught_out_probabilities" else np.cumsum(rows, axis=1)
+	return (matrices, row_index.reshape(-1))
+
+def delivery_batch(batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, is_free_hit, easy_bowling_on, max_overs, rng=None):
+	rng = resolve_rng(rng)
+	bowling_type = np.asarray(bowling_type)
+	# Any other bowling type is treated as pace by the adjust functions
+	bowling_type_code = np.where(bowling_type == "spinner", 2, np.where(bowling_type == "spin", 1, 0))
+	columns = [column.reshape(-1) if column.ndim else column.reshape(1) for column in np.broadcast_arrays(batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type_code, wicketkeeper_fielding_skill, fielding_skill, is_free_hit)]
+	is_free_hit = columns.pop().astype(bool)
+	num_balls = columns[0].size
+	(matrices, row) = _batch_matrices(columns, easy_bowling_on, max_overs)
+
+	# One column per level of the bowl -> stroke -> miss/hit/slog -> caught tree
+	seeds = rng.generator.random((num_balls, 4))
+	delivery_type = _sample_events(seeds[:, 0], matrices["bowl_probabilities"][row]).astype(np.int8)
+	stroke_type = _sample_events(seeds[:, 1], matrices["stroke_probabilities"][row]).astype(np.int8)
+	is_good_delivery = delivery_type == oc.GOOD_DELIVERY
+	field_seeds = np.where(is_good_delivery, 0.9, 1.0) * seeds[:, 2]
+	miss_event = _sample_events(seeds[:, 2], matrices["miss_probabilities"][row])
+	hit_event = _sample_events(field_seeds, matrices["hit_probabilities"][row])
+	slog_event = _sample_events(field_seeds, matrices["slog_probabilities"][row])
+
+	is_wide = delivery_type == oc.WIDE_BALL
+	is_no_ball = delivery_type == oc.NO_BALL
+	stroke_type[is_wide] = oc.NO_STROKE
+	is_miss = stroke_type == oc.MISS
+	is_hit = stroke_type == oc.HIT
+	is_slog = stroke_type == oc.SLOG
+	field_event = np.where(is_hit, hit_event, slog_event)
+	runs = np.where(is_hit | is_slog, np.array(oc.HIT_RUNS, dtype=np.int8)[field_event], 0).astype(np.int8)
+	extras = (is_wide | is_no_ball).astype(np.int8)
+	can_be_out = ~is_no_ball & ~is_free_hit
+
+	dismissal_type = np.zeros(num_balls, dtype=np.int8)
+	fielder_involved = np.zeros(num_balls, dtype=np.int8)
+	bowled_or_lbw = is_miss & (miss_event < 2) & can_be_out
+	dismissal_type[bowled_or_lbw] = np.where(miss_event[bowled_or_lbw] == 0, oc.BOWLED, oc.LBW)
+	# Matches events.delivery, which only credits a stumping to "spinner" bowlers
+	keeper_dismissal = is_miss & (miss_event == 2) & can_be_out
+	is_spinner = columns[4] == 2
+	dismissal_type[keeper_dismissal] = np.where(is_spinner[keeper_dismissal], oc.STUMPED, oc.CAUGHT_BEHIND)
+	fielder_involved[keeper_dismissal] = oc.WICKETKEEPER
+
+	caught_probabilities = matrices["caught_out_probabilities"][row]
+	catch_chance = np.where(is_hit, caught_probabilities[:, 0], caught_probabilities[:, 1])
+	drop_chance = np.where(is_hit, 0.06, 0.15)
+	is_chance = (is_hit | is_slog) & (field_event == 0)
+	is_caught = is_chance & (seeds[:, 3] < catch_chance)
+	is_dropped = is_chance & ~is_caught & (seeds[:, 3] < drop_chance)
+	caught_out = is_caught & can_be_out
+	dismissal_type[caught_out] = oc.CAUGHT
+	fielder_involved[caught_out | is_dropped] = oc.FIELDER
+	runs[is_dropped & is_slog] = 1
+
+	return DeliveryBatch(
+		delivery_type=delivery_type,
+		stroke_type=stroke_type,
 		runs_scored=runs,
 		extras=extras,
-		is_wicket=is_wicket,
+		is_wicket=dismissal_type != oc.NOT_OUT,
 		dismissal_type=dismissal_type,
 		fielder_involved=fielder_involved)
 
@@ -0,0 +1,82 @@
+import argparse
+import copy
+import tracemalloc
+
+from simengine.delivery_result import DeliveryResult
+from simengine.formats import get_format
+from simengine.innings import InningsState
+from simengine.match_fork import InningsFork
+from simengine.matchup_table import MatchupTable
+from simengine.rng import MatchRNG
+from simengine.tournament import load_squads
+
+# Memory benchmark for live match states: how many bytes each copy of a mid-innings state holds,
+# as the object model (two squads with their scorecards plus the InningsState) and as an InningsFork.
+# Win probability and playouts hold thousands of these at once.
+#
+#   python -m simengine.footprint --home KKR --away RCB --states 5000
+
+def measure(build, count):
+	# Bytes per object still allocated after building count of them
+	tracemalloc.start()
+	before = tracemalloc.get_traced_memory()[0]
+	kept = [build() for _ in range(count)]
+	after = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	del kept
+	return (after - before) / count
+
+def live_innings(batting_team, fielding_team, match_format, rng):
+	# An innings ten overs in, with scorecards filled by the engine's own delivery path
+	table = MatchupTable(batting_team, fielding_team, False, match_format.overs)
+	innings = InningsState(1, match_format.overs, batting_team, fielding_team, batting_team.players[0], batting_team.players[1], -1, False, rng, match_format)
+	innings.set_openers(batting_team.players[0], batting_team.players[1])
+	bowlers = sorted(fielding_team.players, key=lambda player: -player.bowling_skill)[:5]
+	next_batter = 2
+	while innings.deliveries < 10 * match_format.balls_per_over and innings.total_wickets < 5:
+		innings.current_bowler = bowlers[(innings.deliveries // match_format.balls_per_over) % len(bowlers)]
+		fielder = fielding_team.players[int(rng.random() * 11)]
+		delivery = table.lookup(innings.on_strike_batsman, innings.current_bowler, fielder, fielding_team.wicketkeeper or fielder).delivery(rng.random(), innings.is_free_hit)
+		innings.record_delivery(delivery, fielder, fielding_team.wicketkeeper or fielder)
+		if delivery.is_wicket:
+			innings.on_strike_batsman = batting_team.players[next_batter]
+			next_batter += 1
+	return (innings, table)
+
+def footprint(home_team, away_team, states=1000, match_format="T20", seed=None):
+	match_format = get_format(match_format)
+	(innings, table) = live_innings(home_team, away_team, match_format, MatchRNG(seed))
+	fork = InningsFork.from_innings(innings, table, None)
+	delivery = DeliveryResult("fair_delivery", "hit", 4, 0, False)
+	return {
+		"states": states,
+		"bytes_per_player": measure(lambda: copy.deepcopy(home_team.players[0]), states),
+		"bytes_per_team": measure(lambda: copy.deepcopy(home_team), max(1, states // 10)),
+		"bytes_per_delivery_result": measure(lambda: copy.copy(delivery), states),
+		"bytes_per_match_state": measure(lambda: copy.deepcopy(innings, {id(innings.rng): innings.rng, id(innings.match_format): innings.match_format}), max(1, states // 10)),
+		"bytes_per_innings_fork": measure(fork.fork, states)}
+
+
+# COMMAND LINE
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog="python -m simengine.footprint", description="Measure the memory held by copies of a live match state.")
+	parser.add_argument("--home", required=True, help="batting team short name")
+	parser.add_argument("--away", required=True, help="fielding team short name")
+	parser.add_argument("--states", type=int, default=1000, help="copies to hold while measuring")
+	parser.add_argument("--format", default="T20", help="match format")
+	parser.add_argument("--squads", default="players_to_import.csv", help="squad CSV built from team_lists.txt and all_squads.csv")
+	parser.add_argument("--seed", type=int, help="seed for the deliveries played before copying")
+	args = parser.parse_args(argv)
+
+	teams = {team.short_name: team for team in load_squads(args.squads)}
+	for team in (args.home.upper(), args.away.upper()):
+		if team not in teams:
+			parser.error(f"Unknown team {team}; squads has {', '.join(teams)}")
+	result = footprint(teams[args.home.upper()], teams[args.away.upper()], args.states, args.format, args.seed)
+	for (name, value) in result.items():
+		if name != "states":
+			print("%-26s %10.0f bytes" % (name, value))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,80 @@
+from types import MappingProxyType
+
+# Match formats are data: overs, balls per over, the bowler quota, powerplay phases and the
+# base event matrix. Everything derived from them is computed once here, so supporting a new
+# format is a registry entry rather than another branch in the simulation.
+
+class MatchFormat:
+	def __init__(self, code, name, overs, balls_per_over, bowler_overs, phases, base_matrix):
+		self.code = code
+		self.name = name
+		self.overs = overs
+		self.balls_per_over = balls_per_over
+		self.bowler_overs = bowler_overs
+		# (phase name, first over, end over) covering every over of the innings
+		self.phases = tuple(phases)
+		self.base_matrix = base_matrix
+		self.total_balls = overs * balls_per_over
+		self.bowler_quota_balls = bowler_overs * balls_per_over
+		self.over_phases = tuple(name for (name, first_over, end_over) in self.phases for _ in range(first_over, end_over))
+
+	def phase(self, over):
+		return self.over_phases[over]
+
+	def to_dict(self):
+		return {
+			"code": self.code,
+			"name": self.name,
+			"overs": self.overs,
+			"balls_per_over": self.balls_per_over,
+			"bowler_overs": self.bowler_overs,
+			"total_balls": self.total_balls,
+			"phases": [list(phase) for phase in self.phases]}
+
+# Formats without a registry entry keep the original rule: 50 overs is an ODI, anything longer a Test
+def base_matrix_for_overs(overs):
+	if (overs == 50):
+		return "odi"
+	elif (overs > 50):
+		return "test"
+	return "t20"
+
+def custom_format(overs, balls_per_over=6, bowler_overs=None):
+	if bowler_overs is None:
+		bowler_overs = max(1, overs // 5)
+	powerplay_overs = min(overs, max(1, overs * 3 // 10))
+	death_overs = min(overs - powerplay_overs, overs // 5)
+	phases = (("powerplay", 0, powerplay_overs), ("middle", powerplay_overs, overs - death_overs), ("death", overs - death_overs, overs))
+	return MatchFormat("custom_%d" % overs, "%d overs" % overs, overs, balls_per_over, bowler_overs, phases, base_matrix_for_overs(overs))
+
+FORMATS = MappingProxyType({match_format.code: match_format for match_format in (
+	MatchFormat("T20", "Twenty20", 20, 6, 4, (("powerplay", 0, 6), ("middle", 6, 16), ("death", 16, 20)), "t20"),
+	MatchFormat("ODI", "One Day International", 50, 6, 10, (("powerplay", 0, 10), ("middle", 10, 40), ("death", 40, 50)), "odi"),
+	MatchFormat("Test", "Test", 450, 6, 90, (("middle", 0, 450),), "test"),
+	MatchFormat("T10", "Ten10", 10, 6, 2, (("powerplay", 0, 3), ("middle", 3, 7), ("death", 7, 10)), "t20"),
+	# 100 balls as 20 sets of 5; a bowler may deliver at most 20 balls
+	MatchFormat("Hundred", "The Hundred", 20, 5, 4, (("powerplay", 0, 5), ("middle", 5, 15), ("death", 15, 20)), "t20"))})
+
+# The first six-ball format registered for a number of overs wins, so 20 overs resolves to T20
+FORMATS_BY_OVERS = {}
+for match_format in FORMATS.values():
+	if match_format.balls_per_over == 6:
+		FORMATS_BY_OVERS.setdefault(match_format.overs, match_format)
+
+# Read by create_event_matrix on every cache lookup, so custom overs are filled in on first use
+MATRIX_FORMAT_BY_OVERS = {overs: match_format.base_matrix for (overs, match_format) in FORMATS_BY_OVERS.items()}
+
+def get_format(code):
+	if code not in FORMATS:
+		raise ValueError(f"Unknown match format: {code}")
+	return FORMATS[code]
+
+def format_for_overs(overs):
+	if overs not in FORMATS_BY_OVERS:
+		FORMATS_BY_OVERS[overs] = custom_format(overs)
+	return FORMATS_BY_OVERS[overs]
+
+def matrix_format_for_overs(overs):
+	if overs not in MATRIX_FORMAT_BY_OVERS:
+		MATRIX_FORMAT_BY_OVERS[overs] = base_matrix_for_overs(overs)
+	return MATRIX_FORMAT_BY_OVERS[overs]
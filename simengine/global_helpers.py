@@ -1,4 +1,4 @@
-import numpy as np
+from simengine.rng import resolve_rng
 
 def overs_formatted(deliveries):
 	num_overs = int(deliveries/6)
@@ -6,26 +6,23 @@ def overs_formatted(deliveries):
 	return str(num_overs)+ ("."+str(num_balls) if num_balls > 0 else "")
 
 def apply_mult_to_team(team, multipliers):
-	for player in team.players:
-		player.batting_aggr = min(100,round(player.batting_aggr * multipliers[0]))
-		bowl_mult = multipliers[1] if player.is_spinner() else multipliers[2]
-		player.bowling_skill = min(100,round(player.bowling_skill * bowl_mult))
-	return team
+	# A view of the team with the multipliers applied (player_and_team.effective_attributes); team is not changed
+	return team.adjusted(multipliers)
 
 def apply_multipliers(home_team, away_team, multipliers, need_multiplier):
+	# Always views, so the match never plays on (or scores into) the teams it was given
 	if need_multiplier:
-		home_team = apply_mult_to_team(home_team, multipliers)
-		away_team = apply_mult_to_team(away_team, multipliers)
-	return (home_team, away_team)
+		return (apply_mult_to_team(home_team, multipliers), apply_mult_to_team(away_team, multipliers))
+	return (home_team.adjusted(), away_team.adjusted())
 
 def clean_value(num):
 	return round(num,2)
 
-def modify_multiplier(mult_val):
-	return clean_value(np.random.normal(mult_val,.05/3))
+def modify_multiplier(mult_val, rng=None):
+	return clean_value(resolve_rng(rng).normal(mult_val,.05/3))
 
-def apply_conditions(multipliers):
+def apply_conditions(multipliers, rng=None):
 	new_multipliers = []
 	for i in range(len(multipliers)):
-		new_multipliers.append(modify_multiplier(multipliers[i]))
+		new_multipliers.append(modify_multiplier(multipliers[i], rng))
 	return tuple(new_multipliers)
@@ -1,37 +1,21 @@
+from array import array
 from typing import Optional
 from simengine.batting_score import BattingScore
 from simengine.bowling_figures import BowlingFigures
 from simengine.global_helpers import overs_formatted
 from simengine.player_and_team import TeamObject, PlayerObject
-from simengine.locations import get_location_name, get_home_ground_code, ground_adjustments
+from simengine.locations import get_location_name, get_home_ground_code, ground_adjustments, ground_adjustments_with_multipliers
+from simengine.rng import resolve_rng
+from simengine.formats import format_for_overs
+from simengine.scorecard import InningsScorecard
+from simengine.outcomes import DISMISSAL_OUTCOMES, OUTCOME_NO_BALL, OUTCOME_WIDE, RUNS_OUTCOMES
 
 class InningsState:
-	innings_no = 1
-	max_overs = 20
-	overs_in_innings = 20
-	batting_team = None
-	fielding_team = None
-	on_strike_batsman = None
-	off_strike_batsman = None
-	current_bowler = None
-	is_free_hit = False
-	is_batsman_aggression_adjusted_for_free_hit = False
-	adjusted_batsman = None
-	deliveries = 0
-	total_runs = 0
-	past_runs_scored = 0
-	past_runs_conceded = 0
-	extras = 0
-	total_wickets = 0
-	target = -1
-	boosting_aggression = False
-	boost_factor = 0
-	easy_bowling_on = False
-	fall_of_wickets = []
-	has_declared = False
-	def __init__(self, innings_no, max_overs, batting_team, fielding_team, opener1, opener2, target, easy_bowling_on):
+	__slots__ = ("innings_no", "max_overs", "overs_in_innings", "batting_team", "fielding_team", "on_strike_batsman", "off_strike_batsman", "current_bowler", "is_free_hit", "is_batsman_aggression_adjusted_for_free_hit", "adjusted_batsman", "deliveries", "total_runs", "past_runs_scored", "past_runs_conceded", "extras", "total_wickets", "target", "boosting_aggression", "boost_factor", "easy_bowling_on", "fall_of_wickets", "has_declared", "rng", "match_format", "ball_log")
+	def __init__(self, innings_no, max_overs, batting_team, fielding_team, opener1, opener2, target, easy_bowling_on, rng=None, match_format=None):
 		self.innings_no = innings_no
 		self.max_overs = max_overs
+		self.match_format = match_format if match_format is not None else format_for_overs(max_overs)
 		self.overs_in_innings = max_overs
 		self.batting_team = batting_team
 		self.fielding_team = fielding_team
@@ -39,6 +23,8 @@ class InningsState:
 			self.clear_old_data()
 		self.target = target
 		self.current_bowler = None
+		self.on_strike_batsman = None
+		self.off_strike_batsman = None
 		self.is_free_hit = False
 		self.deliveries = 0
 		self.total_runs = 0
@@ -53,6 +39,9 @@ class InningsState:
 		self.easy_bowling_on = easy_bowling_on
 		self.fall_of_wickets = []
 		self.has_declared = False
+		self.rng = resolve_rng(rng)
+		# Deliveries applied by record_delivery, packed by scorecard.pack_ball
+		self.ball_log = array("i")
 
 	def clear_old_data(self):
 		self.batting_team.reset()
@@ -73,7 +62,7 @@ class InningsState:
 		self.past_runs_conceded = runs_conceded
 
 	def max_deliveries(self):
-		return (self.max_overs * 6)/5
+		return self.match_format.bowler_quota_balls
 
 	def swap_batsmen(self):
 		temp = self.on_strike_batsman
@@ -147,14 +136,40 @@ class InningsState:
 		self.current_bowler.bowling_figures.wicket()
 		self.fall_of_wickets.append([self.total_runs, self.total_wickets, self.on_strike_batsman.last_name, self.deliveries])
 
+	def record_delivery(self, delivery_result, fielder, wicketkeeper):
+		# Applies a DeliveryResult to the scorecard; returns True if it was a legal delivery
+		# and logs it by outcome code (see scorecard.outcome_codes) for the array-backed scorecard
+		ball = (self.batting_team.player_slots[self.on_strike_batsman.player_id] << 16) | (self.fielding_team.player_slots[self.current_bowler.player_id] << 8)
+		if delivery_result.delivery_type == "wide_ball":
+			self.ball_log.append(ball | OUTCOME_WIDE)
+			self.wide_ball()
+			return False
+		if delivery_result.delivery_type == "no_ball":
+			self.ball_log.append(ball | OUTCOME_NO_BALL)
+			self.no_ball()
+		else:
+			self.is_free_hit = False
+		if delivery_result.is_wicket:
+			self.ball_log.append(ball | DISMISSAL_OUTCOMES[delivery_result.dismissal_type])
+			self.wicket(delivery_result.dismissal_type, wicketkeeper if delivery_result.fielder_involved == "wicketkeeper" else fielder)
+		else:
+			self.ball_log.append(ball | RUNS_OUTCOMES[delivery_result.runs_scored])
+			RUNS_EVENTS[delivery_result.runs_scored](self)
+		return delivery_result.delivery_type != "no_ball"
+
+	def scorecard(self):
+		# The deliveries recorded so far as an array-backed InningsScorecard, built in one vectorized pass
+		return InningsScorecard.from_packed(self.ball_log, len(self.batting_team.players), len(self.fielding_team.players))
+
 	def get_run_rate(self):
 		if self.deliveries > 0:
 			return self.total_runs*6/self.deliveries
 		return 0
 
 	def get_required_rate(self):
-		if self.deliveries < (self.overs_in_innings * 6) and self.target > 0:
-			return ((self.target - self.total_runs) * 6)/((self.overs_in_innings * 6) - self.deliveries)
+		balls_in_innings = self.overs_in_innings * self.match_format.balls_per_over
+		if self.deliveries < balls_in_innings and self.target > 0:
+			return ((self.target - self.total_runs) * 6)/(balls_in_innings - self.deliveries)
 		return 0
 
 	def boost_aggression(self):
@@ -211,6 +226,9 @@ class InningsState:
 	def declare(self):
 		self.has_declared = True
 
+# Scorecard method for each number of runs off the bat
+RUNS_EVENTS = {0: InningsState.dot, 1: InningsState.single, 2: InningsState.two_runs, 3: InningsState.three_runs, 4: InningsState.four_runs, 6: InningsState.six_runs}
+
 
 
 class Game:
@@ -223,7 +241,8 @@ class Game:
 	fourth_innings = None
 	winner = None
 	location_short_code = ""
-	def __init__(self, home_team, away_team):
+	rng = None
+	def __init__(self, home_team, away_team, rng=None):
 		self.home_team = home_team
 		self.away_team = away_team
 		self.game_multipliers = (1.0, 1.0, 1.0)
@@ -233,6 +252,7 @@ class Game:
 		self.fourth_innings = None
 		self.winner = None
 		self.location_short_code = ""
+		self.rng = resolve_rng(rng)
 
 	def set_location(self, location_short_code):
 		self.location_short_code = location_short_code.upper()
@@ -318,7 +338,7 @@ class Game:
 		toss_prompt = self.away_team.name + ", make you call (H or T): "
 		if self.away_team.is_ai_team:
 			print(toss_prompt, end = '')
-			if (random.random() < 0.5):
+			if (self.rng.random() < 0.5):
 				away_call = "H"
 			else:
 				away_call = "T"
@@ -327,7 +347,7 @@ class Game:
 		else:
 			away_call = input(toss_prompt)
 		result = ""
-		if (random.random() < 0.5):
+		if (self.rng.random() < 0.5):
 			result = "H"
 		else:
 			result = "T"
@@ -372,14 +392,6 @@ class Game:
 			return (self.home_team, self.away_team)
 		return (self.away_team, self.home_team)
 
-	def boost_stats(self, player):
-		player.batting_skill["pace"] = min(100,round(player.batting_skill["pace"] * 1.01))
-		player.batting_skill["spin"] = min(100,round(player.batting_skill["spin"] * 1.01))
-		player.batting_aggr = min(100,round(player.batting_aggr * 1.01))
-		player.bowling_skill = min(100,round(player.bowling_skill * 1.01))
-		player.fielding_skill = min(100,round(player.fielding_skill * 1.01))
-
-
 	def set_ground_adjustments(self, multipliers=None):
 		if (self.location_short_code == ""):
 			self.location_short_code = get_home_ground_code(self.home_team.short_name)
@@ -387,16 +399,16 @@ class Game:
 			self.game_multipliers = (multipliers['aggression'], multipliers['spin'], multipliers['pace'])
 			(self.home_team, self.away_team) = ground_adjustments_with_multipliers(self.home_team, self.away_team, self.game_multipliers)
 		else:
-			((self.home_team, self.away_team), self.game_multipliers) = ground_adjustments(self.home_team, self.away_team, self.location_short_code)
+			((self.home_team, self.away_team), self.game_multipliers) = ground_adjustments(self.home_team, self.away_team, self.location_short_code, self.rng)
 
 
+	# Ground adjustments and home advantage replace the teams with views (TeamObject.adjusted);
+	# matchup tables built on the old teams have to be rebuilt
 	def set_home_advantage(self):
-		for player in self.home_team.players:
-			self.boost_stats(player)
+		self.home_team = self.home_team.adjusted(boosted=True)
 
 	def set_away_advantage(self):
-		for player in self.away_team.players:
-			self.boost_stats(player)
+		self.away_team = self.away_team.adjusted(boosted=True)
 
 	def set_first_innings(self, first_innings):
 		self.first_innings = first_innings
@@ -0,0 +1,238 @@
+import numpy as np
+
+from simengine import joint_outcomes as jo
+from simengine.formats import get_format
+from simengine.innings import InningsState
+from simengine.matchup_table import MatchupTable
+from simengine.policies import BestAvailableBowler, ListedBattingOrder, eligible_bowlers
+from simengine.rng import MatchRNG
+
+# K innings of the same batting and fielding sides, held as arrays and advanced in lockstep.
+# Every step plays one delivery in each innings that is still going: the matchup tables are
+# flattened into one cumulative array, so a single searchsorted samples all K deliveries, and
+# the scorecard counters are updated with masked array arithmetic. Finished innings (all out,
+# overs used up or target reached) are masked out of later steps.
+#
+# The rules are those of MatchRunner.play_innings and InningsState.record_delivery. Batters come
+# in by position and the bowler of each over follows a plan fixed before the innings, so one
+# plan serves every innings in the batch.
+
+# Per-leaf values, indexed by leaf code; wickets are void on a free hit
+_leaf_results = jo.LEAF_RESULTS[(False, False)]
+LEAF_RUNS = np.array([runs for (_, _, runs, _, _, _, _) in _leaf_results], dtype=np.int64)
+LEAF_WIDE = np.array([delivery_name == "wide_ball" for (delivery_name, _, _, _, _, _, _) in _leaf_results])
+LEAF_NO_BALL = np.array([delivery_name == "no_ball" for (delivery_name, _, _, _, _, _, _) in _leaf_results])
+LEAF_WICKET = np.array([is_wicket for (_, _, _, _, is_wicket, _, _) in _leaf_results])
+# Equal slices of [0, 1) in the guide table, per (striker, bowler, fielder band) row
+GUIDE_BUCKETS = 256
+
+def plan_bowling(batting_team, fielding_team, match_format, bowling_policy=None):
+	# Plays the bowling policy over a blank innings: quotas and the no-consecutive-overs rule
+	# depend only on earlier overs, so the plan is the same for every innings
+	bowling_policy = bowling_policy or BestAvailableBowler()
+	fielding_team.reset()
+	innings = InningsState(1, match_format.overs, batting_team, fielding_team, batting_team.players[0], batting_team.players[1], -1, False, None, match_format)
+	slots = {player.player_id: slot for (slot, player) in enumerate(fielding_team.players)}
+	plan = []
+	for over in range(match_format.overs):
+		bowler = bowling_policy.choose_bowler(innings, eligible_bowlers(innings, over == 0))
+		innings.current_bowler = bowler
+		bowler.bowling_figures.deliveries += match_format.balls_per_over
+		plan.append(slots[bowler.player_id])
+	fielding_team.reset()
+	return np.array(plan, dtype=np.int64)
+
+def plan_bowling_from(fork):
+	# As plan_bowling, for the rest of an innings in progress: the bowler of the current over and every
+	# over after it, from the fork's quotas. Earlier overs are -1. The fork and its players are not changed
+	planner = fork.fork()
+	balls_per_over = planner.match_format.balls_per_over
+	plan = np.full(planner.match_format.overs, -1, dtype=np.int64)
+	if planner.is_complete():
+		return plan
+	if planner.bowler < 0:
+		planner.start_over()
+	# Only the balls left in the current over still count against its bowler's quota
+	first_over = planner.balls // balls_per_over
+	plan[first_over] = planner.bowler
+	planner.bowler_balls[planner.bowler] += balls_per_over - planner.balls % balls_per_over
+	for over in range(first_over + 1, len(plan)):
+		planner.start_over()
+		plan[over] = planner.bowler
+		planner.bowler_balls[planner.bowler] += balls_per_over
+	return plan
+
+def compile_sampler(table):
+	# Cumulative leaf probabilities of a MatchupTable, row (striker, bowler, fielder band) shifted to
+	# [row, row + 1], and a guide table: the leaf for the lowest draw of each slice, so a draw only steps
+	# forward a leaf or two from it instead of searching the whole array. It picks the same leaves as
+	# searchsorted. Shared by every batch of the same table
+	probabilities = np.array([[[distribution.probabilities for distribution in bowler_row] for bowler_row in batter_row] for batter_row in table.table], dtype=np.float64)
+	cumulative = np.cumsum(probabilities.reshape(-1, len(jo.LEAVES)), axis=1)
+	cumulative[:, -1] = 1.0
+	rows = np.arange(len(cumulative))
+	cumulative = (cumulative + rows[:, None]).ravel()
+	edges = (rows[:, None] + np.arange(GUIDE_BUCKETS) / GUIDE_BUCKETS).ravel()
+	guide = np.minimum(np.searchsorted(cumulative, edges, side="right") - np.repeat(rows, GUIDE_BUCKETS) * len(jo.LEAVES), len(jo.LEAVES) - 1)
+	return (cumulative, guide)
+
+class InningsBatch:
+	def __init__(self, batting_team, fielding_team, count, match_format="T20", target=-1, easy_bowling_on=False, batting_order=None, bowling_plan=None, matchup_table=None, scorecards=True, sampler=None):
+		self.batting_team = batting_team
+		self.fielding_team = fielding_team
+		self.count = count
+		self.match_format = get_format(match_format) if isinstance(match_format, str) else match_format
+		self.table = matchup_table or MatchupTable(batting_team, fielding_team, easy_bowling_on, self.match_format.overs)
+		team_size = len(batting_team.players)
+		self.max_wickets = min(10, team_size - 1)
+
+		# Batting order as batter slots; bowling plan as fielder slots, one per over (or one row per innings)
+		order = batting_order if batting_order is not None else ListedBattingOrder().batting_order(batting_team)
+		self.batting_order = np.array([self.table.batter_slots[player.player_id] for player in order], dtype=np.int64)
+		self.bowling_plan = np.asarray(bowling_plan if bowling_plan is not None else plan_bowling(batting_team, fielding_team, self.match_format), dtype=np.int64)
+
+		(self.bowler_count, self.band_count, self.leaf_count) = (len(fielding_team.players), len(self.table.fielding_bands), len(jo.LEAVES))
+		(self.cumulative, self.guide) = sampler if sampler is not None else compile_sampler(self.table)
+		self.fielder_bands = np.array(self.table.fielder_bands, dtype=np.int64)
+
+		# Innings state
+		self.target = np.broadcast_to(np.asarray(target, dtype=np.int64), (count,)).copy()
+		self.runs = np.zeros(count, dtype=np.int64)
+		self.wickets = np.zeros(count, dtype=np.int64)
+		self.balls = np.zeros(count, dtype=np.int64)
+		self.extras = np.zeros(count, dtype=np.int64)
+		self.striker = np.full(count, self.batting_order[0])
+		self.non_striker = np.full(count, self.batting_order[1])
+		self.next_batter = np.full(count, 2)
+		self.is_free_hit = np.zeros(count, dtype=bool)
+		self.done = np.zeros(count, dtype=bool)
+
+		# Scorecards, one row per innings and one column per player slot; bulk runs can do without them
+		self.scorecards = scorecards
+		if not scorecards:
+			return
+		self.batter_runs = np.zeros((count, team_size), dtype=np.int64)
+		self.batter_balls = np.zeros((count, team_size), dtype=np.int64)
+		self.batter_fours = np.zeros((count, team_size), dtype=np.int64)
+		self.batter_sixes = np.zeros((count, team_size), dtype=np.int64)
+		self.batter_out = np.zeros((count, team_size), dtype=bool)
+		self.bowler_balls = np.zeros((count, self.bowler_count), dtype=np.int64)
+		self.bowler_runs = np.zeros((count, self.bowler_count), dtype=np.int64)
+		self.bowler_wickets = np.zeros((count, self.bowler_count), dtype=np.int64)
+
+	@classmethod
+	def from_fork(cls, fork, count, target=None, scorecards=False, sampler=None):
+		# count copies of an InningsFork, to be played on in lockstep; target overrides the fork's, per innings
+		table = fork.table
+		players = table.batting_team.players
+		batch = cls(table.batting_team, table.fielding_team, count, fork.match_format, fork.target if target is None else target, table.easy_bowling_on, [players[slot] for slot in fork.batting_order], plan_bowling_from(fork), table, scorecards, sampler)
+		batch.runs[:] = fork.runs
+		batch.wickets[:] = fork.wickets
+		batch.balls[:] = fork.balls
+		batch.extras[:] = fork.extras
+		batch.is_free_hit[:] = fork.is_free_hit
+		(batch.striker[:], batch.non_striker[:], batch.next_batter[:]) = (fork.striker, fork.non_striker, fork.next_batter)
+		batch.done[:] = fork.is_complete()
+		if target is not None:
+			batch.done |= (batch.target > 0) & (batch.runs >= batch.target)
+		if scorecards:
+			(batch.batter_runs[:], batch.batter_balls[:], batch.batter_out[:]) = (fork.batter_runs, fork.batter_balls, fork.batter_out)
+			(batch.bowler_balls[:], batch.bowler_runs[:], batch.bowler_wickets[:]) = (fork.bowler_balls, fork.bowler_runs, fork.bowler_wickets)
+		return batch
+
+	def current_bowlers(self, rows):
+		overs = self.balls[rows] // self.match_format.balls_per_over
+		if self.bowling_plan.ndim == 2:
+			return self.bowling_plan[rows, overs]
+		return self.bowling_plan[overs]
+
+	def step(self, rng):
+		rows = np.flatnonzero(~self.done)
+		if len(rows) == 0:
+			return 0
+		generator = rng.generator
+		(striker, bowler) = (self.striker[rows], self.current_bowlers(rows))
+		# Same draws as the scalar path: a fielder, then the delivery
+		fielders = generator.integers(0, len(self.fielder_bands), size=len(rows))
+		matchups = (striker * self.bowler_count + bowler) * self.band_count + self.fielder_bands[fielders]
+		draws = generator.random(len(rows))
+		(points, leaves) = (matchups + draws, self.guide[matchups * GUIDE_BUCKETS + (draws * GUIDE_BUCKETS).astype(np.int64)])
+		positions = matchups * self.leaf_count + leaves
+		pending = np.flatnonzero((leaves < self.leaf_count - 1) & (self.cumulative[positions] <= points))
+		while len(pending):
+			leaves[pending] += 1
+			positions[pending] += 1
+			pending = pending[(leaves[pending] < self.leaf_count - 1) & (self.cumulative[positions[pending]] <= points[pending])]
+
+		(wide, no_ball, runs) = (LEAF_WIDE[leaves], LEAF_NO_BALL[leaves], LEAF_RUNS[leaves])
+		wicket = LEAF_WICKET[leaves] & ~self.is_free_hit[rows]
+		legal = ~wide & ~no_ball
+		faced = ~wide
+		extras = wide.astype(np.int64) + no_ball
+
+		self.runs[rows] += runs + extras
+		self.extras[rows] += extras
+		self.balls[rows] += legal
+		self.wickets[rows] += wicket
+		# A no-ball brings a free hit, a wide carries it over, anything else uses it up
+		self.is_free_hit[rows] = np.where(wide, self.is_free_hit[rows], no_ball)
+
+		if self.scorecards:
+			self.batter_runs[rows, striker] += runs
+			self.batter_balls[rows, striker] += faced
+			self.batter_fours[rows, striker] += faced & (runs == 4)
+			self.batter_sixes[rows, striker] += faced & (runs == 6)
+			self.batter_out[rows, striker] |= wicket
+			self.bowler_runs[rows, bowler] += runs + extras
+			self.bowler_balls[rows, bowler] += legal
+			self.bowler_wickets[rows, bowler] += wicket
+
+		# Odd runs change ends
+		swap = faced & ~wicket & (runs % 2 == 1)
+		(self.striker[rows], self.non_striker[rows]) = (np.where(swap, self.non_striker[rows], striker), np.where(swap, striker, self.non_striker[rows]))
+
+		finished = ((self.target[rows] > 0) & (self.runs[rows] >= self.target[rows])) | (self.wickets[rows] >= self.max_wickets)
+		# The next batter takes strike
+		incoming = wicket & ~finished
+		incoming_rows = rows[incoming]
+		self.striker[incoming_rows] = self.batting_order[self.next_batter[incoming_rows]]
+		self.next_batter[incoming_rows] += 1
+		# End of an over: the innings ends, or the batters change ends for the next bowler
+		over_end = legal & ~finished & (self.balls[rows] % self.match_format.balls_per_over == 0)
+		finished |= over_end & (self.balls[rows] >= self.match_format.total_balls)
+		change_ends = rows[over_end & ~finished]
+		(self.striker[change_ends], self.non_striker[change_ends]) = (self.non_striker[change_ends], self.striker[change_ends].copy())
+		self.done[rows] = finished
+		return len(rows)
+
+	def run(self, rng=None):
+		rng = rng if rng is not None else MatchRNG()
+		while self.step(rng):
+			pass
+		return self
+
+	def summary(self):
+		balls_per_over = self.match_format.balls_per_over
+		summary = {
+			"innings": self.count,
+			"mean_total": float(self.runs.mean()),
+			"total_quantiles": {str(quantile): float(value) for (quantile, value) in zip((0.1, 0.5, 0.9), np.quantile(self.runs, (0.1, 0.5, 0.9)))},
+			"mean_wickets": float(self.wickets.mean()),
+			"mean_extras": float(self.extras.mean()),
+			"all_out_rate": float((self.wickets >= self.max_wickets).mean()),
+			"chased_rate": float(((self.target > 0) & (self.runs >= self.target)).mean())}
+		if self.scorecards:
+			summary["batters"] = [{
+				"name": player.name,
+				"mean_runs": float(self.batter_runs[:, slot].mean()),
+				"strike_rate": float(100 * self.batter_runs[:, slot].sum() / max(1, self.batter_balls[:, slot].sum())),
+				"dismissal_rate": float(self.batter_out[:, slot].mean())} for (slot, player) in enumerate(self.batting_team.players)]
+			summary["bowlers"] = [{
+				"name": player.name,
+				"mean_overs": float(self.bowler_balls[:, slot].mean() / balls_per_over),
+				"economy": float(balls_per_over * self.bowler_runs[:, slot].sum() / self.bowler_balls[:, slot].sum()),
+				"mean_wickets": float(self.bowler_wickets[:, slot].mean())} for (slot, player) in enumerate(self.fielding_team.players) if self.bowler_balls[:, slot].any()]
+		return summary
+
+def play_innings_batch(batting_team, fielding_team, count, match_format="T20", target=-1, seed=None, **options):
+	return InningsBatch(batting_team, fielding_team, count, match_format, target, **options).run(MatchRNG(seed))
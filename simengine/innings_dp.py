@@ -0,0 +1,224 @@
+import numpy as np
+from simengine import joint_outcomes as jo
+
+# Exact innings outcome distribution by dynamic programming over (legal balls bowled, wickets,
+# partnership, striker), each state carrying the distribution of the runs scored so far.
+# The batting order and the bowler of every over are fixed inputs, so after w wickets the
+# partnership is batter w + 1 and one survivor of the first w + 1: (wickets, survivor) is the
+# partnership index. Per-ball probabilities come from the joint outcome distributions, averaged
+# over the fielding side since the fielder is picked uniformly.
+# Wides and no-balls never take a wicket; they only add runs, cross the batters on odd runs and
+# set up a free hit. Each ball is the geometric series of extras in front of one legal delivery,
+# summed in closed form per partnership and bowler. Runs are carried as the discrete Fourier
+# transform of their distribution, where adding a ball's runs is a product, so a ball is a few
+# elementwise products over (partnership, striker, frequency) and the totals one inverse transform.
+
+# A six off a no-ball
+MAX_RUNS_PER_DELIVERY = 7
+DEFAULT_MAX_RUNS = 600
+# Mass allowed past the end of the transform, where it would wrap round onto the low totals
+TAIL_TOLERANCE = 1e-16
+TAIL_SLOPES = np.linspace(0.05, 2.0, 40)
+# Divisors of the full transform size tried for the runs so far, smallest first
+STRIDES = (8, 4, 2, 1)
+
+# Leaf classes, each split by runs. WIDE is the part of EXTRAS_STAY that leaves a free hit as it was.
+# A free hit only turns the wickets, which all score nothing, into dot balls
+(EXTRAS_STAY, EXTRAS_SWAP, WIDE, STAY, SWAP, OUT) = range(6)
+CLASS_COUNT = 6
+
+def _build_leaf_classes(is_spinner):
+	classes = np.zeros((len(jo.LEAVES), CLASS_COUNT, MAX_RUNS_PER_DELIVERY + 1))
+	for (leaf, (delivery_name, _, runs, extras, is_wicket, _, _)) in enumerate(jo.LEAF_RESULTS[(is_spinner, False)]):
+		swap_ends = runs % 2 == 1
+		if delivery_name in ("wide_ball", "no_ball"):
+			classes[leaf, EXTRAS_SWAP if swap_ends else EXTRAS_STAY, runs + extras] = 1.0
+			if delivery_name == "wide_ball":
+				classes[leaf, WIDE, runs + extras] = 1.0
+		else:
+			classes[leaf, OUT if is_wicket else SWAP if swap_ends else STAY, runs] = 1.0
+	return classes.reshape(len(jo.LEAVES), -1)
+
+LEAF_CLASSES = {is_spinner: _build_leaf_classes(is_spinner) for is_spinner in (False, True)}
+
+class InningsProjection:
+	def __init__(self, total_distribution, wickets_distribution, target=-1):
+		self.total_distribution = total_distribution
+		self.wickets_distribution = wickets_distribution
+		self.target = target
+
+	def expected_total(self):
+		return float(np.dot(np.arange(len(self.total_distribution)), self.total_distribution))
+
+	def expected_wickets(self):
+		return float(np.dot(np.arange(len(self.wickets_distribution)), self.wickets_distribution))
+
+	def quantile(self, q):
+		return int(np.searchsorted(np.cumsum(self.total_distribution), q))
+
+	def projected_range(self, lower=0.1, upper=0.9):
+		return (self.quantile(lower), self.quantile(upper))
+
+	# Totals at or above the target are collapsed into the last bin of a chase
+	def win_probability(self):
+		if self.target <= 0:
+			return None
+		return float(self.total_distribution[self.target:].sum())
+
+	def tie_probability(self):
+		if self.target <= 0:
+			return None
+		return float(self.total_distribution[self.target - 1])
+
+	def loss_probability(self):
+		if self.target <= 0:
+			return None
+		return float(self.total_distribution[:self.target - 1].sum())
+
+	def to_dict(self):
+		return {
+			"expected_total": self.expected_total(),
+			"expected_wickets": self.expected_wickets(),
+			"projected_range": self.projected_range(),
+			"win_probability": self.win_probability(),
+			"tie_probability": self.tie_probability(),
+			"loss_probability": self.loss_probability(),
+			"total_distribution": self.total_distribution.tolist(),
+			"wickets_distribution": self.wickets_distribution.tolist()}
+
+class InningsSolver:
+	def __init__(self, batting_order, bowling_plan, wicketkeeper, fielding_team, max_overs, easy_bowling_on=False, balls_per_over=6):
+		self.batting_order = batting_order
+		self.bowling_plan = bowling_plan
+		self.wicketkeeper = wicketkeeper
+		self.fielding_team = fielding_team
+		self.max_overs = max_overs
+		self.easy_bowling_on = easy_bowling_on
+		self.balls_per_over = balls_per_over
+		self.max_wickets = min(10, len(batting_order) - 1)
+		# Partnership w (w + 1) / 2 + survivor; the rows of level max_wickets collect the innings ending all out
+		self.level_starts = np.array([wickets * (wickets + 1) // 2 for wickets in range(self.max_wickets + 2)])
+		self.levels = np.repeat(np.arange(self.max_wickets + 1), np.arange(1, self.max_wickets + 2))
+		survivors = np.arange(len(self.levels)) - self.level_starts[self.levels]
+		batting = self.level_starts[self.max_wickets]
+		self.partners = (survivors[:batting], self.levels[:batting] + 1)
+		# Sums the partnerships of each level, for the wickets falling from it
+		self.level_sums = (self.levels[:batting] == np.arange(self.max_wickets)[:, None]).astype(complex)
+		self.coefficients = {}
+		self.kernels = {}
+
+	def class_coefficients(self, bowler):
+		# (batter, class, runs) probabilities of every batter in the order against one bowler
+		if bowler.player_id not in self.coefficients:
+			(skills, counts) = np.unique([fielder.fielding_skill for fielder in self.fielding_team.players], return_counts=True)
+			leaf_probabilities = np.array([[jo.create_joint_distribution(batter.batting_skill["pace"], batter.batting_skill["spin"], batter.batting_aggr, bowler.bowling_skill, bowler.bowler_type, self.wicketkeeper.fielding_skill, skill, self.easy_bowling_on, self.max_overs).probabilities for skill in skills.tolist()] for batter in self.batting_order[:self.max_wickets + 1]])
+			leaf_probabilities = np.tensordot(leaf_probabilities, counts / counts.sum(), axes=(1, 0))
+			self.coefficients[bowler.player_id] = (leaf_probabilities @ LEAF_CLASSES[bowler.bowler_type == "spinner"]).reshape(len(leaf_probabilities), CLASS_COUNT, MAX_RUNS_PER_DELIVERY + 1)
+		return self.coefficients[bowler.player_id]
+
+	def runs_bounds(self, bowlers, balls):
+		# Chernoff bounds on the runs over the next 1, 2, ... balls, taking the highest scoring matchup for every ball
+		coefficients = np.concatenate([self.class_coefficients(bowler) for bowler in bowlers])
+		growth = np.exp(np.outer(np.arange(MAX_RUNS_PER_DELIVERY + 1), TAIL_SLOPES))
+		extras = (coefficients[:, EXTRAS_STAY] + coefficients[:, EXTRAS_SWAP]) @ growth
+		legal = coefficients[:, STAY:OUT + 1].sum(axis=1) @ growth
+		with np.errstate(divide="ignore"):
+			per_ball = np.where(extras < 1.0, legal / np.maximum(1.0 - extras, 0.0), np.inf).max(axis=0)
+		return np.min((np.outer(np.arange(1, balls + 1), np.log(per_ball)) - np.log(TAIL_TOLERANCE)) / TAIL_SLOPES, axis=1)
+
+	def ball_kernel(self, bowler, phases, is_free_hit=False, stride=1):
+		# (striker, outcome, partnership, frequency) for one ball of the bowler. Striker 0 is the survivor
+		# and 1 the newer batter; the outcomes are [0 on strike, 1 on strike, striker out]
+		key = (bowler.player_id, phases.shape[1], is_free_hit, stride)
+		# Every stride-th frequency of the full kernel serves a transform stride times shorter
+		if stride != 1 and key not in self.kernels:
+			self.kernels[key] = np.ascontiguousarray(self.ball_kernel(bowler, phases, is_free_hit)[..., ::stride])
+		if key not in self.kernels:
+			values = np.matmul(self.class_coefficients(bowler), phases)
+			(stay, swap) = (1 - values[:, EXTRAS_STAY], values[:, EXTRAS_SWAP])
+			(first, second) = self.partners
+			# Extras before the legal delivery, (I - T)^-1 for the 2x2 striker transitions T: series[s, y]
+			# takes striker s at the start of the ball to striker y when the legal delivery comes
+			inverse = 1 / (stay[first] * stay[second] - swap[first] * swap[second])
+			series = np.array([[stay[second] * inverse, swap[first] * inverse], [swap[second] * inverse, stay[first] * inverse]])
+			facing = values[np.array(self.partners)]
+			kernel = np.empty((2, 3) + inverse.shape, dtype=complex)
+			# Ending on strike: facing and not crossing, or crossing from the other end. A wicket is only
+			# possible with no free hit, so the striker at the start of the ball faces after wides alone
+			kernel[:, :2] = series * (facing[:, :, STAY] + facing[:, :, OUT]) + series[:, ::-1] * facing[::-1, :, SWAP]
+			if is_free_hit:
+				kernel[:, 2] = 0
+			else:
+				kernel[:, 2] = facing[:, :, OUT] / (1 - facing[:, :, WIDE])
+				kernel[(0, 1), (0, 1)] -= kernel[:, 2]
+			self.kernels[key] = kernel
+		return self.kernels[key]
+
+	def solve(self, target=-1, runs=0, wickets=0, balls=0, striker=0, non_striker=1, is_free_hit=False, max_runs=DEFAULT_MAX_RUNS):
+		# In a chase every total at or above the target collapses into the last bin, since runs never go down
+		num_bins = target + 1 if target > 0 else max_runs + 1
+		total_balls = len(self.bowling_plan) * self.balls_per_over
+		(total_distribution, wickets_distribution) = (np.zeros(num_bins), np.zeros(self.max_wickets + 1))
+		if wickets >= self.max_wickets or balls >= total_balls:
+			total_distribution[min(runs, num_bins - 1)] = 1.0
+			wickets_distribution[min(wickets, self.max_wickets)] = 1.0
+			return InningsProjection(total_distribution, wickets_distribution, target)
+		if max(striker, non_striker) != wickets + 1:
+			raise ValueError("The newer batter in the partnership must be batting_order[wickets + 1]")
+
+		# The transform covers the runs still to come, bar TAIL_TOLERANCE; past it they would wrap round.
+		# Early on the runs so far need fewer frequencies, a stride through those of the full transform
+		bowlers = {bowler.player_id: bowler for bowler in self.bowling_plan[balls // self.balls_per_over:]}
+		bounds = self.runs_bounds(bowlers.values(), total_balls - balls)
+		size = 32 * (int(bounds[-1]) // 32 + 1)
+		phases = np.exp(-2j * np.pi * np.outer(np.arange(MAX_RUNS_PER_DELIVERY + 1), np.arange(size // 2 + 1)) / size)
+		strides = [next(stride for stride in STRIDES if size // stride > bound) for bound in bounds]
+		(stride, frequencies) = (strides[0], size // strides[0] // 2 + 1)
+		vectors = np.zeros((2, len(self.levels), frequencies), dtype=complex)
+		vectors[int(striker > non_striker), self.level_starts[wickets] + min(striker, non_striker)] = 1.0
+		# The runs scored by the fall of each wicket, for the chase
+		falls = np.zeros((self.max_wickets + 1, frequencies), dtype=complex)
+
+		(batting, scratch, outs) = (np.empty(vectors.shape, dtype=complex) for _ in range(3))
+
+		for ball in range(balls, total_balls):
+			if strides[ball - balls] != stride:
+				(vectors, falls) = (np.fft.rfft(np.fft.irfft(values, size // stride), size // strides[ball - balls]) for values in (vectors, falls))
+				(batting, scratch, outs) = (np.empty(vectors.shape, dtype=complex) for _ in range(3))
+				stride = strides[ball - balls]
+			# At most one wicket a ball, so only the partnerships of levels [wickets, top) can be batting
+			top = min(self.max_wickets, wickets + ball - balls + 1)
+			(low, high) = (self.level_starts[wickets], self.level_starts[top])
+			kernel = self.ball_kernel(self.bowling_plan[ball // self.balls_per_over], phases, is_free_hit and ball == balls, stride)
+			(staying, extra, out) = (batting[:, :high - low], scratch[:, :high - low], outs[:, :high - low])
+			np.multiply(kernel[0, :2, low:high], vectors[0, low:high], out=staying)
+			np.multiply(kernel[1, :2, low:high], vectors[1, low:high], out=extra)
+			staying += extra
+			np.multiply(kernel[:, 2, low:high], vectors[:, low:high], out=out)
+			# The new batter takes strike, unless that was the last ball of the over
+			incoming = int((ball + 1) % self.balls_per_over != 0)
+			vectors[1 - incoming, low:high] = staying[0]
+			vectors[incoming, low:high] = staying[1]
+			# The newer batter out leaves the survivor in the partnership a level up, the survivor out
+			# leaves the newer batter as the survivor
+			vectors[incoming, np.arange(low, high) + self.levels[low:high] + 1] += out[1]
+			out = self.level_sums[wickets:top, low:high] @ out
+			vectors[incoming, self.level_starts[wickets + 1:top + 1] + np.arange(wickets + 1, top + 1)] += out[0]
+			if target > 0:
+				falls[wickets + 1:top + 1] += out[0] + out[1]
+
+		# Shifted by the runs already on the board
+		remaining = np.maximum(np.fft.irfft(vectors.sum(axis=(0, 1)), size), 0.0)
+		shown = max(0, min(size, num_bins - 1 - runs))
+		total_distribution[runs:runs + shown] = remaining[:shown]
+		total_distribution[-1] += remaining[shown:].sum()
+		if target > 0:
+			# A chase stops at the target, so a wicket only counts when it falls with the target still to get
+			fallen = [1.0] * (wickets + 1) + [np.maximum(np.fft.irfft(fall, size), 0.0)[:max(0, target - runs)].sum() for fall in falls[wickets + 1:]]
+			wickets_distribution = -np.diff(np.append(fallen, 0.0))
+		else:
+			wickets_distribution = np.bincount(self.levels, vectors[:, :, 0].real.sum(axis=0), self.max_wickets + 1)
+		return InningsProjection(total_distribution / total_distribution.sum(), wickets_distribution / wickets_distribution.sum(), target)
+
+def solve_innings(batting_order, bowling_plan, wicketkeeper, fielding_team, max_overs, target=-1, easy_bowling_on=False, balls_per_over=6, **state):
+	return InningsSolver(batting_order, bowling_plan, wicketkeeper, fielding_team, max_overs, easy_bowling_on, balls_per_over).solve(target, **state)
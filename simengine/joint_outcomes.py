@@ -0,0 +1,269 @@
+import numpy as np
+
+from . import probability_helpers as ph
+from . import outcomes as oc
+from .delivery_result import DeliveryResult
+
+# The bowl -> stroke -> miss/hit/slog -> caught tree multiplied out into one categorical
+# distribution. Every matchup shares the same leaf numbering, so a leaf code means the
+# same thing everywhere; only the probabilities change.
+
+GOOD_DELIVERY_MODIFIER = 0.9
+HIT_DROP_THRESHOLD = 0.06
+SLOG_DROP_THRESHOLD = 0.15
+
+# Leaves are bowl_to_bat results: (delivery_type, stroke_type, miss_event, runs, stroke_result)
+def _build_leaves():
+	leaves = [(oc.WIDE_BALL, oc.NO_STROKE, -1, 0, "")]
+	for delivery_type in (oc.NO_BALL, oc.FAIR_DELIVERY, oc.GOOD_DELIVERY):
+		for miss_event in range(len(ph.MISS_RESULT_NAMES)):
+			leaves.append((delivery_type, oc.MISS, miss_event, 0, ""))
+		leaves.append((delivery_type, oc.DOT, -1, 0, "dot"))
+		for stroke_type in (oc.HIT, oc.SLOG):
+			for stroke_result in ("caught", "dropped", "dot"):
+				leaves.append((delivery_type, stroke_type, -1, 0, stroke_result))
+			for field_event in range(1, len(oc.HIT_RUNS)):
+				leaves.append((delivery_type, stroke_type, -1, oc.HIT_RUNS[field_event], ph.HIT_RESULT_NAMES[field_event]))
+	return tuple(leaves)
+
+LEAVES = _build_leaves()
+LEAF_INDEX = {leaf: index for (index, leaf) in enumerate(LEAVES)}
+
+def resolve_delivery(delivery_type, stroke_type, miss_event, runs, stroke_result, bowling_type, is_free_hit):
+	is_wicket = False
+	extras = 0
+	is_no_ball = False
+	dismissal_type = None
+	fielder_involved = None
+
+	if (delivery_type == oc.WIDE_BALL):
+		extras = 1
+	else:
+		if (delivery_type == oc.NO_BALL):
+			extras = 1
+			is_no_ball = True
+		if miss_event != -1:
+			if miss_event == 0 and not is_no_ball and not is_free_hit:
+				is_wicket = True
+				dismissal_type = "bowled"
+			elif miss_event == 1  and not is_no_ball and not is_free_hit:
+				is_wicket = True
+				dismissal_type = "lbw"
+			elif miss_event == 2  and not is_no_ball and not is_free_hit:
+				is_wicket = True
+				if bowling_type == "spinner":
+					dismissal_type = "stumped"
+					fielder_involved = "wicketkeeper"
+				else:
+					dismissal_type = "caught behind"
+					fielder_involved = "wicketkeeper"
+		else:
+			if (runs == 0):
+				if (stroke_result == "caught") and not is_no_ball and not is_free_hit:
+					is_wicket = True
+					dismissal_type = "caught"
+					fielder_involved = "fielder"
+				elif (stroke_result == "dropped"):
+					if stroke_type == oc.SLOG:
+						# Implement drop logic here
+						fielder_involved = "fielder"
+						runs = 1
+					else:
+						# Implement drop logic here
+						fielder_involved = "fielder"
+				else:
+					# Simple dot
+					pass
+
+	return (oc.DELIVERY_TYPE_NAMES[delivery_type], oc.stroke_name(stroke_type), runs, extras, is_wicket, dismissal_type, fielder_involved)
+
+def get_outcome_code(delivery_result_fields):
+	(delivery_name, _, runs, _, is_wicket, dismissal_type, fielder_involved) = delivery_result_fields
+	if delivery_name == "wide_ball":
+		return oc.OUTCOME_WIDE
+	if delivery_name == "no_ball":
+		return oc.OUTCOME_NO_BALL
+	if is_wicket:
+		return oc.DISMISSAL_OUTCOMES[dismissal_type]
+	if fielder_involved == "fielder":
+		return oc.OUTCOME_DROPPED
+	return oc.RUNS_OUTCOMES[runs]
+
+# Results depend only on the leaf, whether the bowler counts as a "spinner" and the free hit
+def _build_results(is_spinner, is_free_hit):
+	bowling_type = "spinner" if is_spinner else "pace"
+	return tuple(resolve_delivery(*leaf, bowling_type, is_free_hit) for leaf in LEAVES)
+
+LEAF_RESULTS = {(is_spinner, is_free_hit): _build_results(is_spinner, is_free_hit) for is_spinner in (False, True) for is_free_hit in (False, True)}
+LEAF_OUTCOMES = {key: tuple(get_outcome_code(result) for result in results) for (key, results) in LEAF_RESULTS.items()}
+
+def event_probabilities(probability_list, modifier=1.0):
+	# P(event) when the seed is modifier * U[0, 1); bat_to_field uses a 0.9 modifier after a good delivery
+	cumulative = ph.EventSampler(probability_list).cumulative
+	probabilities = []
+	previous = 0.0
+	for index in range(len(cumulative)):
+		upper = 1.0 if index == len(cumulative) - 1 else min(cumulative[index] / modifier, 1.0)
+		probabilities.append(max(upper - previous, 0.0))
+		previous = max(previous, upper)
+	return probabilities
+
+def catch_probabilities(caught_out_probability, drop_threshold):
+	caught = min(caught_out_probability, 1.0)
+	dropped = max(min(drop_threshold, 1.0) - caught, 0.0)
+	return {"caught": caught, "dropped": dropped, "dot": 1.0 - caught - dropped}
+
+def compile_leaf_probabilities(event_matrix):
+	bowl_probabilities = event_probabilities(event_matrix["bowl_probabilities"])
+	stroke_probabilities = event_probabilities(event_matrix["stroke_probabilities"])
+	miss_probabilities = event_probabilities(event_matrix["miss_probabilities"])
+	(hit_caught, slog_caught) = event_matrix["caught_out_probabilities"]
+	catches = {oc.HIT: catch_probabilities(hit_caught, HIT_DROP_THRESHOLD), oc.SLOG: catch_probabilities(slog_caught, SLOG_DROP_THRESHOLD)}
+	field_probabilities = {}
+	for modifier in (1.0, GOOD_DELIVERY_MODIFIER):
+		field_probabilities[(oc.HIT, modifier)] = event_probabilities(event_matrix["hit_probabilities"], modifier)
+		field_probabilities[(oc.SLOG, modifier)] = event_probabilities(event_matrix["slog_probabilities"], modifier)
+
+	probabilities = []
+	for (delivery_type, stroke_type, miss_event, runs, stroke_result) in LEAVES:
+		probability = bowl_probabilities[delivery_type]
+		if stroke_type == oc.NO_STROKE:
+			probabilities.append(probability)
+			continue
+		probability *= stroke_probabilities[stroke_type]
+		if stroke_type == oc.MISS:
+			probability *= miss_probabilities[miss_event]
+		elif stroke_type != oc.DOT:
+			modifier = GOOD_DELIVERY_MODIFIER if delivery_type == oc.GOOD_DELIVERY else 1.0
+			field_event = oc.HIT_RUNS.index(runs)
+			probability *= field_probabilities[(stroke_type, modifier)][field_event]
+			if field_event == 0:
+				probability *= catches[stroke_type][stroke_result]
+		probabilities.append(probability)
+	total = sum(probabilities)
+	return tuple(probability / total for probability in probabilities)
+
+# BATCHED COMPILATION
+
+# compile_leaf_probabilities for many event matrices at once. Each matrix becomes one row of
+# factor columns (bowl, stroke, miss, field and catch probabilities, plus a constant 1), and
+# every leaf is the product of four of those columns.
+_FIELD_KEYS = ((oc.HIT, 1.0), (oc.HIT, GOOD_DELIVERY_MODIFIER), (oc.SLOG, 1.0), (oc.SLOG, GOOD_DELIVERY_MODIFIER))
+_BOWL_COLUMN = 1
+_STROKE_COLUMN = _BOWL_COLUMN + 4
+_MISS_COLUMN = _STROKE_COLUMN + 4
+_FIELD_COLUMNS = {key: _MISS_COLUMN + len(ph.MISS_RESULT_NAMES) + index * len(oc.HIT_RUNS) for (index, key) in enumerate(_FIELD_KEYS)}
+_CATCH_COLUMNS = {oc.HIT: _FIELD_COLUMNS[_FIELD_KEYS[-1]] + len(oc.HIT_RUNS), oc.SLOG: _FIELD_COLUMNS[_FIELD_KEYS[-1]] + len(oc.HIT_RUNS) + 3}
+_CATCH_RESULTS = ("caught", "dropped", "dot")
+
+def _leaf_factor_columns(leaf):
+	(delivery_type, stroke_type, miss_event, runs, stroke_result) = leaf
+	columns = [_BOWL_COLUMN + delivery_type]
+	if stroke_type != oc.NO_STROKE:
+		columns.append(_STROKE_COLUMN + stroke_type)
+		if stroke_type == oc.MISS:
+			columns.append(_MISS_COLUMN + miss_event)
+		elif stroke_type != oc.DOT:
+			modifier = GOOD_DELIVERY_MODIFIER if delivery_type == oc.GOOD_DELIVERY else 1.0
+			field_event = oc.HIT_RUNS.index(runs)
+			columns.append(_FIELD_COLUMNS[(stroke_type, modifier)] + field_event)
+			if field_event == 0:
+				columns.append(_CATCH_COLUMNS[stroke_type] + _CATCH_RESULTS.index(stroke_result))
+	return columns + [0] * (4 - len(columns))
+
+LEAF_FACTOR_COLUMNS = np.array([_leaf_factor_columns(leaf) for leaf in LEAVES], dtype=np.intp).T
+
+def event_probabilities_batch(probability_lists, modifier=1.0):
+	# Row-wise event_probabilities: running-max cumulative totals, scaled, the last event taking the rest
+	cumulative = np.maximum.accumulate(np.cumsum(probability_lists, axis=1), axis=1)
+	upper = np.minimum(cumulative / modifier, 1.0)
+	upper[:, -1] = 1.0
+	previous = np.maximum.accumulate(upper, axis=1)
+	previous = np.concatenate((np.zeros((len(upper), 1)), previous[:, :-1]), axis=1)
+	return np.maximum(upper - previous, 0.0)
+
+def compile_leaf_probabilities_batch(event_matrices):
+	rows = len(event_matrices)
+	def stacked(name):
+		return np.array([event_matrix[name] for event_matrix in event_matrices], dtype=np.float64)
+	caught_out = stacked("caught_out_probabilities")
+	factors = [np.ones((rows, 1)), event_probabilities_batch(stacked("bowl_probabilities")), event_probabilities_batch(stacked("stroke_probabilities")), event_probabilities_batch(stacked("miss_probabilities"))]
+	(hit_probabilities, slog_probabilities) = (stacked("hit_probabilities"), stacked("slog_probabilities"))
+	for (stroke_type, modifier) in _FIELD_KEYS:
+		factors.append(event_probabilities_batch(hit_probabilities if stroke_type == oc.HIT else slog_probabilities, modifier))
+	for (column, drop_threshold) in ((0, HIT_DROP_THRESHOLD), (1, SLOG_DROP_THRESHOLD)):
+		caught = np.minimum(caught_out[:, column], 1.0)
+		dropped = np.maximum(min(drop_threshold, 1.0) - caught, 0.0)
+		factors.append(np.stack((caught, dropped, 1.0 - caught - dropped), axis=1))
+	factors = np.concatenate(factors, axis=1)
+	probabilities = factors[:, LEAF_FACTOR_COLUMNS[0]] * factors[:, LEAF_FACTOR_COLUMNS[1]] * factors[:, LEAF_FACTOR_COLUMNS[2]] * factors[:, LEAF_FACTOR_COLUMNS[3]]
+	return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+class JointOutcomeDistribution:
+	def __init__(self, event_matrix, bowling_type):
+		self.probabilities = compile_leaf_probabilities(event_matrix)
+		self.sampler = ph.EventSampler(self.probabilities)
+		self.is_spinner = bowling_type == "spinner"
+		self.results = (LEAF_RESULTS[(self.is_spinner, False)], LEAF_RESULTS[(self.is_spinner, True)])
+		self.outcomes = (LEAF_OUTCOMES[(self.is_spinner, False)], LEAF_OUTCOMES[(self.is_spinner, True)])
+
+	def sample(self, seed):
+		leaf = self.sampler.sample(seed)
+		return leaf if leaf >= 0 else len(LEAVES) - 1
+
+	def delivery(self, seed, is_free_hit):
+		return DeliveryResult(*self.results[is_free_hit][self.sample(seed)])
+
+	def outcome_probabilities(self, is_free_hit):
+		probabilities = [0.0] * len(oc.OUTCOME_NAMES)
+		for (outcome, probability) in zip(self.outcomes[is_free_hit], self.probabilities):
+			probabilities[outcome] += probability
+		return probabilities
+
+_joint_distribution_cache = ph.EventMatrixCache()
+
+def create_joint_distribution(batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, easy_bowling_on, max_overs):
+	key = (ph.get_matrix_format(max_overs), easy_bowling_on, batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill)
+	return _joint_distribution_cache.get(key, lambda: JointOutcomeDistribution(ph.create_event_matrix(batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, easy_bowling_on, max_overs), bowling_type))
+
+def joint_distribution_cache_info():
+	return _joint_distribution_cache.info()
+
+
+# ANALYTIC SUMMARIES
+
+def summarize_leaf_probabilities(leaf_probabilities, results, outcomes):
+	outcome_probabilities = [0.0] * len(oc.OUTCOME_NAMES)
+	expected_runs = 0.0
+	expected_batter_runs = 0.0
+	wicket_probability = 0.0
+	boundary_probability = 0.0
+	extras_probability = 0.0
+	for (probability, result, outcome) in zip(leaf_probabilities, results, outcomes):
+		(_, _, runs, extras, is_wicket, _, _) = result
+		outcome_probabilities[outcome] += probability
+		expected_runs += probability * (runs + extras)
+		expected_batter_runs += probability * runs
+		if is_wicket:
+			wicket_probability += probability
+		if runs == 4 or runs == 6:
+			boundary_probability += probability
+		if extras:
+			extras_probability += probability
+	return {
+		"outcome_probabilities": dict(zip(oc.OUTCOME_NAMES, outcome_probabilities)),
+		"expected_runs": expected_runs,
+		"expected_batter_runs": expected_batter_runs,
+		"wicket_probability": wicket_probability,
+		"boundary_probability": boundary_probability,
+		"extras_probability": extras_probability}
+
+def summarize_distributions(joint_distributions, is_free_hit):
+	# Fielders are picked uniformly, so the next ball is an equal mix of one distribution per fielder
+	leaf_probabilities = [sum(probabilities) / len(joint_distributions) for probabilities in zip(*(joint.probabilities for joint in joint_distributions))]
+	return summarize_leaf_probabilities(leaf_probabilities, joint_distributions[0].results[is_free_hit], joint_distributions[0].outcomes[is_free_hit])
+
+def next_ball_distribution(striker, bowler, wicketkeeper, fielding_team, is_free_hit, easy_bowling_on, max_overs, fielder=None):
+	fielders = [fielder] if fielder is not None else fielding_team.players
+	joint_distributions = [create_joint_distribution(striker.batting_skill["pace"], striker.batting_skill["spin"], striker.batting_aggr, bowler.bowling_skill, bowler.bowler_type, wicketkeeper.fielding_skill, player.fielding_skill, easy_bowling_on, max_overs) for player in fielders]
+	return summarize_distributions(joint_distributions, is_free_hit)
@@ -88,7 +88,7 @@ def get_home_ground_code(team_short_name):
 		return grounds[team_short_name]
 	return ""
 
-def ground_adjustments(home_team, away_team, location):
+def ground_adjustments(home_team, away_team, location, rng=None):
 	# Aggression, Spin, Pace
 	ground_multipliers =\
 	{\
@@ -137,7 +137,7 @@ def ground_adjustments(home_team, away_team, location):
 			multipliers = ground_multipliers[ground_code]
 			need_multiplier = True
 
-	multipliers = apply_conditions(multipliers)
+	multipliers = apply_conditions(multipliers, rng)
 
 	return (apply_multipliers(home_team, away_team, multipliers, need_multiplier), multipliers)
 
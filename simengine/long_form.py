@@ -0,0 +1,389 @@
+import argparse
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from simengine import joint_outcomes as jo
+from simengine.batch import RunningStat, write_json
+from simengine.formats import get_format
+from simengine.innings import Game
+from simengine.locations import ground_adjustments
+from simengine.match_fork import InningsFork
+from simengine.matchup_table import MatchupTable
+from simengine.policies import AutoTossPolicy, ListedBattingOrder
+from simengine.rng import MatchRNG, resolve_rng
+from simengine.tournament import load_squads
+
+# Plays whole Test matches headlessly: up to four innings sharing the match's overs (450 for five
+# days), with declarations, the follow-on, and draws when time runs out. Innings are played on
+# the slot-based InningsFork path, and finished matches are folded into a FiveDaySummary of running
+# totals, so memory stays constant however many matches are played.
+#
+#   python -m simengine.long_form --home IND --away AUS --tests 100000 --seed 1
+#
+# Nothing here is named test_* or Test*, so pytest does not try to collect it.
+
+
+# POLICIES
+
+class ExpectedScoring:
+	# How a side is expected to bat against an attack, read off the matchup table. Batter i, against
+	# the attack on average (fielders picked uniformly), scores r_i and is out w_i times a ball, so
+	# lasts 1 / w_i balls for r_i / w_i runs; an all-out innings is the first ten in the order doing so
+	def __init__(self, table, batting_order, balls_per_over):
+		bowler_slots = [slot for (slot, player) in enumerate(table.fielding_team.players) if not player.is_wicketkeeper]
+		(balls, runs) = (0.0, 0.0)
+		for striker_slot in batting_order[:10]:
+			summaries = [jo.summarize_distributions(table.bowler_distributions(striker_slot, bowler_slot), False) for bowler_slot in bowler_slots]
+			wicket_probability = sum(summary["wicket_probability"] for summary in summaries) / len(summaries)
+			balls += 1 / wicket_probability
+			runs += sum(summary["expected_runs"] for summary in summaries) / len(summaries) / wicket_probability
+		self.all_out_overs = balls / balls_per_over
+		self.all_out_total = runs
+		self.runs_per_over = runs / self.all_out_overs
+
+class AutoDeclarationPolicy:
+	# Asked at the end of every over; lead is the batting side's match runs minus the opposition's,
+	# and opposition the ExpectedScoring of the side that bats next, so the declarations follow how
+	# freely runs come in the matchup rather than fixed totals
+	def __init__(self, cushion=1.0, minimum_lead=100):
+		self.cushion = cushion
+		self.minimum_lead = minimum_lead
+
+	def should_declare(self, innings_no, runs, lead, overs_left, opposition):
+		if innings_no <= 2:
+			# A lead the opposition are not expected to make up batting once, or ahead with only the time
+			# left to bowl them out in the innings they still have (two after the first innings, one after the second)
+			innings_to_bowl = 3 - innings_no
+			return lead >= self.cushion * opposition.all_out_total or (lead > 0 and overs_left <= innings_to_bowl * opposition.all_out_overs)
+		if innings_no == 3:
+			# Enough to defend over the time left, or against their expected all-out total once there is time to bowl them out
+			return lead >= max(self.minimum_lead, self.cushion * opposition.runs_per_over * min(overs_left, opposition.all_out_overs))
+		return False
+
+class AutoFollowOnPolicy:
+	def enforce(self, lead, overs_left):
+		return True
+
+class WorkloadBowlingPolicy:
+	# There is no quota in a Test, so each over bowled costs skill_per_over points of bowling skill
+	# for the rest of the innings and the attack rotates instead of two bowlers bowling unchanged
+	def __init__(self, skill_per_over=1.0):
+		self.skill_per_over = skill_per_over
+
+	def choose_bowler(self, innings, eligible_bowlers):
+		(slots, balls_per_over) = (innings.table.fielder_slots, innings.match_format.balls_per_over)
+		return max(eligible_bowlers, key=lambda player: player.bowling_skill - self.skill_per_over * innings.bowler_balls[slots[player.player_id]] / balls_per_over)
+
+def follow_on_margin(match_format):
+	# Law 14.1.1: 200 runs in a match of five days or more, 150 for three or four, 100 for two, 75 for one
+	days = max(1, match_format.overs // 90)
+	return 200 if days >= 5 else 150 if days >= 3 else 100 if days == 2 else 75
+
+
+# RESULTS
+
+class FiveDayResult:
+	def __init__(self, home_team, away_team, toss_winner, innings, followed_on, winner, margin):
+		self.home_team = home_team
+		self.away_team = away_team
+		self.toss_winner = toss_winner
+		# (batting team, runs, wickets, legal balls, declared) for each innings played
+		self.innings = innings
+		self.followed_on = followed_on
+		self.winner = winner
+		self.margin = margin
+		self.is_tie = margin == "tie"
+		self.is_draw = winner is None and not self.is_tie
+
+	def result_text(self):
+		if self.is_tie:
+			return "Match tied"
+		if self.is_draw:
+			return "Match drawn"
+		return "%s won by %s" % (self.winner.name, self.margin)
+
+	def to_dict(self):
+		return {
+			"toss_winner": self.toss_winner.short_name,
+			"innings": [(team.short_name, runs, wickets, balls, declared) for (team, runs, wickets, balls, declared) in self.innings],
+			"followed_on": self.followed_on,
+			"winner": self.winner.short_name if self.winner else None,
+			"is_draw": self.is_draw,
+			"is_tie": self.is_tie,
+			"result": self.result_text()}
+
+# Per-player counters, in this order
+TEST_PLAYER_FIELDS = ("innings", "runs", "balls_faced", "outs", "balls_bowled", "runs_conceded", "wickets")
+
+class FiveDaySummary:
+	def __init__(self):
+		self.matches = 0
+		# team short name, "draw" or "tie" -> count
+		self.results = {}
+		self.innings_wins = 0
+		self.follow_ons = 0
+		self.declarations = 0
+		# Innings totals by innings number ("1" to "4"), and legal balls per match
+		self.innings_runs = {}
+		self.match_balls = RunningStat()
+		# "TEAM:Player Name" -> counters in TEST_PLAYER_FIELDS order
+		self.players = {}
+
+	def add_innings(self, innings_no, innings, batter_keys, bowler_keys):
+		self.innings_runs.setdefault(str(innings_no), RunningStat()).add(innings.runs)
+		for (slot, key) in enumerate(batter_keys):
+			if innings.batter_balls[slot] == 0 and not innings.batter_out[slot]:
+				continue
+			counters = self.players.setdefault(key, [0] * len(TEST_PLAYER_FIELDS))
+			counters[0] += 1
+			counters[1] += innings.batter_runs[slot]
+			counters[2] += innings.batter_balls[slot]
+			counters[3] += innings.batter_out[slot]
+		for (slot, key) in enumerate(bowler_keys):
+			if innings.bowler_balls[slot] == 0 and innings.bowler_runs[slot] == 0:
+				continue
+			counters = self.players.setdefault(key, [0] * len(TEST_PLAYER_FIELDS))
+			counters[4] += innings.bowler_balls[slot]
+			counters[5] += innings.bowler_runs[slot]
+			counters[6] += innings.bowler_wickets[slot]
+
+	def add_match(self, result):
+		self.matches += 1
+		outcome = "tie" if result.is_tie else "draw" if result.is_draw else result.winner.short_name
+		self.results[outcome] = self.results.get(outcome, 0) + 1
+		self.innings_wins += result.margin.startswith("an innings")
+		self.follow_ons += result.followed_on
+		self.declarations += sum(1 for (_, _, _, _, declared) in result.innings if declared)
+		self.match_balls.add(sum(balls for (_, _, _, balls, _) in result.innings))
+
+	def merge(self, other):
+		self.matches += other.matches
+		for (outcome, count) in other.results.items():
+			self.results[outcome] = self.results.get(outcome, 0) + count
+		self.innings_wins += other.innings_wins
+		self.follow_ons += other.follow_ons
+		self.declarations += other.declarations
+		for (innings_no, stat) in other.innings_runs.items():
+			self.innings_runs.setdefault(innings_no, RunningStat()).merge(stat)
+		self.match_balls.merge(other.match_balls)
+		for (player, counters) in other.players.items():
+			mine = self.players.setdefault(player, [0] * len(TEST_PLAYER_FIELDS))
+			for index in range(len(TEST_PLAYER_FIELDS)):
+				mine[index] += counters[index]
+		return self
+
+	def summary(self, balls_per_over=6):
+		matches = max(1, self.matches)
+		players = {}
+		for (player, counters) in sorted(self.players.items()):
+			stats = dict(zip(TEST_PLAYER_FIELDS, counters))
+			stats["batting_average"] = stats["runs"] / stats["outs"] if stats["outs"] else None
+			stats["bowling_average"] = stats["runs_conceded"] / stats["wickets"] if stats["wickets"] else None
+			stats["wickets_per_match"] = stats["wickets"] / matches
+			players[player] = stats
+		return {
+			"matches": self.matches,
+			"result_probabilities": {outcome: count / matches for (outcome, count) in sorted(self.results.items())},
+			"innings_win_rate": self.innings_wins / matches,
+			"follow_on_rate": self.follow_ons / matches,
+			"declarations_per_match": self.declarations / matches,
+			"mean_match_overs": self.match_balls.mean() / balls_per_over,
+			"innings": {innings_no: {"mean_total": stat.mean(), "total_std": stat.standard_deviation(), "highest_total": stat.maximum, "lowest_total": stat.minimum} for (innings_no, stat) in sorted(self.innings_runs.items())},
+			"players": players}
+
+
+# RUNNER
+
+class FiveDayRunner:
+	def __init__(self, home_team, away_team, match_format="Test", easy_bowling_on=False, toss_policy=None, batting_policy=None, bowling_policy=None, declaration_policy=None, follow_on_policy=None):
+		self.home_team = home_team
+		self.away_team = away_team
+		self.match_format = get_format(match_format) if isinstance(match_format, str) else match_format
+		self.easy_bowling_on = easy_bowling_on
+		self.bowling_policy = bowling_policy or WorkloadBowlingPolicy()
+		self.declaration_policy = declaration_policy or AutoDeclarationPolicy()
+		self.follow_on_policy = follow_on_policy or AutoFollowOnPolicy()
+		self.follow_on_margin = follow_on_margin(self.match_format)
+		self.matchup_tables = {
+			home_team.team_id: MatchupTable(home_team, away_team, easy_bowling_on, self.match_format.overs),
+			away_team.team_id: MatchupTable(away_team, home_team, easy_bowling_on, self.match_format.overs)}
+		batting_policy = batting_policy or ListedBattingOrder()
+		self.batting_orders = {team.team_id: [self.matchup_tables[team.team_id].batter_slots[player.player_id] for player in batting_policy.batting_order(team)] for team in (home_team, away_team)}
+		# The toss decision depends only on who wins it
+		toss_policy = toss_policy or AutoTossPolicy()
+		game = Game(home_team, away_team)
+		self.bats_first_on_winning = {team.team_id: toss_policy.choose_to_bat(game, team) for team in (home_team, away_team)}
+		# Summary keys for the batting and bowling slots of each side
+		self.player_keys = {team.team_id: [team.short_name + ":" + player.name for player in team.players] for team in (home_team, away_team)}
+		# For declarations: each side's expected scoring against the other's attack
+		self.expected_scoring = {team_id: ExpectedScoring(table, self.batting_orders[team_id], self.match_format.balls_per_over) for (team_id, table) in self.matchup_tables.items()}
+
+	def opponent(self, team):
+		return self.away_team if team is self.home_team else self.home_team
+
+	def play_innings(self, innings_no, batting_team, target, balls_left, lead_before, rng):
+		# lead_before: the batting side's match runs minus the opposition's before this innings
+		opposition = self.expected_scoring[self.opponent(batting_team).team_id]
+		innings = InningsFork(self.matchup_tables[batting_team.team_id], self.match_format, innings_no, target, self.batting_orders[batting_team.team_id], self.bowling_policy)
+		innings.max_balls = balls_left
+		balls_per_over = self.match_format.balls_per_over
+		declared = False
+		innings.start_over()
+		over_balls = 0
+		while not innings.play_ball(rng):
+			if innings.balls != over_balls and innings.balls % balls_per_over == 0:
+				over_balls = innings.balls
+				if self.declaration_policy.should_declare(innings_no, innings.runs, lead_before + innings.runs, (balls_left - innings.balls) / balls_per_over, opposition):
+					declared = True
+					break
+		return (innings, declared)
+
+	def play(self, rng=None, summary=None):
+		# Plays one Test; when a summary is given, every innings is also folded into it
+		rng = resolve_rng(rng)
+		toss_winner = self.home_team if rng.random() < 0.5 else self.away_team
+		batting_first = toss_winner if self.bats_first_on_winning[toss_winner.team_id] else self.opponent(toss_winner)
+		batting_second = self.opponent(batting_first)
+		runs = {self.home_team.team_id: 0, self.away_team.team_id: 0}
+		balls_left = self.match_format.total_balls
+		played = []
+		followed_on = False
+		winner = None
+		margin = ""
+
+		order = [batting_first, batting_second, batting_first, batting_second]
+		innings_no = 1
+		while innings_no <= 4 and balls_left > 0:
+			batting_team = order[innings_no - 1]
+			fielding_team = self.opponent(batting_team)
+			if innings_no == 3:
+				lead = runs[batting_first.team_id] - runs[batting_second.team_id]
+				if lead >= self.follow_on_margin and self.follow_on_policy.enforce(lead, balls_left / self.match_format.balls_per_over):
+					followed_on = True
+					(order[2], order[3]) = (batting_second, batting_first)
+					(batting_team, fielding_team) = (batting_second, batting_first)
+			deficit = runs[fielding_team.team_id] - runs[batting_team.team_id]
+			target = max(1, deficit + 1) if innings_no == 4 else -1
+			(innings, declared) = self.play_innings(innings_no, batting_team, target, balls_left, -deficit, rng)
+			runs[batting_team.team_id] += innings.runs
+			balls_left -= innings.balls
+			played.append((batting_team, innings.runs, innings.wickets, innings.balls, declared))
+			if summary is not None:
+				summary.add_innings(innings_no, innings, self.player_keys[batting_team.team_id], self.player_keys[fielding_team.team_id])
+
+			all_out = innings.wickets >= innings.max_wickets
+			if innings_no == 3 and all_out and runs[batting_team.team_id] < runs[fielding_team.team_id]:
+				# Bowled out twice without drawing level: no fourth innings
+				winner = fielding_team
+				difference = runs[fielding_team.team_id] - runs[batting_team.team_id]
+				margin = "an innings and %d run%s" % (difference, "" if difference == 1 else "s")
+				break
+			if innings_no == 4:
+				if innings.runs >= target:
+					winner = batting_team
+					wickets_left = innings.max_wickets - innings.wickets
+					margin = "%d wicket%s" % (wickets_left, "" if wickets_left == 1 else "s")
+				elif all_out and innings.runs == target - 1:
+					margin = "tie"
+				elif all_out:
+					winner = fielding_team
+					difference = target - 1 - innings.runs
+					margin = "%d run%s" % (difference, "" if difference == 1 else "s")
+			innings_no += 1
+
+		result = FiveDayResult(self.home_team, self.away_team, toss_winner, played, followed_on, winner, margin)
+		if summary is not None:
+			summary.add_match(result)
+		return result
+
+	def play_many(self, count, seed=None, summary=None):
+		# Streams results into a FiveDaySummary rather than keeping them; match i uses MatchRNG(seed).child(i)
+		summary = summary if summary is not None else FiveDaySummary()
+		match_rng = MatchRNG(seed)
+		for index in range(count):
+			self.play(match_rng.child(index), summary)
+		return summary
+
+
+# MANY TESTS
+
+class FiveDaySeries:
+	# A fixture at the home team's ground, adjusted as in tournament.home_fixture_runner; picklable for worker processes
+	def __init__(self, home_team, away_team, match_format="Test", easy_bowling_on=False, conditions_seed=0, **policies):
+		self.home_team = home_team
+		self.away_team = away_team
+		self.match_format = match_format
+		self.easy_bowling_on = easy_bowling_on
+		self.conditions_seed = conditions_seed
+		self.policies = policies
+		self.cache_key = uuid.uuid4().hex
+
+	def get_runner(self):
+		((home_team, away_team), _) = ground_adjustments(self.home_team, self.away_team, "", MatchRNG([self.conditions_seed]))
+		return FiveDayRunner(home_team, away_team, self.match_format, self.easy_bowling_on, **self.policies)
+
+def play_range(runner, match_rng, start, stop):
+	summary = FiveDaySummary()
+	for index in range(start, stop):
+		runner.play(match_rng.child(index), summary)
+	return summary
+
+# Compiling the matchup tables dominates short runs, so worker processes keep their runners. Only
+# worker processes do: they end with the pool, while the in-process path (workers=1) uses one runner
+_worker_runners = {}
+
+def play_tests(series, match_rng, start, stop):
+	if series.cache_key not in _worker_runners:
+		_worker_runners[series.cache_key] = series.get_runner()
+	return play_range(_worker_runners[series.cache_key], match_rng, start, stop)
+
+def simulate_tests(home_team, away_team, tests=1000, seed=None, workers=None, chunks_per_worker=4, **options):
+	# Test i always uses stream i, so the summary for a seed does not depend on the number of workers;
+	# streams are built as they are needed rather than all up front
+	series = FiveDaySeries(home_team, away_team, **options)
+	workers = workers or os.cpu_count() or 1
+	match_rng = MatchRNG(seed)
+	chunk_size = max(1, -(-tests // (workers * chunks_per_worker)))
+	chunks = [(start, min(tests, start + chunk_size)) for start in range(0, tests, chunk_size)]
+	if workers == 1:
+		runner = series.get_runner()
+		summaries = [play_range(runner, match_rng, start, stop) for (start, stop) in chunks]
+	else:
+		with ProcessPoolExecutor(max_workers=workers) as executor:
+			summaries = list(executor.map(play_tests, [series] * len(chunks), [match_rng] * len(chunks), *zip(*chunks)))
+	summary = FiveDaySummary()
+	for chunk_summary in summaries:
+		summary.merge(chunk_summary)
+	return summary
+
+
+# COMMAND LINE
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog="python -m simengine.long_form", description="Simulate many Test matches between two squads and summarise the results.")
+	parser.add_argument("--home", required=True, help="home team short name")
+	parser.add_argument("--away", required=True, help="away team short name")
+	parser.add_argument("--tests", type=int, default=1000, help="Test matches to play")
+	parser.add_argument("--squads", default="players_to_import.csv", help="squad CSV built from team_lists.txt and all_squads.csv")
+	parser.add_argument("--easy-bowling", action="store_true", help="simulate with easy bowling on")
+	parser.add_argument("--seed", type=int, help="seed for the matches and the pitch conditions")
+	parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+	parser.add_argument("--output", help="write the summary to this JSON file")
+	args = parser.parse_args(argv)
+
+	teams = {team.short_name: team for team in load_squads(args.squads)}
+	for team in (args.home.upper(), args.away.upper()):
+		if team not in teams:
+			parser.error(f"Unknown team {team}; squads has {', '.join(teams)}")
+	summary = simulate_tests(teams[args.home.upper()], teams[args.away.upper()], args.tests, args.seed, args.workers, easy_bowling_on=args.easy_bowling, conditions_seed=args.seed or 0).summary()
+	if args.output:
+		write_json(args.output, summary)
+	for (outcome, probability) in summary["result_probabilities"].items():
+		print("%-6s %6.1f%%" % (outcome, 100 * probability))
+	for (innings_no, stats) in summary["innings"].items():
+		print("innings %s: mean %.1f (sd %.1f)" % (innings_no, stats["mean_total"], stats["total_std"]))
+	print("mean match length %.1f overs, follow-on in %.1f%%, %.2f declarations per match" % (summary["mean_match_overs"], 100 * summary["follow_on_rate"], summary["declarations_per_match"]))
+
+if __name__ == "__main__":
+	main()
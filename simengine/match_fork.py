@@ -0,0 +1,276 @@
+from simengine.rng import resolve_rng
+
+# Branchable match state for what-if analysis and win-probability playouts.
+#
+# Rosters, player attributes and compiled matchup tables never change while a match is being
+# branched, so every fork shares them. Only the counters are copied: the score, the batters and
+# bowler by roster slot, and per-slot batting and bowling counts held in short lists instead of
+# BattingScore/BowlingFigures objects. A fork is a handful of assignments and list copies, and
+# playing it forward never touches the PlayerObjects of the match it came from.
+#
+# The rules are those of MatchRunner.play_innings and InningsState.record_delivery, and the draws
+# are taken in the same order, so playing a fork gives the same result as the runner for the
+# same stream.
+
+
+class InningsFork:
+	__slots__ = ("table", "match_format", "batting_order", "bowling_policy", "max_wickets", "max_balls", "innings_no", "target", "runs", "wickets", "balls", "extras", "is_free_hit", "striker", "non_striker", "bowler", "next_batter", "batter_runs", "batter_balls", "batter_out", "bowler_balls", "bowler_runs", "bowler_wickets")
+
+	def __init__(self, table, match_format, innings_no=1, target=-1, batting_order=None, bowling_policy=None):
+		# Shared between forks
+		self.table = table
+		self.match_format = match_format
+		# Roster slots of the batting side in the order they come in
+		self.batting_order = tuple(batting_order if batting_order is not None else range(len(table.batting_team.players)))
+		self.bowling_policy = bowling_policy
+		self.max_wickets = min(10, len(table.batting_team.players) - 1)
+		# Legal deliveries the innings may last; less than the format's total when a Test's time is running out
+		self.max_balls = match_format.total_balls
+		# Copied by fork
+		self.innings_no = innings_no
+		self.target = target
+		self.runs = 0
+		self.wickets = 0
+		self.balls = 0
+		self.extras = 0
+		self.is_free_hit = False
+		(self.striker, self.non_striker) = (self.batting_order[0], self.batting_order[1])
+		self.bowler = -1
+		self.next_batter = 2
+		batters = len(table.batting_team.players)
+		bowlers = len(table.fielding_team.players)
+		self.batter_runs = [0] * batters
+		self.batter_balls = [0] * batters
+		self.batter_out = [False] * batters
+		self.bowler_balls = [0] * bowlers
+		self.bowler_runs = [0] * bowlers
+		self.bowler_wickets = [0] * bowlers
+
+	def fork(self):
+		clone = InningsFork.__new__(InningsFork)
+		clone.table = self.table
+		clone.match_format = self.match_format
+		clone.batting_order = self.batting_order
+		clone.bowling_policy = self.bowling_policy
+		clone.max_wickets = self.max_wickets
+		clone.max_balls = self.max_balls
+		clone.innings_no = self.innings_no
+		clone.target = self.target
+		clone.runs = self.runs
+		clone.wickets = self.wickets
+		clone.balls = self.balls
+		clone.extras = self.extras
+		clone.is_free_hit = self.is_free_hit
+		clone.striker = self.striker
+		clone.non_striker = self.non_striker
+		clone.bowler = self.bowler
+		clone.next_batter = self.next_batter
+		clone.batter_runs = self.batter_runs[:]
+		clone.batter_balls = self.batter_balls[:]
+		clone.batter_out = self.batter_out[:]
+		clone.bowler_balls = self.bowler_balls[:]
+		clone.bowler_runs = self.bowler_runs[:]
+		clone.bowler_wickets = self.bowler_wickets[:]
+		return clone
+
+	def is_complete(self):
+		return self.wickets >= self.max_wickets or self.balls >= self.max_balls or (self.target > 0 and self.runs >= self.target)
+
+	# BOWLING
+
+	def eligible_bowler_slots(self, is_first_over):
+		# As InningsState.get_eligible_bowlers, with the same fallback as match_runner.eligible_bowlers
+		players = self.table.fielding_team.players
+		quota = self.match_format.bowler_quota_balls
+		eligible = [slot for (slot, player) in enumerate(players) if not player.is_wicketkeeper and (is_first_over or (slot != self.bowler and self.bowler_balls[slot] < quota))]
+		if not eligible:
+			eligible = [slot for (slot, player) in enumerate(players) if slot != self.bowler and not player.is_wicketkeeper]
+		return eligible
+
+	def choose_bowler(self, is_first_over):
+		eligible = self.eligible_bowler_slots(is_first_over)
+		players = self.table.fielding_team.players
+		if self.bowling_policy is None:
+			# BestAvailableBowler; max keeps the first of equals, as it does over players
+			return max(eligible, key=lambda slot: players[slot].bowling_skill)
+		return self.table.fielder_slots[self.bowling_policy.choose_bowler(self, [players[slot] for slot in eligible]).player_id]
+
+	def start_over(self):
+		self.bowler = self.choose_bowler(self.bowler < 0)
+
+	# PLAY
+
+	def play_ball(self, rng):
+		# Returns True once the innings is over
+		fielder = int(rng.random() * 11)
+		distribution = self.table.lookup_slots(self.striker, self.bowler, fielder)
+		(delivery_name, _, runs, _, is_wicket, _, _) = distribution.results[self.is_free_hit][distribution.sample(rng.random())]
+		(striker, bowler) = (self.striker, self.bowler)
+		if delivery_name == "wide_ball":
+			self.runs += 1
+			self.extras += 1
+			self.bowler_runs[bowler] += 1
+			return self.target > 0 and self.runs >= self.target
+		is_legal = delivery_name != "no_ball"
+		if is_legal:
+			self.is_free_hit = False
+		else:
+			self.runs += 1
+			self.extras += 1
+			self.bowler_runs[bowler] += 1
+			self.is_free_hit = True
+		self.balls += is_legal
+		self.bowler_balls[bowler] += is_legal
+		self.batter_balls[striker] += 1
+		if is_wicket:
+			self.wickets += 1
+			self.batter_out[striker] = True
+			self.bowler_wickets[bowler] += 1
+		else:
+			self.runs += runs
+			self.batter_runs[striker] += runs
+			self.bowler_runs[bowler] += runs
+			if runs % 2:
+				(self.striker, self.non_striker) = (self.non_striker, striker)
+
+		if self.target > 0 and self.runs >= self.target:
+			return True
+		if is_wicket:
+			if self.wickets >= self.max_wickets:
+				return True
+			self.striker = self.batting_order[self.next_batter]
+			self.next_batter += 1
+		if is_legal and self.balls >= self.max_balls:
+			return True
+		if is_legal and self.balls % self.match_format.balls_per_over == 0:
+			(self.striker, self.non_striker) = (self.non_striker, self.striker)
+			self.start_over()
+		return False
+
+	def play_out(self, rng=None):
+		rng = resolve_rng(rng)
+		if self.is_complete():
+			return self
+		if self.bowler < 0:
+			self.start_over()
+		while not self.play_ball(rng):
+			pass
+		return self
+
+	# CAPTURE
+
+	@classmethod
+	def from_innings(cls, innings, table, bowling_policy=None):
+		# Captures a live InningsState (and its players' scorecards) once; the InningsState is not changed
+		batting_players = table.batting_team.players
+		batted = [table.batter_slots[player.player_id] for player in innings.batting_team.final_batting_order]
+		batting_order = batted + [slot for slot in range(len(batting_players)) if slot not in batted]
+		fork = cls(table, innings.match_format, innings.innings_no, innings.target, batting_order, bowling_policy)
+		fork.runs = innings.total_runs
+		fork.wickets = innings.total_wickets
+		fork.balls = innings.deliveries
+		fork.extras = innings.extras
+		fork.is_free_hit = innings.is_free_hit
+		fork.striker = table.batter_slots[innings.on_strike_batsman.player_id]
+		fork.non_striker = table.batter_slots[innings.off_strike_batsman.player_id]
+		fork.next_batter = max(2, len(batted))
+		fork.bowler = table.fielder_slots[innings.current_bowler.player_id] if innings.current_bowler is not None else -1
+		for (slot, player) in enumerate(batting_players):
+			score = player.batting_score
+			(fork.batter_runs[slot], fork.batter_balls[slot], fork.batter_out[slot]) = (score.runs_scored, score.balls_faced, not score.not_out)
+		for (slot, player) in enumerate(table.fielding_team.players):
+			figures = player.bowling_figures
+			(fork.bowler_balls[slot], fork.bowler_runs[slot], fork.bowler_wickets[slot]) = (figures.deliveries, figures.runs_conceded, figures.wickets_taken)
+		return fork
+
+	@classmethod
+	def from_snapshot(cls, snapshot, table, match_format, batting_order=None, bowling_policy=None):
+		# From a match_runner.MatchSnapshot: batters at the crease first, then the rest in batting_order
+		batting_order = list(batting_order if batting_order is not None else range(len(table.batting_team.players)))
+		at_crease = [table.batter_slots[snapshot.striker_id], table.batter_slots[snapshot.non_striker_id]]
+		used = {table.batter_slots[player_id] for player_id in snapshot.batters_used if player_id in table.batter_slots}
+		fork = cls(table, match_format, snapshot.innings_no, snapshot.target, at_crease + [slot for slot in batting_order if slot not in used and slot not in at_crease], bowling_policy)
+		fork.runs = snapshot.runs
+		fork.wickets = snapshot.wickets
+		fork.balls = snapshot.balls
+		fork.is_free_hit = snapshot.is_free_hit
+		for (player_id, balls) in snapshot.bowler_balls.items():
+			if player_id in table.fielder_slots:
+				fork.bowler_balls[table.fielder_slots[player_id]] = balls
+		fork.bowler = table.fielder_slots.get(snapshot.bowler_id, -1)
+		if not fork.is_complete() and (fork.bowler < 0 or fork.balls % match_format.balls_per_over == 0):
+			# Start of an over: the batters are already at the ends they will face from
+			fork.start_over()
+		return fork
+
+	def to_dict(self):
+		batting_players = self.table.batting_team.players
+		fielding_players = self.table.fielding_team.players
+		return {
+			"innings_no": self.innings_no,
+			"target": self.target,
+			"runs": self.runs,
+			"wickets": self.wickets,
+			"balls": self.balls,
+			"extras": self.extras,
+			"is_free_hit": self.is_free_hit,
+			"striker_id": batting_players[self.striker].player_id,
+			"non_striker_id": batting_players[self.non_striker].player_id,
+			"bowler_id": fielding_players[self.bowler].player_id if self.bowler >= 0 else None,
+			"batting_order": [batting_players[slot].player_id for slot in self.batting_order],
+			"next_batter": self.next_batter,
+			"batting": {batting_players[slot].player_id: (self.batter_runs[slot], self.batter_balls[slot], self.batter_out[slot]) for slot in range(len(batting_players))},
+			"bowling": {fielding_players[slot].player_id: (self.bowler_balls[slot], self.bowler_runs[slot], self.bowler_wickets[slot]) for slot in range(len(fielding_players))}}
+
+
+class MatchFork:
+	__slots__ = ("tables", "match_format", "batting_first_id", "first_innings_runs", "innings", "second_batting_order", "bowling_policy")
+
+	def __init__(self, tables, match_format, batting_first_id, innings, first_innings_runs=None, second_batting_order=None, bowling_policy=None):
+		# tables: {batting team_id: MatchupTable}, shared by every fork
+		self.tables = tables
+		self.match_format = match_format
+		self.batting_first_id = batting_first_id
+		self.innings = innings
+		self.first_innings_runs = first_innings_runs
+		self.second_batting_order = second_batting_order
+		self.bowling_policy = bowling_policy
+
+	@classmethod
+	def from_game(cls, game, tables, match_format, bowling_policy=None):
+		# Captures a live Game partway through its first or second innings; the Game is not changed
+		innings = game.second_innings or game.first_innings
+		current = InningsFork.from_innings(innings, tables[innings.batting_team.team_id], bowling_policy)
+		first_innings_runs = game.first_innings.total_runs if game.second_innings is not None else None
+		return cls(tables, match_format, game.first_innings.batting_team.team_id, current, first_innings_runs, None, bowling_policy)
+
+	def fork(self):
+		clone = MatchFork.__new__(MatchFork)
+		clone.tables = self.tables
+		clone.match_format = self.match_format
+		clone.batting_first_id = self.batting_first_id
+		clone.first_innings_runs = self.first_innings_runs
+		clone.second_batting_order = self.second_batting_order
+		clone.bowling_policy = self.bowling_policy
+		clone.innings = self.innings.fork()
+		return clone
+
+	def to_dict(self):
+		return {"batting_first_id": self.batting_first_id, "first_innings_runs": self.first_innings_runs, "innings": self.innings.to_dict()}
+
+	def play_out(self, rng=None):
+		# Finishes the match; returns (total of the innings in progress, winning team_id or None for a tie)
+		rng = resolve_rng(rng)
+		current = self.innings.play_out(rng)
+		if current.innings_no == 1:
+			projected_total = current.runs
+			chasing_table = next(table for (team_id, table) in self.tables.items() if team_id != self.batting_first_id)
+			self.first_innings_runs = current.runs
+			self.innings = InningsFork(chasing_table, self.match_format, 2, current.runs + 1, self.second_batting_order, self.bowling_policy).play_out(rng)
+		else:
+			projected_total = current.runs
+		(first_runs, second_runs) = (self.first_innings_runs, self.innings.runs)
+		if first_runs == second_runs:
+			return (projected_total, None)
+		chasing_id = next(team_id for team_id in self.tables if team_id != self.batting_first_id)
+		return (projected_total, chasing_id if second_runs > first_runs else self.batting_first_id)
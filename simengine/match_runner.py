@@ -0,0 +1,395 @@
+import numpy as np
+
+from simengine.innings import InningsState, Game
+from simengine.formats import get_format
+from simengine.innings_batch import InningsBatch, compile_sampler, plan_bowling
+from simengine.match_fork import InningsFork, MatchFork
+from simengine.matchup_table import MatchupTable
+from simengine.policies import AutoTossPolicy, ListedBattingOrder, BestAvailableBowler, eligible_bowlers
+from simengine.probability_helpers import EventMatrixCache
+from simengine.rng import MatchRNG, resolve_rng
+from simengine.super_over import AutoSuperOverPolicy, resolve_super_overs
+
+# Plays complete limited-overs matches in memory, with no prompts and no database.
+# The toss decision, batting order and bowler changes come from policy objects, so callers can
+# swap in their own captaincy; the defaults mirror the AI choices in Game.toss.
+
+
+# RESULTS
+
+class MatchResult:
+	def __init__(self, batting_first, batting_second, first_innings, second_innings, toss_winner):
+		self.batting_first = batting_first
+		self.batting_second = batting_second
+		self.first_innings = first_innings
+		self.second_innings = second_innings
+		self.toss_winner = toss_winner
+		self.is_tie = first_innings.total_runs == second_innings.total_runs
+		self.winner = None
+		self.margin = ""
+		# Super overs played to decide a tie, in order
+		self.super_overs = []
+		if second_innings.total_runs > first_innings.total_runs:
+			self.winner = batting_second
+			wickets_left = min(10, len(batting_second.players) - 1) - second_innings.total_wickets
+			self.margin = "%d wicket%s" % (wickets_left, "" if wickets_left == 1 else "s")
+		elif first_innings.total_runs > second_innings.total_runs:
+			self.winner = batting_first
+			runs = first_innings.total_runs - second_innings.total_runs
+			self.margin = "%d run%s" % (runs, "" if runs == 1 else "s")
+
+	def set_super_overs(self, super_overs, winner):
+		# A tie stays a tie on the scorecard (is_tie); the super overs decide the winner
+		self.super_overs = super_overs
+		self.winner = winner
+		self.margin = "super over" if len(super_overs) == 1 else "%d super overs" % len(super_overs)
+
+	def result_text(self):
+		if self.is_tie and self.winner is not None:
+			return "Match tied; %s won %s" % (self.winner.name, "the super over" if len(self.super_overs) == 1 else "after " + self.margin)
+		if self.is_tie:
+			return "Match tied"
+		return "%s won by %s" % (self.winner.name, self.margin)
+
+	def to_dict(self):
+		return {
+			"batting_first": self.batting_first.short_name,
+			"batting_second": self.batting_second.short_name,
+			"toss_winner": self.toss_winner.short_name,
+			"first_innings": (self.first_innings.total_runs, self.first_innings.total_wickets, self.first_innings.deliveries),
+			"second_innings": (self.second_innings.total_runs, self.second_innings.total_wickets, self.second_innings.deliveries),
+			"winner": self.winner.short_name if self.winner else None,
+			"is_tie": self.is_tie,
+			"super_overs": [super_over.to_dict() for super_over in self.super_overs],
+			"result": self.result_text()}
+
+
+# RUNNER
+
+class MatchRunner:
+	def __init__(self, home_team, away_team, match_format="T20", easy_bowling_on=False, toss_policy=None, batting_policy=None, bowling_policy=None, super_over_policy=None):
+		self.home_team = home_team
+		self.away_team = away_team
+		self.match_format = get_format(match_format) if isinstance(match_format, str) else match_format
+		self.easy_bowling_on = easy_bowling_on
+		self.toss_policy = toss_policy or AutoTossPolicy()
+		self.batting_policy = batting_policy or ListedBattingOrder()
+		self.bowling_policy = bowling_policy or BestAvailableBowler()
+		self.super_over_policy = super_over_policy or AutoSuperOverPolicy()
+		# Player attributes are not changed by the runner, so both innings' tables are built once and reused
+		self.matchup_tables = {
+			home_team.team_id: MatchupTable(home_team, away_team, easy_bowling_on, self.match_format.overs),
+			away_team.team_id: MatchupTable(away_team, home_team, easy_bowling_on, self.match_format.overs)}
+		# InningsBatch samplers of the tables, compiled on first use
+		self.samplers = {}
+
+	def sampler(self, team_id):
+		if team_id not in self.samplers:
+			self.samplers[team_id] = compile_sampler(self.matchup_tables[team_id])
+		return self.samplers[team_id]
+
+	def toss(self, game):
+		toss_winner = game.home_team if game.rng.random() < 0.5 else game.away_team
+		toss_loser = game.away_team if toss_winner is game.home_team else game.home_team
+		if self.toss_policy.choose_to_bat(game, toss_winner):
+			return (toss_winner, toss_loser, toss_winner)
+		return (toss_loser, toss_winner, toss_winner)
+
+	def choose_bowler(self, innings, is_first_over):
+		return self.bowling_policy.choose_bowler(innings, eligible_bowlers(innings, is_first_over))
+
+	def play_innings(self, innings_no, batting_team, fielding_team, target, rng, snapshot=None):
+		match_format = self.match_format
+		batting_order = self.batting_policy.batting_order(batting_team)
+		if snapshot is not None:
+			# The batters at the crease open, the rest follow in policy order
+			players = {player.player_id: player for player in batting_team.players + fielding_team.players}
+			at_crease = [players[snapshot.striker_id], players[snapshot.non_striker_id]]
+			batting_order = at_crease + [player for player in batting_order if player.player_id not in snapshot.batters_used and player not in at_crease]
+		innings = InningsState(innings_no, match_format.overs, batting_team, fielding_team, batting_order[0], batting_order[1], target, self.easy_bowling_on, rng, match_format)
+		innings.set_openers(batting_order[0], batting_order[1])
+		if snapshot is not None:
+			innings.total_runs = snapshot.runs
+			innings.total_wickets = snapshot.wickets
+			innings.deliveries = snapshot.balls
+			innings.is_free_hit = snapshot.is_free_hit
+			for player in fielding_team.players:
+				player.bowling_figures.deliveries = snapshot.bowler_balls.get(player.player_id, 0)
+			innings.current_bowler = players.get(snapshot.bowler_id)
+		max_wickets = min(10, len(batting_team.players) - 1)
+		if innings.total_wickets >= max_wickets or innings.deliveries >= match_format.total_balls or (target > 0 and innings.total_runs >= target):
+			return innings
+		if innings.current_bowler is None or innings.deliveries % match_format.balls_per_over == 0:
+			# Start of an over: the batters are already at the ends they will face from
+			innings.set_opening_bowler(self.choose_bowler(innings, innings.current_bowler is None))
+		table = self.matchup_tables[batting_team.team_id]
+		next_batter = 2
+
+		fielders = fielding_team.players
+		(striker, bowler) = (None, None)
+		while True:
+			if innings.on_strike_batsman is not striker or innings.current_bowler is not bowler:
+				(striker, bowler) = (innings.on_strike_batsman, innings.current_bowler)
+				(striker_slot, bowler_slot) = (table.batter_slots[striker.player_id], table.fielder_slots[bowler.player_id])
+			# Same draw as pick_fielder
+			fielder_slot = int(rng.random() * 11)
+			fielder = fielders[fielder_slot]
+			delivery_result = table.lookup_slots(striker_slot, bowler_slot, fielder_slot).delivery(rng.random(), innings.is_free_hit)
+			is_legal = innings.record_delivery(delivery_result, fielder, table.wicketkeeper)
+			if target > 0 and innings.total_runs >= target:
+				break
+			if delivery_result.is_wicket:
+				if innings.total_wickets >= max_wickets:
+					break
+				innings.new_batsman_enter(batting_order[next_batter])
+				next_batter += 1
+			if is_legal and innings.deliveries % match_format.balls_per_over == 0:
+				if innings.deliveries >= match_format.total_balls:
+					break
+				innings.next_over(self.choose_bowler(innings, False))
+		return innings
+
+	def play(self, rng=None, resolve_ties=False):
+		# resolve_ties: decide a tied match with super overs, repeated while they are tied
+		rng = resolve_rng(rng)
+		self.home_team.reset()
+		self.away_team.reset()
+		game = Game(self.home_team, self.away_team, rng)
+		(batting_first, batting_second, toss_winner) = self.toss(game)
+		first_innings = self.play_innings(1, batting_first, batting_second, -1, rng)
+		game.set_first_innings(first_innings)
+		second_innings = self.play_innings(2, batting_second, batting_first, first_innings.total_runs + 1, rng)
+		game.set_second_innings(second_innings)
+		result = MatchResult(batting_first, batting_second, first_innings, second_innings, toss_winner)
+		if resolve_ties and result.is_tie:
+			self.play_super_overs(result, rng)
+		game.winner = result.winner
+		return result
+
+	def play_many(self, count, seed=None, resolve_ties=False):
+		# Results only, on the InningsBatch kernel; play keeps the scorecards for single matches
+		return MatchBatch(self, count).run(MatchRNG(seed), resolve_ties)
+
+	def play_super_overs(self, result, rng=None, max_super_overs=None):
+		# The side that batted second bats first in the super over; uses the match's compiled tables
+		(winner, super_overs) = resolve_super_overs(result.batting_second, result.batting_first, self.matchup_tables, resolve_rng(rng), self.super_over_policy, max_super_overs, self.easy_bowling_on)
+		result.set_super_overs(super_overs, winner)
+		return result
+
+	def play_out(self, snapshot, rng=None):
+		# Finishes a match from a live snapshot; returns (total of the snapshot innings, winning team or None for a tie)
+		rng = resolve_rng(rng)
+		self.home_team.reset()
+		self.away_team.reset()
+		(batting_team, fielding_team) = (self.home_team, self.away_team) if snapshot.batting_team_id == self.home_team.team_id else (self.away_team, self.home_team)
+		if snapshot.innings_no == 1:
+			first_innings = self.play_innings(1, batting_team, fielding_team, -1, rng, snapshot)
+			second_innings = self.play_innings(2, fielding_team, batting_team, first_innings.total_runs + 1, rng)
+			(projected_total, first_total, second_total) = (first_innings.total_runs, first_innings.total_runs, second_innings.total_runs)
+			(batting_first, batting_second) = (batting_team, fielding_team)
+		else:
+			second_innings = self.play_innings(2, batting_team, fielding_team, snapshot.target, rng, snapshot)
+			(projected_total, first_total, second_total) = (second_innings.total_runs, snapshot.target - 1, second_innings.total_runs)
+			(batting_first, batting_second) = (fielding_team, batting_team)
+		if first_total == second_total:
+			return (projected_total, None)
+		return (projected_total, batting_second if second_total > first_total else batting_first)
+
+	def fork_snapshot(self, snapshot):
+		# A MatchFork of a live snapshot that shares this runner's matchup tables; play_out on a fork of
+		# it gives the same result as play_out(snapshot) for the same stream
+		(batting_team, fielding_team) = (self.home_team, self.away_team) if snapshot.batting_team_id == self.home_team.team_id else (self.away_team, self.home_team)
+		(batting_table, fielding_table) = (self.matchup_tables[batting_team.team_id], self.matchup_tables[fielding_team.team_id])
+		batting_order = [batting_table.batter_slots[player.player_id] for player in self.batting_policy.batting_order(batting_team)]
+		second_batting_order = [fielding_table.batter_slots[player.player_id] for player in self.batting_policy.batting_order(fielding_team)]
+		# Forks pick the best available bowler themselves; other policies are asked with the fork as the innings
+		bowling_policy = None if type(self.bowling_policy) is BestAvailableBowler else self.bowling_policy
+		innings = InningsFork.from_snapshot(snapshot, batting_table, self.match_format, batting_order, bowling_policy)
+		if snapshot.innings_no == 1:
+			return MatchFork(self.matchup_tables, self.match_format, batting_team.team_id, innings, None, second_batting_order, bowling_policy)
+		return MatchFork(self.matchup_tables, self.match_format, fielding_team.team_id, innings, snapshot.target - 1, None, bowling_policy)
+
+	def play_out_many(self, snapshot, count, rng=None):
+		# count playouts of a live snapshot in lockstep on the InningsBatch kernel, without touching the
+		# squads; returns [(total of the snapshot innings, winning team_id or None for a tie)]
+		rng = rng if rng is not None else MatchRNG()
+		base = self.fork_snapshot(snapshot)
+		other_id = next(team_id for team_id in self.matchup_tables if team_id != snapshot.batting_team_id)
+		current = InningsBatch.from_fork(base.innings, count, sampler=self.sampler(snapshot.batting_team_id)).run(rng)
+		if snapshot.innings_no == 1:
+			chase = InningsFork(self.matchup_tables[other_id], self.match_format, 2, -1, base.second_batting_order, base.bowling_policy)
+			(first_runs, second_runs) = (current.runs.tolist(), InningsBatch.from_fork(chase, count, current.runs + 1, sampler=self.sampler(other_id)).run(rng).runs.tolist())
+			(batting_first_id, batting_second_id) = (snapshot.batting_team_id, other_id)
+		else:
+			(first_runs, second_runs) = ([snapshot.target - 1] * count, current.runs.tolist())
+			(batting_first_id, batting_second_id) = (other_id, snapshot.batting_team_id)
+		winners = [None if first == second else batting_second_id if second > first else batting_first_id for (first, second) in zip(first_runs, second_runs)]
+		return list(zip(current.runs.tolist(), winners))
+
+def play_match(home_team, away_team, match_format="T20", seed=None, resolve_ties=False, **policies):
+	return MatchRunner(home_team, away_team, match_format, **policies).play(MatchRNG(seed), resolve_ties)
+
+
+# MANY MATCHES
+
+class MatchBatch:
+	# count matches of one runner's fixture, played as InningsBatch runs in lockstep: the first innings
+	# of each side batting first, then each side's chases. Teams are indexed 0 (home) and 1 (away).
+	# The toss policy is asked once for each side winning the toss, and the bowling policy plans each
+	# side's overs once (plan_bowling); tied matches go to super overs one at a time
+	def __init__(self, runner, count):
+		self.runner = runner
+		self.count = count
+		self.teams = (runner.home_team, runner.away_team)
+		self.bowling_plans = [plan_bowling(self.teams[side], self.teams[1 - side], runner.match_format, runner.bowling_policy) for side in (0, 1)]
+		self.toss_winner = np.zeros(count, dtype=np.int64)
+		self.batting_first = np.zeros(count, dtype=np.int64)
+		(self.first_runs, self.first_wickets, self.first_balls) = (np.zeros(count, dtype=np.int64) for _ in range(3))
+		(self.second_runs, self.second_wickets, self.second_balls) = (np.zeros(count, dtype=np.int64) for _ in range(3))
+		# Winning team index, or -1 for a tie
+		self.winner = np.full(count, -1, dtype=np.int64)
+		self.is_tie = np.zeros(count, dtype=bool)
+
+	def play_innings(self, side, count, target, rng):
+		runner = self.runner
+		(batting_team, fielding_team) = (self.teams[side], self.teams[1 - side])
+		return InningsBatch(batting_team, fielding_team, count, runner.match_format, target, runner.easy_bowling_on, runner.batting_policy.batting_order(batting_team), self.bowling_plans[side], runner.matchup_tables[batting_team.team_id], False, runner.sampler(batting_team.team_id)).run(rng)
+
+	def run(self, rng=None, resolve_ties=False):
+		rng = rng if rng is not None else MatchRNG()
+		runner = self.runner
+		for team in self.teams:
+			team.reset()
+		game = Game(self.teams[0], self.teams[1], rng)
+		chooses_to_bat = np.array([runner.toss_policy.choose_to_bat(game, team) for team in self.teams])
+		# The home side wins the toss on a draw below one half, as in MatchRunner.toss
+		self.toss_winner = (rng.generator.random(self.count) >= 0.5).astype(np.int64)
+		self.batting_first = np.where(chooses_to_bat[self.toss_winner], self.toss_winner, 1 - self.toss_winner)
+		for side in (0, 1):
+			rows = np.flatnonzero(self.batting_first == side)
+			if len(rows):
+				innings = self.play_innings(side, len(rows), -1, rng)
+				(self.first_runs[rows], self.first_wickets[rows], self.first_balls[rows]) = (innings.runs, innings.wickets, innings.balls)
+		for side in (0, 1):
+			rows = np.flatnonzero(self.batting_first != side)
+			if len(rows):
+				innings = self.play_innings(side, len(rows), self.first_runs[rows] + 1, rng)
+				(self.second_runs[rows], self.second_wickets[rows], self.second_balls[rows]) = (innings.runs, innings.wickets, innings.balls)
+		self.is_tie = self.first_runs == self.second_runs
+		self.winner = np.where(self.second_runs > self.first_runs, 1 - self.batting_first, np.where(self.is_tie, -1, self.batting_first))
+		if resolve_ties:
+			# Match i's super overs use rng.child(i)
+			for match in np.flatnonzero(self.is_tie).tolist():
+				for team in self.teams:
+					team.reset()
+				batting_first = self.teams[self.batting_first[match]]
+				(winner, _) = resolve_super_overs(self.teams[1 - self.batting_first[match]], batting_first, runner.matchup_tables, rng.child(match), runner.super_over_policy, None, runner.easy_bowling_on)
+				self.winner[match] = -1 if winner is None else int(winner is not self.teams[0])
+		return self
+
+	def summary(self):
+		return {
+			"matches": self.count,
+			"home_team": self.teams[0].short_name,
+			"away_team": self.teams[1].short_name,
+			"home_win_rate": float((self.winner == 0).mean()),
+			"away_win_rate": float((self.winner == 1).mean()),
+			"tie_rate": float(self.is_tie.mean()),
+			"batting_first_win_rate": float((self.winner == self.batting_first).mean()),
+			"mean_first_innings": float(self.first_runs.mean()),
+			"mean_second_innings": float(self.second_runs.mean())}
+
+
+# LIVE PLAYOUTS
+
+class MatchSnapshot:
+	def __init__(self, innings_no, batting_team_id, runs, wickets, balls, striker_id, non_striker_id, bowler_id=None, target=-1, batters_used=(), bowler_balls=None, is_free_hit=False):
+		self.innings_no = innings_no
+		self.batting_team_id = batting_team_id
+		self.runs = runs
+		self.wickets = wickets
+		# Legal deliveries bowled so far in the innings
+		self.balls = balls
+		self.striker_id = striker_id
+		self.non_striker_id = non_striker_id
+		# Bowler of the current (or just completed) over
+		self.bowler_id = bowler_id
+		self.target = target
+		self.batters_used = set(batters_used)
+		self.bowler_balls = dict(bowler_balls or {})
+		self.is_free_hit = is_free_hit
+
+# Worker processes keep their runner (and its compiled matchup tables) between requests for the same match,
+# for the most recently played matches only, so a long-running server does not keep one for every match
+PLAYOUT_RUNNER_CACHE_SIZE = 16
+_playout_runners = EventMatrixCache(PLAYOUT_RUNNER_CACHE_SIZE)
+
+# From a worker sent only the key of a runner it does not have: a new match, a new worker or an evicted runner
+class RunnerNotCached(Exception):
+	pass
+
+def playout_runner(squads):
+	if squads is None:
+		raise RunnerNotCached()
+	return MatchRunner(*squads)
+
+def run_playouts(runner_key, squads, snapshot, count, rng):
+	# squads: (home_team, away_team, match_format, easy_bowling_on) to build the runner, or None to send
+	# only the key to a worker expected to have it; RunnerNotCached asks for them again
+	runner = _playout_runners.get(runner_key, lambda: playout_runner(squads))
+	return runner.play_out_many(snapshot, count, rng)
+
+def wilson_interval(successes, trials, z=1.96):
+	if trials == 0:
+		return (0.0, 0.0)
+	proportion = successes / trials
+	denominator = 1 + z * z / trials
+	centre = (proportion + z * z / (2 * trials)) / denominator
+	half_width = z * ((proportion * (1 - proportion) / trials + z * z / (4 * trials * trials)) ** 0.5) / denominator
+	return (max(0.0, centre - half_width), min(1.0, centre + half_width))
+
+def summarize_playouts(outcomes, batting_team_id, bin_width=10):
+	trials = len(outcomes)
+	wins = sum(1 for (_, winner_id) in outcomes if winner_id == batting_team_id)
+	ties = sum(1 for (_, winner_id) in outcomes if winner_id is None)
+	losses = trials - wins - ties
+	totals = sorted(total for (total, _) in outcomes)
+	histogram = {}
+	for total in totals:
+		histogram[total // bin_width * bin_width] = histogram.get(total // bin_width * bin_width, 0) + 1
+	return {
+		"playouts": trials,
+		"batting_team_id": batting_team_id,
+		"win_probability": wins / trials,
+		"tie_probability": ties / trials,
+		"loss_probability": losses / trials,
+		"win_interval": wilson_interval(wins, trials),
+		"tie_interval": wilson_interval(ties, trials),
+		"loss_interval": wilson_interval(losses, trials),
+		"projected_total": {
+			"mean": sum(totals) / trials,
+			"p10": totals[int(0.1 * (trials - 1))],
+			"median": totals[(trials - 1) // 2],
+			"p90": totals[int(0.9 * (trials - 1))],
+			"bin_width": bin_width,
+			"histogram": sorted(histogram.items())}}
+
+def win_probability(runner_key, home_team, away_team, match_format, easy_bowling_on, snapshot, playouts=5000, seed=None, executor=None, chunks=8):
+	# Playouts are split into independent streams, one chunk per worker when an executor is given
+	streams = MatchRNG(seed).spawn(chunks)
+	counts = [playouts // chunks + (1 if chunk < playouts % chunks else 0) for chunk in range(chunks)]
+	jobs = [(count, stream) for (count, stream) in zip(counts, streams) if count > 0]
+	squads = (home_team, away_team, match_format, easy_bowling_on)
+	if executor is None:
+		results = [run_playouts(runner_key, squads, snapshot, count, stream) for (count, stream) in jobs]
+	else:
+		# The squads only go to workers that do not have the runner yet
+		futures = [executor.submit(run_playouts, runner_key, None, snapshot, count, stream) for (count, stream) in jobs]
+		(results, retries) = ([], [])
+		for (future, (count, stream)) in zip(futures, jobs):
+			try:
+				results.append(future.result())
+			except RunnerNotCached:
+				retries.append(executor.submit(run_playouts, runner_key, squads, snapshot, count, stream))
+		results.extend(retry.result() for retry in retries)
+	return summarize_playouts([outcome for result in results for outcome in result], snapshot.batting_team_id)
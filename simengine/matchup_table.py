@@ -0,0 +1,55 @@
+from simengine import joint_outcomes as jo
+
+# Compiled outcome distributions for every striker x bowler x fielder-band pairing of one
+# innings (a batting team against a fielding team). Fielders with the same fielding skill
+# share a band, since the skill is all the distribution depends on.
+
+def batter_signature(player):
+	return (player.batting_skill["pace"], player.batting_skill["spin"], player.batting_aggr)
+
+class MatchupTable:
+	def __init__(self, batting_team, fielding_team, easy_bowling_on, max_overs):
+		self.batting_team = batting_team
+		self.fielding_team = fielding_team
+		self.easy_bowling_on = easy_bowling_on
+		self.max_overs = max_overs
+		self.batter_slots = {player.player_id: slot for (slot, player) in enumerate(batting_team.players)}
+		self.fielder_slots = {player.player_id: slot for (slot, player) in enumerate(fielding_team.players)}
+		self.invalidate()
+
+	# Recompute everything from the players' current attributes
+	def invalidate(self):
+		self.wicketkeeper = self.fielding_team.wicketkeeper or self.fielding_team.players[0]
+		self.keeper_skill = self.wicketkeeper.fielding_skill
+		self.fielding_bands = sorted(set(player.fielding_skill for player in self.fielding_team.players))
+		self.fielder_bands = [self.fielding_bands.index(player.fielding_skill) for player in self.fielding_team.players]
+		self.batter_signatures = [batter_signature(player) for player in self.batting_team.players]
+		self.table = [[[self.compile(batter, bowler, fielding_skill) for fielding_skill in self.fielding_bands] for bowler in self.fielding_team.players] for batter in self.batting_team.players]
+
+	def compile(self, batter, bowler, fielding_skill):
+		return jo.create_joint_distribution(batter.batting_skill["pace"], batter.batting_skill["spin"], batter.batting_aggr, bowler.bowling_skill, bowler.bowler_type, self.keeper_skill, fielding_skill, self.easy_bowling_on, self.max_overs)
+
+	def invalidate_batter(self, batter_slot):
+		batter = self.batting_team.players[batter_slot]
+		self.batter_signatures[batter_slot] = batter_signature(batter)
+		self.table[batter_slot] = [[self.compile(batter, bowler, fielding_skill) for fielding_skill in self.fielding_bands] for bowler in self.fielding_team.players]
+
+	# Batting aggression moves during an innings (boost/temper aggression), so the striker's row is
+	# checked against the player's current attributes and recompiled if they have changed
+	def lookup_slots(self, striker_slot, bowler_slot, fielder_slot):
+		if self.batter_signatures[striker_slot] != batter_signature(self.batting_team.players[striker_slot]):
+			self.invalidate_batter(striker_slot)
+		return self.table[striker_slot][bowler_slot][self.fielder_bands[fielder_slot]]
+
+	def bowler_distributions(self, striker_slot, bowler_slot):
+		return [self.lookup_slots(striker_slot, bowler_slot, fielder_slot) for fielder_slot in range(len(self.fielder_bands))]
+
+	def lookup(self, striker, bowler, fielder, wicketkeeper=None):
+		if wicketkeeper is not None and wicketkeeper is not self.wicketkeeper:
+			return None
+		striker_slot = self.batter_slots.get(striker.player_id)
+		bowler_slot = self.fielder_slots.get(bowler.player_id)
+		fielder_slot = self.fielder_slots.get(fielder.player_id)
+		if striker_slot is None or bowler_slot is None or fielder_slot is None:
+			return None
+		return self.lookup_slots(striker_slot, bowler_slot, fielder_slot)
@@ -0,0 +1,56 @@
+# Integer outcome codes shared by the compiled and vectorized simulation paths.
+# The index of each name is its code, matching the event numbers in probability_helpers.
+
+NO_BALL = 0
+WIDE_BALL = 1
+FAIR_DELIVERY = 2
+GOOD_DELIVERY = 3
+DELIVERY_TYPE_NAMES = ("no_ball", "wide_ball", "fair_delivery", "good_delivery")
+
+NO_STROKE = -1
+MISS = 0
+DOT = 1
+HIT = 2
+SLOG = 3
+STROKE_TYPE_NAMES = ("miss", "dot", "hit", "slog")
+
+NOT_OUT = 0
+BOWLED = 1
+LBW = 2
+STUMPED = 3
+CAUGHT_BEHIND = 4
+CAUGHT = 5
+DISMISSAL_NAMES = (None, "bowled", "lbw", "stumped", "caught behind", "caught")
+
+NO_FIELDER = 0
+WICKETKEEPER = 1
+FIELDER = 2
+FIELDER_NAMES = (None, "wicketkeeper", "fielder")
+
+# Runs for each hit/slog event number (0, 1, 2, 3, 4, 6)
+HIT_RUNS = (0, 1, 2, 3, 4, 6)
+
+def stroke_name(stroke_code):
+	if stroke_code == NO_STROKE:
+		return ""
+	return STROKE_TYPE_NAMES[stroke_code]
+
+# Final ball outcomes of the joint distribution (no-ball covers every no-ball, whatever was scored off it)
+OUTCOME_DOT = 0
+OUTCOME_ONE = 1
+OUTCOME_TWO = 2
+OUTCOME_THREE = 3
+OUTCOME_FOUR = 4
+OUTCOME_SIX = 5
+OUTCOME_WIDE = 6
+OUTCOME_NO_BALL = 7
+OUTCOME_BOWLED = 8
+OUTCOME_LBW = 9
+OUTCOME_STUMPED = 10
+OUTCOME_CAUGHT_BEHIND = 11
+OUTCOME_CAUGHT = 12
+OUTCOME_DROPPED = 13
+OUTCOME_NAMES = ("dot", "one", "two", "three", "four", "six", "wide", "no_ball", "bowled", "lbw", "stumped", "caught_behind", "caught", "dropped")
+
+RUNS_OUTCOMES = {0: OUTCOME_DOT, 1: OUTCOME_ONE, 2: OUTCOME_TWO, 3: OUTCOME_THREE, 4: OUTCOME_FOUR, 6: OUTCOME_SIX}
+DISMISSAL_OUTCOMES = {"bowled": OUTCOME_BOWLED, "lbw": OUTCOME_LBW, "stumped": OUTCOME_STUMPED, "caught behind": OUTCOME_CAUGHT_BEHIND, "caught": OUTCOME_CAUGHT}
@@ -1,28 +1,62 @@
-import random
 from simengine.batting_score import BattingScore
 from simengine.bowling_figures import BowlingFigures
+from simengine.rng import resolve_rng
 
-def pick_fielder(fielding_team):
-	return fielding_team.players[int(random.random() * 11)]
+def pick_fielder(fielding_team, rng=None):
+	return fielding_team.players[int(resolve_rng(rng).random() * 11)]
 
+class BattingSkill:
+	# Batting skill against pace and spin, read and written as batting_skill["pace"] and batting_skill["spin"]
+	__slots__ = ("pace", "spin")
+	def __init__(self, pace, spin):
+		self.pace = pace
+		self.spin = spin
+
+	@property
+	def avg(self):
+		return (self.pace + self.spin)/2
+
+	def __getitem__(self, key):
+		if key not in ("pace", "spin", "avg"):
+			raise KeyError(key)
+		return getattr(self, key)
+
+	def __setitem__(self, key, value):
+		if key not in ("pace", "spin"):
+			raise KeyError(key)
+		setattr(self, key, value)
+
+	def __repr__(self):
+		return "BattingSkill(pace=%r, spin=%r)" % (self.pace, self.spin)
+
+# EFFECTIVE ATTRIBUTES
+
+# A match plays with effective attributes: the base attributes a player is loaded with, which are
+# never written, adjusted for the ground (aggression, spin, pace multipliers) and a home boost.
+# A base team works them out once per set of adjustments and keeps them (TeamObject.adjusted), and
+# every match gets its own view players built from them, so one base team serves any number of matches.
+
+HOME_BOOST = 1.01
+
+def effective_attributes(player, multipliers=None, boosted=False):
+	# (batting vs pace, batting vs spin, aggression, bowling, fielding), rounded as the adjustments always were:
+	# the ground multipliers first, then the boost
+	(pace, spin, aggr, bowling, fielding) = (player.batting_skill["pace"], player.batting_skill["spin"], player.batting_aggr, player.bowling_skill, player.fielding_skill)
+	if multipliers is not None:
+		aggr = min(100,round(aggr * multipliers[0]))
+		bowling = min(100,round(bowling * (multipliers[1] if player.is_spinner() else multipliers[2])))
+	if boosted:
+		(pace, spin, aggr, bowling, fielding) = (min(100,round(value * HOME_BOOST)) for value in (pace, spin, aggr, bowling, fielding))
+	return (pace, spin, aggr, bowling, fielding)
+
+# Simulation objects are slotted: no per-instance __dict__, so thousands of live match states stay small
 class PlayerObject:
-	player_id = 0
-	name = ""
-	last_name = ""
-	batting_skill = {"pace": 0.0, "spin": 0.0, "avg": 0.0}
-	batting_aggr = 0.0
-	bowling_skill = 0.0
-	bowler_type = ""
-	fielding_skill = 0.0
-	is_wicketkeeper = False
-	is_captain = False
-	batting_score = None
-	bowling_figures = None
+	__slots__ = ("player_id", "name", "last_name", "batting_skill", "batting_aggr", "bowling_skill", "bowler_type", "fielding_skill", "is_wicketkeeper", "is_captain", "batting_score", "bowling_figures", "base")
 	def __init__(self, player_id, name, batting_skill_pace, batting_skill_spin, batting_aggr, bowling_skill, fielding_skill, is_wicketkeeper, is_captain, bowler_type):
 		self.player_id = player_id
 		self.name = name
 		self.last_name = name.split()[-1]
-		self.batting_skill = {"pace": batting_skill_pace, "spin": batting_skill_spin, "avg": (batting_skill_pace + batting_skill_spin)/2}
+		self.batting_skill = BattingSkill(batting_skill_pace, batting_skill_spin)
 		self.batting_aggr = batting_aggr
 		self.bowling_skill = bowling_skill
 		self.fielding_skill = fielding_skill
@@ -31,6 +65,13 @@ class PlayerObject:
 		self.bowler_type = bowler_type
 		self.batting_score = BattingScore(name)
 		self.bowling_figures = BowlingFigures(name)
+		# The base player this one is a view of (see TeamObject.adjusted), None for a base player
+		self.base = None
+
+	def view(self, attributes):
+		player = PlayerObject(self.player_id, self.name, *attributes, self.is_wicketkeeper, self.is_captain, self.bowler_type)
+		player.base = self.base or self
+		return player
 
 	def reset(self):
 		self.batting_score = BattingScore(self.name)
@@ -43,16 +84,7 @@ class PlayerObject:
 		return self.bowler_type == "pace"
 
 class TeamObject:
-	team_id = ""
-	name = ""
-	short_name = ""
-	is_ai_team = False
-	players = []
-	players_map = {}
-	final_batting_order = []
-	wicketkeeper = None
-	captain = None
-	is_winner = False
+	__slots__ = ("team_id", "name", "short_name", "is_ai_team", "players", "player_slots", "final_batting_order", "wicketkeeper", "captain", "is_winner", "base", "multipliers", "boosted", "effective_cache")
 
 	def __init__(self, team_id, team_name, short_name, is_ai_team, players_list):
 		self.team_id = team_id
@@ -60,14 +92,42 @@ class TeamObject:
 		self.short_name = short_name
 		self.is_ai_team = is_ai_team
 		self.players = players_list
+		# Roster index: player id -> slot in players, built per team so nothing outlives the match
+		self.player_slots = {player.player_id: slot for (slot, player) in enumerate(players_list)}
 		self.is_winner = False
 		self.final_batting_order = []
+		self.wicketkeeper = None
+		self.captain = None
 		for player in players_list:
-			self.players_map[player.player_id] = player
 			if player.is_wicketkeeper:
 				self.wicketkeeper = player
 			if player.is_captain:
 				self.captain = player
+		# Adjustments of a view (see adjusted); a base team has none and caches its views' attributes
+		self.base = None
+		self.multipliers = None
+		self.boosted = False
+		self.effective_cache = {}
+
+	def adjusted(self, multipliers=None, boosted=None):
+		# A view of the base team for one match, with effective attributes for the ground multipliers
+		# and home boost (this team's own when not given); neither this team nor the base change
+		base = self.base or self
+		multipliers = self.multipliers if multipliers is None else tuple(multipliers)
+		boosted = self.boosted if boosted is None else boosted
+		key = (multipliers, boosted)
+		if key not in base.effective_cache:
+			base.effective_cache[key] = [effective_attributes(player, multipliers, boosted) for player in base.players]
+		team = TeamObject(base.team_id, base.name, base.short_name, base.is_ai_team, [player.view(attributes) for (player, attributes) in zip(base.players, base.effective_cache[key])])
+		(team.base, team.multipliers, team.boosted) = (base, multipliers, boosted)
+		return team
+
+	def slot_of(self, player_id):
+		return self.player_slots.get(player_id)
+
+	def get_player(self, player_id):
+		slot = self.player_slots.get(player_id)
+		return self.players[slot] if slot is not None else None
 
 	def reset(self):
 		self.is_winner = False
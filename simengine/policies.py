@@ -0,0 +1,27 @@
+# Captaincy for headless matches: the toss decision, batting order and bowler changes. The
+# defaults mirror the AI choices in Game.toss; callers can pass any objects with the same methods.
+
+class AutoTossPolicy:
+	def choose_to_bat(self, game, toss_winner):
+		if toss_winner is game.home_team:
+			(better_bowling, better_batting) = (game.home_has_better_bowling(), game.home_has_better_batting())
+		else:
+			(better_bowling, better_batting) = (game.away_has_better_bowling(), game.away_has_better_batting())
+		return better_batting and not better_bowling
+
+class ListedBattingOrder:
+	def batting_order(self, team):
+		return list(team.players)
+
+class BestAvailableBowler:
+	# Eligible bowlers already respect the quota and the no-consecutive-overs rule
+	def choose_bowler(self, innings, eligible_bowlers):
+		return max(eligible_bowlers, key=lambda player: player.bowling_skill)
+
+
+def eligible_bowlers(innings, is_first_over):
+	eligible = innings.get_eligible_bowlers_first_over() if is_first_over else innings.get_eligible_bowlers()
+	if not eligible:
+		# Quotas exhausted for everyone but the last bowler: anyone else may bowl
+		eligible = [player for player in innings.fielding_team.players if player is not innings.current_bowler and not player.is_wicketkeeper]
+	return eligible
@@ -1,5 +1,48 @@
-import random
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+from types import MappingProxyType
 from . import base_event_matrices as bem
+from . import formats as fmt
+from .outcomes import DELIVERY_TYPE_NAMES, STROKE_TYPE_NAMES, HIT_RUNS
+from .rng import resolve_rng
+
+EVENT_MATRIX_CACHE_SIZE = 4096
+
+class EventMatrixCache:
+	def __init__(self, maxsize=EVENT_MATRIX_CACHE_SIZE):
+		self.maxsize = maxsize
+		self.entries = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get(self, key, builder):
+		entry = self.entries.get(key)
+		if entry is not None:
+			self.hits += 1
+			self.entries.move_to_end(key)
+			return entry
+		self.misses += 1
+		entry = builder()
+		self.entries[key] = entry
+		if len(self.entries) > self.maxsize:
+			self.entries.popitem(last=False)
+			self.evictions += 1
+		return entry
+
+	def clear(self):
+		self.entries.clear()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def info(self):
+		return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self.entries), "maxsize": self.maxsize}
+
+_event_matrix_cache = EventMatrixCache()
+_compiled_matrix_cache = EventMatrixCache()
 
 def batting_skill_vs_bowler(batting_vs_pace, batting_vs_spin, bowling_type):
 	if bowling_type == "spin":
@@ -16,6 +59,13 @@ def flatten_probs(probability_list):
 		new_probability_list.append(num/total)
 	return new_probability_list
 
+# Same as flatten_probs, but normalizes the list in place so the adjust stage does not allocate
+def flatten_probs_in_place(probability_list):
+	total = sum(probability_list)
+	for i in range(len(probability_list)):
+		probability_list[i] = probability_list[i]/total
+	return probability_list
+
 def adjust_bowl_probs(bowl_probabilities, easy_bowling_on, bowling_skill):
 	original_bowling_skill = bowling_skill
 	if (easy_bowling_on):
@@ -27,7 +77,7 @@ def adjust_bowl_probs(bowl_probabilities, easy_bowling_on, bowling_skill):
 		bowl_probabilities[3] = bowl_probabilities[3] * ((bowling_skill / 2.0) / 70.0)
 	if (easy_bowling_on):
 		bowling_skill = original_bowling_skill
-	return flatten_probs(bowl_probabilities)
+	return flatten_probs_in_place(bowl_probabilities)
 
 def adjust_stroke_probs(stroke_probabilities, batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type):
 	batting_skill = batting_skill_vs_bowler(batting_vs_pace, batting_vs_spin, bowling_type)
@@ -70,7 +120,7 @@ def adjust_stroke_probs(stroke_probabilities, batting_vs_pace, batting_vs_spin,
 	else:
 		stroke_probabilities[3] = stroke_probabilities[3] + 0.5 + ((batting_aggression - 90.0) / 1.5)
 
-	return flatten_probs(stroke_probabilities)
+	return flatten_probs_in_place(stroke_probabilities)
 
 def adjust_miss_probs(miss_probabilities, easy_bowling_on, bowling_skill, wicketkeeper_fielding_skill):
 	original_bowling_skill = bowling_skill
@@ -98,7 +148,7 @@ def adjust_miss_probs(miss_probabilities, easy_bowling_on, bowling_skill, wicket
 
 	if (easy_bowling_on):
 		bowling_skill = original_bowling_skill
-	return flatten_probs(miss_probabilities)
+	return flatten_probs_in_place(miss_probabilities)
 
 def batting_skill_with_mult(batting_skill, easy_bowling_on):
 	batting_mult = 1.0	
@@ -135,7 +185,7 @@ def adjust_hit_probs(hit_probabilities, easy_bowling_on, batting_vs_pace, battin
 	hit_probabilities[4] = hit_probabilities[4] * (50 + (100 - fielding_skill))
 	hit_probabilities[5] = hit_probabilities[5] * (50 + (100 - fielding_skill))
 
-	return flatten_probs(hit_probabilities)
+	return flatten_probs_in_place(hit_probabilities)
 
 def adjust_slog_probs(slog_probabilities, easy_bowling_on, batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, fielding_skill):
 	batting_skill = batting_skill_vs_bowler(batting_vs_pace, batting_vs_spin, bowling_type)
@@ -161,7 +211,7 @@ def adjust_slog_probs(slog_probabilities, easy_bowling_on, batting_vs_pace, batt
 	slog_probabilities[4] = slog_probabilities[4] * (50 + (100 - fielding_skill))
 	slog_probabilities[5] = slog_probabilities[5] * (50 + (100 - fielding_skill))
 
-	return flatten_probs(slog_probabilities)
+	return flatten_probs_in_place(slog_probabilities)
 
 def adjust_caught_probs(caught_out_probabilities, batting_vs_pace, batting_vs_spin, bowling_skill, bowling_type, fielding_skill):
 	batting_skill = batting_skill_vs_bowler(batting_vs_pace, batting_vs_spin, bowling_type)
@@ -186,14 +236,81 @@ def adjust_matrix(probability_matrix, batting_vs_pace, batting_vs_spin, batting_
 
 	return probability_matrix
 
-def create_event_matrix(batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, easy_bowling_on, max_overs):
-	probability_matrix = bem.base_event_matrix_t20(easy_bowling_on)
-	if (max_overs == 50):
-		probability_matrix = bem.base_event_matrix_odi(easy_bowling_on)
-	elif (max_overs > 50):
-		probability_matrix = bem.base_event_matrix_test(easy_bowling_on)
+def get_matrix_format(max_overs):
+	return fmt.matrix_format_for_overs(max_overs)
+
+# Preallocated per-format working lists, one set per thread; a cache miss copies the base matrix in and
+# adjusts it in place. Only frozen copies ever leave this module
+_matrix_buffers = threading.local()
+
+def _adjusted_matrix_buffer(matrix_format, batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, easy_bowling_on, base_matrix):
+	if base_matrix is None:
+		base_matrix = bem.get_base_event_matrix(matrix_format)
+	buffers = getattr(_matrix_buffers, "formats", None)
+	if buffers is None:
+		buffers = _matrix_buffers.formats = {}
+	if matrix_format not in buffers:
+		buffers[matrix_format] = {name: list(values) for (name, values) in bem.BASE_EVENT_MATRICES[matrix_format].items()}
+	probability_matrix = buffers[matrix_format]
+	for name in bem.BASE_MATRIX_NAMES:
+		probability_matrix[name][:] = base_matrix[name]
+	probability_matrix["easy_bowling_on"] = easy_bowling_on
 	return adjust_matrix(probability_matrix, batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill)
 
+# base_matrix overrides the registered matrix for the format (calibration tries candidate matrices this way)
+def build_event_matrix(matrix_format, batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, easy_bowling_on, base_matrix=None):
+	return freeze_event_matrix(_adjusted_matrix_buffer(matrix_format, batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, easy_bowling_on, base_matrix))
+
+def freeze_event_matrix(probability_matrix):
+	frozen_matrix = {}
+	for name, value in probability_matrix.items():
+		frozen_matrix[name] = tuple(value) if isinstance(value, list) else value
+	return MappingProxyType(frozen_matrix)
+
+# Matrices are shared between callers, so they are returned as read-only mappings of tuples
+def create_event_matrix(batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, easy_bowling_on, max_overs):
+	matrix_format = get_matrix_format(max_overs)
+	key = (matrix_format, easy_bowling_on, batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill)
+	return _event_matrix_cache.get(key, lambda: build_event_matrix(matrix_format, batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, easy_bowling_on))
+
+def event_matrix_cache_info():
+	return _event_matrix_cache.info()
+
+def clear_event_matrix_cache():
+	_event_matrix_cache.clear()
+	_compiled_matrix_cache.clear()
+
+
+# COMPILED SAMPLERS
+
+class EventSampler:
+	# Running totals are accumulated in the same order as get_event_number, so a seed maps to the same event.
+	# The running maximum keeps the totals sorted when an adjusted probability goes negative.
+	def __init__(self, probability_list):
+		self.cumulative = tuple(accumulate(accumulate(probability_list), max))
+		self.size = len(self.cumulative)
+
+	def sample(self, seed):
+		event = bisect_right(self.cumulative, seed)
+		return event if event < self.size else -1
+
+class CompiledEventMatrix:
+	def __init__(self, event_matrix):
+		self.event_matrix = event_matrix
+		self.bowl = EventSampler(event_matrix["bowl_probabilities"])
+		self.stroke = EventSampler(event_matrix["stroke_probabilities"])
+		self.miss = EventSampler(event_matrix["miss_probabilities"])
+		self.hit = EventSampler(event_matrix["hit_probabilities"])
+		self.slog = EventSampler(event_matrix["slog_probabilities"])
+		(self.hit_caught, self.slog_caught) = event_matrix["caught_out_probabilities"]
+
+def create_compiled_event_matrix(batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, easy_bowling_on, max_overs):
+	key = (get_matrix_format(max_overs), easy_bowling_on, batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill)
+	return _compiled_matrix_cache.get(key, lambda: CompiledEventMatrix(create_event_matrix(batting_vs_pace, batting_vs_spin, batting_aggression, bowling_skill, bowling_type, wicketkeeper_fielding_skill, fielding_skill, easy_bowling_on, max_overs)))
+
+def compiled_event_matrix_cache_info():
+	return _compiled_matrix_cache.info()
+
 
 def get_event_number(seed, probability_list):
 	running_total = 0
@@ -206,41 +323,17 @@ def get_event_number(seed, probability_list):
 
 def get_delivery_type(seed, bowl_probabilities):
 	event = get_event_number(seed, bowl_probabilities)
-	if event == 0:
-		delivery = "no_ball"
-	elif event == 1:
-		delivery = "wide_ball"
-	elif event == 2:
-		delivery = "fair_delivery"
-	elif event == 3:
-		delivery = "good_delivery"
-	return (event, delivery)
+	return (event, DELIVERY_TYPE_NAMES[event])
 	
 def get_stroke_type(seed, stroke_probabilities):
 	event = get_event_number(seed, stroke_probabilities)
-	if event == 0:
-		stroke = "miss"
-	elif event == 1:
-		stroke = "dot"
-	elif event == 2:
-		stroke = "hit"
-	elif event == 3:
-		stroke = "slog"
-	# print(stroke)
-	return (event, stroke)
+	return (event, STROKE_TYPE_NAMES[event])
+
+MISS_RESULT_NAMES = ("bowled", "lbw", "stumped", "dot")
 
 def get_miss_result(seed, miss_probabilities):
 	event = get_event_number(seed, miss_probabilities)
-	if event == 0:
-		result = "bowled"
-	elif event == 1:
-		result = "lbw"
-	elif event == 2:
-		result = "stumped"
-	elif event == 3:
-		result = "dot"
-	# print(event)
-	return (event, result)
+	return (event, MISS_RESULT_NAMES[event])
 
 def get_caught_or_not(seed, caught_out_probabilities, hit_or_slog):
 	# event = get_event_number(seed, caught_out_probabilities)
@@ -258,35 +351,17 @@ def get_caught_or_not(seed, caught_out_probabilities, hit_or_slog):
 			return (0, "dropped")
 	return (0, "dot")
 
-def get_hit_result(seed, hit_probabilities, caught_out_probabilities):
-	event = get_event_number(seed, hit_probabilities)
+HIT_RESULT_NAMES = ("dot", "one", "two", "three", "four", "six")
+
+def get_field_result(event, caught_out_probabilities, hit_or_slog, rng=None):
 	if event == 0:
-		return get_caught_or_not(random.random(), caught_out_probabilities, "hit")
-	elif event == 1:
-		return (1, "one")
-	elif event == 2:
-		return (2, "two")
-	elif event == 3:
-		return (3, "three")
-	elif event == 4:
-		return (4, "four")
-	elif event == 5:
-		return (6, "six")
+		return get_caught_or_not(resolve_rng(rng).random(), caught_out_probabilities, hit_or_slog)
+	elif event > 0:
+		return (HIT_RUNS[event], HIT_RESULT_NAMES[event])
 	return (-1, "error")
 
+def get_hit_result(seed, hit_probabilities, caught_out_probabilities, rng=None):
+	return get_field_result(get_event_number(seed, hit_probabilities), caught_out_probabilities, "hit", rng)
 
-def get_slog_result(seed, slog_probabilities, caught_out_probabilities):
-	event = get_event_number(seed, slog_probabilities)
-	if event == 0:
-		return get_caught_or_not(random.random(), caught_out_probabilities, "slog")
-	elif event == 1:
-		return (1, "one")
-	elif event == 2:
-		return (2, "two")
-	elif event == 3:
-		return (3, "three")
-	elif event == 4:
-		return (4, "four")
-	elif event == 5:
-		return (6, "six")
-	return (-1, "error")
\ No newline at end of file
+def get_slog_result(seed, slog_probabilities, caught_out_probabilities, rng=None):
+	return get_field_result(get_event_number(seed, slog_probabilities), caught_out_probabilities, "slog", rng)
@@ -0,0 +1,196 @@
+import json
+
+# Deterministic replay of a live match from its seed and a short log of the captains' decisions.
+#
+# Every random draw of a match comes from its MatchRNG, so the seed plus the choices made between
+# draws fix the whole ball-by-ball record. The log only notes choices that cannot be inferred:
+# who bats and bowls when that differs from what the previous ball implies (openers, incoming
+# batsmen, a new bowler each over), the toss call and decision, and super overs. Runs of
+# deliveries with nothing new are stored as a count. Entries are short lists, kept as JSON:
+#
+#   ["toss", calling_team_id, call]          the toss draw ("heads" or "tails" called)
+#   ["toss_decision", decision]              "bat" or "bowl"
+#   ["innings", innings_no]                  later deliveries belong to this innings
+#   ["crease", striker_id, non_striker_id]   batters other than the previous ball implies
+#   ["bowler", bowler_id]
+#   ["keeper", wicketkeeper_id]
+#   ["fielder", fielder_id]                  the next delivery only: a fielder chosen by the client instead of drawn
+#   ["deliveries", count]                    count deliveries with none of the above
+#   ["super_over", max_super_overs, seed]
+#
+# Replaying feeds the same decisions to a fresh engine built with the same seed, so it makes the
+# same draws in the same order; it needs the squads as they were when the match was played.
+
+def next_crease(striker_id, non_striker_id, delivery_result, legal_balls, balls_per_over):
+	# Where the batters stand for the next ball by the usual rules; legal_balls includes this delivery.
+	# After a wicket the incoming batsman is a decision, so the striker is unknown
+	if delivery_result.is_wicket:
+		striker_id = None
+	elif delivery_result.runs_scored % 2:
+		(striker_id, non_striker_id) = (non_striker_id, striker_id)
+	if delivery_result.extras == 0 and legal_balls % balls_per_over == 0:
+		(striker_id, non_striker_id) = (non_striker_id, striker_id)
+	return (striker_id, non_striker_id)
+
+class DecisionLog:
+	def __init__(self, balls_per_over, entries=None):
+		self.entries = [list(entry) for entry in entries or []]
+		self.balls_per_over = balls_per_over
+		# What the next delivery looks like if nobody decides anything
+		self.innings_no = None
+		self.striker_id = None
+		self.non_striker_id = None
+		self.bowler_id = None
+		self.wicketkeeper_id = None
+		self.legal_balls = 0
+
+	def record(self, *entry):
+		self.entries.append(list(entry))
+
+	def record_delivery(self, innings_no, striker_id, non_striker_id, bowler_id, wicketkeeper_id=None, fielder_id=None):
+		# Called with the inputs of each delivery, before it is simulated
+		if innings_no != self.innings_no:
+			self.record("innings", innings_no)
+			(self.innings_no, self.legal_balls) = (innings_no, 0)
+		if (striker_id, non_striker_id) != (self.striker_id, self.non_striker_id):
+			self.record("crease", striker_id, non_striker_id)
+		if bowler_id != self.bowler_id:
+			self.record("bowler", bowler_id)
+		if wicketkeeper_id != self.wicketkeeper_id:
+			self.record("keeper", wicketkeeper_id)
+		if fielder_id is not None:
+			self.record("fielder", fielder_id)
+		(self.striker_id, self.non_striker_id, self.bowler_id, self.wicketkeeper_id) = (striker_id, non_striker_id, bowler_id, wicketkeeper_id)
+		if self.entries[-1][0] == "deliveries":
+			self.entries[-1][1] += 1
+		else:
+			self.record("deliveries", 1)
+
+	def record_outcome(self, delivery_result):
+		# Called after each delivery is simulated
+		self.legal_balls += delivery_result.extras == 0
+		(self.striker_id, self.non_striker_id) = next_crease(self.striker_id, self.non_striker_id, delivery_result, self.legal_balls, self.balls_per_over)
+
+	def delivery_count(self):
+		return sum(entry[1] for entry in self.entries if entry[0] == "deliveries")
+
+	def to_json(self):
+		return json.dumps(self.entries, separators=(",", ":"))
+
+	@classmethod
+	def from_json(cls, text, balls_per_over):
+		return cls(balls_per_over, json.loads(text) if text else [])
+
+
+class ReplayState:
+	# Running state of a replay: the score and the current innings' batting and bowling counts, never the deliveries
+	def __init__(self):
+		self.innings_no = None
+		self.deliveries = 0
+		self.innings_deliveries = 0
+		self.total_runs = 0
+		self.wickets = 0
+		self.legal_balls = 0
+		self.batters = {}
+		self.bowlers = {}
+		self.last_delivery = None
+
+	def start_innings(self, innings_no):
+		self.innings_no = innings_no
+		self.innings_deliveries = 0
+		self.total_runs = 0
+		self.wickets = 0
+		self.legal_balls = 0
+		self.batters = {}
+		self.bowlers = {}
+
+	def add(self, record):
+		self.deliveries += 1
+		self.innings_deliveries += 1
+		self.total_runs = record["total_runs_after"]
+		self.wickets = record["wickets_after"]
+		self.legal_balls += record["extras"] == 0
+		# [runs, balls faced, out] and [legal balls, runs conceded, wickets], as the live routes count them
+		batter = self.batters.setdefault(record["striker_id"], [0, 0, False])
+		bowler = self.bowlers.setdefault(record["bowler_id"], [0, 0, 0])
+		if record["extras"] == 0:
+			batter[1] += 1
+			bowler[0] += 1
+		if record["is_wicket"]:
+			batter[2] = True
+			bowler[2] += 1
+		else:
+			batter[0] += record["runs_scored"]
+		bowler[1] += record["runs_scored"] + record["extras"]
+		self.last_delivery = record
+
+	def to_dict(self):
+		return {
+			"innings_number": self.innings_no,
+			"deliveries": self.deliveries,
+			"total_runs": self.total_runs,
+			"wickets_lost": self.wickets,
+			"legal_balls": self.legal_balls,
+			"batting": {player_id: {"runs": runs, "balls_faced": balls, "is_out": out} for (player_id, (runs, balls, out)) in self.batters.items()},
+			"bowling": {player_id: {"balls_bowled": balls, "runs_conceded": runs, "wickets": wickets} for (player_id, (balls, runs, wickets)) in self.bowlers.items()},
+			"last_delivery": self.last_delivery}
+
+def replay_deliveries(engine, entries, state=None):
+	# Feeds the logged decisions to engine, a fresh CricketGameEngine built with the match's seed,
+	# and yields one record per delivery, with the fields of a Delivery row
+	state = state if state is not None else ReplayState()
+	balls_per_over = engine.match_format.balls_per_over
+	(striker_id, non_striker_id, bowler_id, wicketkeeper_id, fielder_id) = (None, None, None, None, None)
+	for entry in entries:
+		kind = entry[0]
+		if kind == "toss":
+			engine.toss(entry[1], entry[2])
+		elif kind == "toss_decision":
+			engine.record_toss_decision(entry[1])
+		elif kind == "innings":
+			state.start_innings(entry[1])
+		elif kind == "crease":
+			(striker_id, non_striker_id) = (entry[1], entry[2])
+		elif kind == "bowler":
+			bowler_id = entry[1]
+		elif kind == "keeper":
+			wicketkeeper_id = entry[1]
+		elif kind == "fielder":
+			fielder_id = entry[1]
+		elif kind == "deliveries":
+			for _ in range(entry[1]):
+				# Over and ball numbers as the simulate-delivery route numbers them
+				(current_over, ball_in_over) = (state.innings_deliveries // balls_per_over + 1, state.innings_deliveries % balls_per_over + 1)
+				delivery_result = engine.simulate_delivery(bowler_id, striker_id, non_striker_id, fielder_id, wicketkeeper_id, current_over, ball_in_over, state.innings_no)
+				record = {
+					"innings_number": state.innings_no,
+					"over_number": current_over,
+					"ball_number": ball_in_over,
+					"bowler_id": bowler_id,
+					"striker_id": striker_id,
+					"non_striker_id": non_striker_id,
+					"delivery_type": delivery_result.delivery_type,
+					"stroke_type": delivery_result.stroke_type,
+					"runs_scored": delivery_result.runs_scored,
+					"extras": delivery_result.extras,
+					"is_wicket": delivery_result.is_wicket,
+					"dismissal_type": delivery_result.dismissal_type,
+					"fielder_involved": delivery_result.fielder_involved,
+					"total_runs_after": state.total_runs + delivery_result.runs_scored + delivery_result.extras,
+					"wickets_after": state.wickets + (1 if delivery_result.is_wicket else 0)}
+				state.add(record)
+				yield record
+				fielder_id = None
+				(striker_id, non_striker_id) = next_crease(striker_id, non_striker_id, delivery_result, state.legal_balls, balls_per_over)
+		elif kind == "super_over":
+			engine.play_super_overs(entry[2], entry[1])
+
+def rewind(engine, entries, ball):
+	# State just after delivery number ball (counted from 1 over the whole match), holding nothing per ball
+	state = ReplayState()
+	if ball <= 0:
+		return state
+	for _ in replay_deliveries(engine, entries, state):
+		if state.deliveries >= ball:
+			break
+	return state
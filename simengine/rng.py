@@ -0,0 +1,58 @@
+import random
+import numpy as np
+
+# Random streams for the simulation. A MatchRNG owns a NumPy SeedSequence, so a match (or a
+# worker) can spawn independent child streams, and every draw is reproducible from the seed.
+# Scalar draws go through a seeded random.Random because it is much cheaper per call than
+# Generator.random(); bulk draws use the NumPy Generator.
+
+class MatchRNG:
+	def __init__(self, seed=None, seed_sequence=None):
+		if seed_sequence is None:
+			seed_sequence = np.random.SeedSequence(seed)
+		self.seed_sequence = seed_sequence
+		self.seed = seed_sequence.entropy
+		self.generator = np.random.default_rng(seed_sequence)
+		self.python_random = random.Random(int(seed_sequence.generate_state(1, np.uint64)[0]))
+		self.random = self.python_random.random
+
+	def normal(self, mean, standard_deviation):
+		return float(self.generator.normal(mean, standard_deviation))
+
+	def spawn(self, count):
+		return [MatchRNG(seed_sequence=child) for child in self.seed_sequence.spawn(count)]
+
+	def child(self, index):
+		# The stream spawn(count)[index] gives on a fresh MatchRNG, built without the other count - 1;
+		# long runs use this to stay in constant memory
+		return MatchRNG(seed_sequence=np.random.SeedSequence(self.seed_sequence.entropy, spawn_key=self.seed_sequence.spawn_key + (index,), pool_size=self.seed_sequence.pool_size))
+
+	def __getstate__(self):
+		return {"seed_sequence": self.seed_sequence, "generator": self.generator, "python_random": self.python_random}
+
+	def __setstate__(self, state):
+		self.seed_sequence = state["seed_sequence"]
+		self.seed = self.seed_sequence.entropy
+		self.generator = state["generator"]
+		self.python_random = state["python_random"]
+		self.random = self.python_random.random
+
+# Falls back to the global random and np.random state, for callers that do not pass a stream
+class GlobalRNG:
+	seed = None
+	generator = np.random
+	random = staticmethod(random.random)
+
+	def normal(self, mean, standard_deviation):
+		return np.random.normal(mean, standard_deviation)
+
+	def spawn(self, count):
+		return [MatchRNG() for _ in range(count)]
+
+GLOBAL_RNG = GlobalRNG()
+
+def resolve_rng(rng):
+	return GLOBAL_RNG if rng is None else rng
+
+def spawn_match_rngs(seed, count):
+	return MatchRNG(seed).spawn(count)
@@ -0,0 +1,116 @@
+import numpy as np
+
+from simengine import outcomes as oc
+
+# Innings scorecards as NumPy structured arrays, one row per player slot (the player's index in
+# team.players). A ball is applied by its outcome code: each code has a row of increments for the
+# striker and one for the bowler, so any number of innings are tallied at once: a count of
+# (innings, slot, code) triples times the table of increments.
+# The counts follow BattingScore and BowlingFigures: a no-ball is its own code, followed by the
+# runs scored off it, and wickets count as dot balls.
+#
+# Every field is an int32, so counts() views a scorecard as a plain (players, fields) matrix
+# without copying, and a stack of scorecards sums with a single np.add.reduce.
+
+BATTING_DTYPE = np.dtype([("runs", np.int32), ("balls_faced", np.int32), ("dots", np.int32), ("fours", np.int32), ("sixes", np.int32), ("outs", np.int32)])
+BOWLING_DTYPE = np.dtype([("balls_bowled", np.int32), ("dot_balls", np.int32), ("runs_conceded", np.int32), ("wickets", np.int32), ("wides", np.int32), ("no_balls", np.int32)])
+
+def _deltas(dtype, rows):
+	deltas = np.zeros((len(oc.OUTCOME_NAMES), len(dtype.names)), dtype=np.int32)
+	for (code, increments) in rows.items():
+		for (field, value) in increments.items():
+			deltas[code, dtype.names.index(field)] = value
+	return deltas
+
+_RUNS = {oc.OUTCOME_ONE: 1, oc.OUTCOME_TWO: 2, oc.OUTCOME_THREE: 3, oc.OUTCOME_FOUR: 4, oc.OUTCOME_SIX: 6}
+_DISMISSALS = (oc.OUTCOME_BOWLED, oc.OUTCOME_LBW, oc.OUTCOME_STUMPED, oc.OUTCOME_CAUGHT_BEHIND, oc.OUTCOME_CAUGHT)
+
+# Increments by outcome code; OUTCOME_DROPPED is never recorded, a dropped catch counts as the runs taken
+BATTING_DELTAS = _deltas(BATTING_DTYPE, {
+	oc.OUTCOME_DOT: {"balls_faced": 1, "dots": 1},
+	**{code: {"runs": runs, "balls_faced": 1, "fours": runs == 4, "sixes": runs == 6} for (code, runs) in _RUNS.items()},
+	**{code: {"balls_faced": 1, "dots": 1, "outs": 1} for code in _DISMISSALS}})
+BOWLING_DELTAS = _deltas(BOWLING_DTYPE, {
+	oc.OUTCOME_DOT: {"balls_bowled": 1, "dot_balls": 1},
+	**{code: {"balls_bowled": 1, "runs_conceded": runs} for (code, runs) in _RUNS.items()},
+	oc.OUTCOME_WIDE: {"runs_conceded": 1, "wides": 1},
+	oc.OUTCOME_NO_BALL: {"balls_bowled": -1, "runs_conceded": 1, "no_balls": 1},
+	**{code: {"balls_bowled": 1, "dot_balls": 1, "wickets": 1} for code in _DISMISSALS}})
+
+def outcome_codes(delivery_result):
+	# The codes a DeliveryResult is recorded as: one, or a no-ball followed by the runs off it
+	if delivery_result.delivery_type == "wide_ball":
+		return (oc.OUTCOME_WIDE,)
+	code = oc.DISMISSAL_OUTCOMES[delivery_result.dismissal_type] if delivery_result.is_wicket else oc.RUNS_OUTCOMES[delivery_result.runs_scored]
+	if delivery_result.delivery_type == "no_ball":
+		return (oc.OUTCOME_NO_BALL, code)
+	return (code,)
+
+# Balls are logged as one int each: striker slot, bowler slot and outcome code, a byte apiece
+def pack_ball(striker_slot, bowler_slot, code):
+	return (striker_slot << 16) | (bowler_slot << 8) | code
+
+def unpack_balls(packed):
+	packed = np.asarray(packed, dtype=np.int32)
+	return (packed >> 16, (packed >> 8) & 0xFF, packed & 0xFF)
+
+def counts(scorecard_array):
+	# The same memory as a plain int32 matrix, fields last
+	return scorecard_array.view(np.int32).reshape(scorecard_array.shape + (-1,))
+
+def batted(batting):
+	# Players who came in: faced a ball or were out
+	return (batting["balls_faced"] > 0) | (batting["outs"] > 0)
+
+def _tally(innings, slots, codes, innings_count, size, deltas, dtype):
+	# Count each (innings, slot, code), then one product with the increments per code
+	code_count = len(oc.OUTCOME_NAMES)
+	histogram = np.bincount((innings * size + slots) * code_count + codes, minlength=innings_count * size * code_count)
+	scorecards = np.zeros((innings_count, size), dtype=dtype)
+	counts(scorecards)[:] = (histogram.reshape(-1, code_count) @ deltas).reshape(innings_count, size, -1)
+	return scorecards
+
+def _unpack_logs(ball_logs):
+	# Ball logs are array("i") (InningsState.ball_log), read through the buffer without copying each ball
+	lengths = np.fromiter(map(len, ball_logs), dtype=np.int64, count=len(ball_logs))
+	packed = np.concatenate([np.asarray(ball_log, dtype=np.int32) for ball_log in ball_logs]) if ball_logs else np.zeros(0, dtype=np.int32)
+	return (np.repeat(np.arange(len(ball_logs), dtype=np.int32), lengths),) + unpack_balls(packed)
+
+# Scorecards of many innings in one vectorized pass: an (innings, players) stack for one side
+def batting_scorecards(ball_logs, batting_size):
+	(innings, striker_slots, _, codes) = _unpack_logs(ball_logs)
+	return _tally(innings, striker_slots, codes, len(ball_logs), batting_size, BATTING_DELTAS, BATTING_DTYPE)
+
+def bowling_scorecards(ball_logs, bowling_size):
+	(innings, _, bowler_slots, codes) = _unpack_logs(ball_logs)
+	return _tally(innings, bowler_slots, codes, len(ball_logs), bowling_size, BOWLING_DELTAS, BOWLING_DTYPE)
+
+class InningsScorecard:
+	__slots__ = ("batting", "bowling")
+	def __init__(self, batting_size, bowling_size):
+		self.batting = np.zeros(batting_size, dtype=BATTING_DTYPE)
+		self.bowling = np.zeros(bowling_size, dtype=BOWLING_DTYPE)
+
+	def record(self, striker_slot, bowler_slot, code):
+		counts(self.batting)[striker_slot] += BATTING_DELTAS[code]
+		counts(self.bowling)[bowler_slot] += BOWLING_DELTAS[code]
+
+	@classmethod
+	def from_packed(cls, packed, batting_size, bowling_size):
+		scorecard = cls.__new__(cls)
+		scorecard.batting = batting_scorecards([packed], batting_size)[0]
+		scorecard.bowling = bowling_scorecards([packed], bowling_size)[0]
+		return scorecard
+
+	def to_dict(self, batting_team, fielding_team):
+		# By player id, for the stats API; players who did not bat or bowl are left out
+		return {
+			"batting": {player.player_id: dict(zip(BATTING_DTYPE.names, map(int, row))) for (player, row, came_in) in zip(batting_team.players, counts(self.batting), batted(self.batting)) if came_in},
+			"bowling": {player.player_id: dict(zip(BOWLING_DTYPE.names, map(int, row))) for (player, row) in zip(fielding_team.players, counts(self.bowling)) if row.any()}}
+
+def reduce_batting(batting_stack):
+	# Totals per batter slot over every innings in the stack, and the innings each one batted in
+	return (np.add.reduce(counts(batting_stack), axis=0, dtype=np.int64), np.add.reduce(batted(batting_stack), axis=0, dtype=np.int64))
+
+def reduce_bowling(bowling_stack):
+	return np.add.reduce(counts(bowling_stack), axis=0, dtype=np.int64)
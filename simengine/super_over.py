@@ -1,32 +1,17 @@
 from simengine.global_helpers import overs_formatted
 from simengine.batting_score import BattingScore
 from simengine.bowling_figures import BowlingFigures
+from simengine.rng import resolve_rng
 
 class SuperOverInnings:
-	innings_no = 1
-	batting_team = None
-	fielding_team = None
-	on_strike_batsman = None
-	off_strike_batsman = None
-	third_batsman = None
-	current_bowler = None
-	is_free_hit = False
-	is_batsman_aggression_adjusted_for_free_hit = False
-	adjusted_batsman = None
-	deliveries = 0
-	total_runs = 0
-	total_wickets = 0
-	target = -1
-	boosting_aggression = False
-	easy_bowling_on = False
-	boost_factor = 0
-	max_overs = 1
+	__slots__ = ("innings_no", "batting_team", "fielding_team", "on_strike_batsman", "off_strike_batsman", "third_batsman", "current_bowler", "is_free_hit", "is_batsman_aggression_adjusted_for_free_hit", "adjusted_batsman", "deliveries", "total_runs", "total_wickets", "target", "boosting_aggression", "easy_bowling_on", "boost_factor", "max_overs", "dismissed_batsmen")
 	def __init__(self, innings_no, batting_team, fielding_team, target, easy_bowling_on):
 		self.innings_no = innings_no
 		self.batting_team = batting_team
 		self.fielding_team = fielding_team
 		self.on_strike_batsman = None
 		self.off_strike_batsman = None
+		self.third_batsman = None
 		self.current_bowler = None
 		self.is_free_hit = False
 		self.is_batsman_aggression_adjusted_for_free_hit = False
@@ -39,6 +24,7 @@ class SuperOverInnings:
 		self.easy_bowling_on = easy_bowling_on
 		self.boost_factor = 0
 		self.max_overs = 1
+		self.dismissed_batsmen = []
 
 	def set_batsmen(self, opener1, opener2, third_batsman):
 		self.on_strike_batsman = opener1
@@ -123,11 +109,33 @@ class SuperOverInnings:
 	def wicket(self, method, fielder):
 		self.deliveries += 1
 		self.total_wickets += 1
+		self.dismissed_batsmen.append(self.on_strike_batsman)
 		if self.boosting_aggression:
 			for i in range(self.boost_factor):
 				self.on_strike_batsman.batting_aggr /= 1.2
 
 
+	def record_delivery(self, delivery_result):
+		# Applies a DeliveryResult; returns True if it was a legal delivery
+		if delivery_result.delivery_type == "wide_ball":
+			self.wide_ball()
+			return False
+		if delivery_result.delivery_type == "no_ball":
+			self.no_ball()
+		else:
+			self.is_free_hit = False
+		if delivery_result.is_wicket:
+			self.wicket(delivery_result.dismissal_type, None)
+		else:
+			SUPER_OVER_RUNS_EVENTS[delivery_result.runs_scored](self)
+		return delivery_result.delivery_type != "no_ball"
+
+	def is_complete(self):
+		return self.total_wickets >= 2 or self.deliveries >= 6 or (self.target > 0 and self.total_runs >= self.target)
+
+	def to_dict(self):
+		return {"team": self.batting_team.short_name, "runs": self.total_runs, "wickets": self.total_wickets, "deliveries": self.deliveries}
+
 	def boost_aggression(self):
 		self.on_strike_batsman.batting_aggr *= 1.2
 		self.off_strike_batsman.batting_aggr *= 1.2
@@ -162,6 +170,9 @@ class SuperOverInnings:
 		print("\n\n")
 
 
+SUPER_OVER_RUNS_EVENTS = {0: SuperOverInnings.dot, 1: SuperOverInnings.single, 2: SuperOverInnings.two_runs, 3: SuperOverInnings.three_runs, 4: SuperOverInnings.four_runs, 6: SuperOverInnings.six_runs}
+
+
 class SuperOver:
 	first_team = None
 	second_team = None
@@ -182,3 +193,70 @@ class SuperOver:
 	def set_second_over(self):
 		self.second_team_over = SuperOverInnings(2, self.second_team, self.first_team, self.first_team_over.total_runs + 1, self.easy_bowling_on)
 		return self.second_team_over
+
+	def play(self, matchup_tables, rng=None, policy=None, unavailable_batters=(), unavailable_bowlers=()):
+		# Plays both overs headlessly; matchup_tables is keyed by batting team_id, as in MatchRunner
+		rng = resolve_rng(rng)
+		policy = policy or AutoSuperOverPolicy()
+		play_super_over_innings(self.set_first_over(), matchup_tables[self.first_team.team_id], rng, policy, unavailable_batters, unavailable_bowlers)
+		play_super_over_innings(self.set_second_over(), matchup_tables[self.second_team.team_id], rng, policy, unavailable_batters, unavailable_bowlers)
+		return self.winner()
+
+	def winner(self):
+		if self.second_team_over.total_runs > self.first_team_over.total_runs:
+			return self.second_team
+		if self.first_team_over.total_runs > self.second_team_over.total_runs:
+			return self.first_team
+		return None
+
+	def to_dict(self):
+		return {"first": self.first_team_over.to_dict(), "second": self.second_team_over.to_dict()}
+
+
+# HEADLESS SUPER OVERS
+
+class AutoSuperOverPolicy:
+	# The three best hitters bat and the best available bowler bowls
+	def choose_batters(self, innings, eligible_batsmen):
+		return sorted(eligible_batsmen, key=lambda player: (player.batting_skill["pace"] + player.batting_skill["spin"]) * player.batting_aggr, reverse=True)[:3]
+
+	def choose_bowler(self, innings, eligible_bowlers):
+		return max(eligible_bowlers, key=lambda player: player.bowling_skill)
+
+def play_super_over_innings(innings, table, rng, policy, unavailable_batters=(), unavailable_bowlers=()):
+	# Players dismissed in, or bowling, an earlier tied super over sit out the next one, unless that leaves too few
+	batters = [player for player in innings.get_eligible_batsmen() if player.player_id not in unavailable_batters]
+	if len(batters) < 3:
+		batters = innings.get_eligible_batsmen()
+	bowlers = [player for player in innings.get_eligible_bowlers() if player.player_id not in unavailable_bowlers]
+	if not bowlers:
+		bowlers = innings.get_eligible_bowlers()
+	innings.set_batsmen(*policy.choose_batters(innings, batters))
+	innings.set_bowler(policy.choose_bowler(innings, bowlers))
+	bowler_slot = table.fielder_slots[innings.current_bowler.player_id]
+	while not innings.is_complete():
+		# Same draws as MatchRunner.play_innings: a fielder, then the delivery
+		fielder_slot = int(rng.random() * 11)
+		delivery_result = table.lookup_slots(table.batter_slots[innings.on_strike_batsman.player_id], bowler_slot, fielder_slot).delivery(rng.random(), innings.is_free_hit)
+		innings.record_delivery(delivery_result)
+		if delivery_result.is_wicket and not innings.is_complete():
+			innings.next_batsman()
+	return innings
+
+def resolve_super_overs(first_team, second_team, matchup_tables, rng=None, policy=None, max_super_overs=None, easy_bowling_on=False):
+	# first_team bats first (the side that batted second in the match). Tied super overs are repeated
+	# with the order reversed; returns (winner or None if still tied after max_super_overs, [SuperOver])
+	rng = resolve_rng(rng)
+	super_overs = []
+	(unavailable_batters, unavailable_bowlers) = (set(), set())
+	while max_super_overs is None or len(super_overs) < max_super_overs:
+		super_over = SuperOver(first_team, second_team, easy_bowling_on)
+		super_overs.append(super_over)
+		winner = super_over.play(matchup_tables, rng, policy, unavailable_batters, unavailable_bowlers)
+		if winner is not None:
+			return (winner, super_overs)
+		for innings in (super_over.first_team_over, super_over.second_team_over):
+			unavailable_batters.update(player.player_id for player in innings.dismissed_batsmen)
+			unavailable_bowlers.add(innings.current_bowler.player_id)
+		(first_team, second_team) = (second_team, first_team)
+	return (None, super_overs)
@@ -0,0 +1,228 @@
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+from simengine.formats import get_format
+from simengine.locations import get_home_ground_code, ground_adjustments
+from simengine.match_runner import MatchRunner
+from simengine.player_and_team import PlayerObject, TeamObject
+from simengine.rng import MatchRNG
+
+# Simulates whole competitions: a round robin league followed by a seeded knockout, repeated
+# over many seasons and spread across worker processes by fixture, so each pairing's matchup
+# tables are compiled once per run. Every fixture is played at the home team's ground, with the
+# ground adjustments applied once per pairing as views of the squads (TeamObject.adjusted), so
+# the league teams themselves are never modified.
+
+
+# SQUADS
+
+def load_squads(path="players_to_import.csv"):
+	# The CSV written by create_import_team_files.py from team_lists.txt and all_squads.csv
+	teams = {}
+	with open(path, "r", encoding="utf-8") as squads_file:
+		for (row_number, row) in enumerate(csv.DictReader(squads_file), start=1):
+			(team_name, short_name, players) = teams.setdefault(row["team_short"].strip(), (row["team_name"].strip(), row["team_short"].strip(), []))
+			players.append(PlayerObject(row_number, row["name"].strip(), float(row["batting_vs_pace"]), float(row["batting_vs_spin"]), float(row["batting_aggression"]), float(row["bowling_skill"]), float(row["fielding_skill"]), row["is_wicketkeeper"].strip() == "True", row["is_captain"].strip() == "True", row["bowling_type"].strip().lower()))
+	return [TeamObject(team_id, team_name, short_name, False, players) for (team_id, (team_name, short_name, players)) in enumerate(teams.values(), start=1)]
+
+def teams_from_models(teams):
+	# Same conversion as CricketGameEngine._build_team, for Team rows from the database; only full elevens can play
+	return [TeamObject(team.id, team.full_name, team.short_name, False, [PlayerObject(player.id, player.name, player.batting_vs_pace, player.batting_vs_spin, player.batting_aggression, player.bowling_skill, player.fielding_skill, player.is_wicketkeeper, player.is_captain, player.bowling_type) for player in team.players]) for team in teams if len(team.players) == 11]
+
+
+def home_fixture_runner(home_team, away_team, match_format, easy_bowling_on, conditions_rng):
+	# Ground adjustments give the fixture its own views of the teams, so the squads are shared, never copied.
+	# An empty location means the home team's ground (get_home_ground_code)
+	((home_team, away_team), _) = ground_adjustments(home_team, away_team, "", conditions_rng)
+	return MatchRunner(home_team, away_team, match_format, easy_bowling_on)
+
+
+# RESULTS
+
+class SeasonResult:
+	def __init__(self, standings, points, qualified, finalists, champion):
+		# Team indexes, league leader first
+		self.standings = standings
+		self.points = points
+		self.qualified = qualified
+		self.finalists = finalists
+		self.champion = champion
+
+class TournamentSummary:
+	def __init__(self, team_count):
+		self.team_count = team_count
+		self.seasons = 0
+		self.points_counts = [{} for _ in range(team_count)]
+		self.position_counts = [[0] * team_count for _ in range(team_count)]
+		self.qualified_counts = [0] * team_count
+		self.final_counts = [0] * team_count
+		self.title_counts = [0] * team_count
+
+	def add(self, season):
+		self.seasons += 1
+		for (position, team) in enumerate(season.standings):
+			self.position_counts[team][position] += 1
+		for (team, points) in enumerate(season.points):
+			self.points_counts[team][points] = self.points_counts[team].get(points, 0) + 1
+		for team in season.qualified:
+			self.qualified_counts[team] += 1
+		for team in season.finalists:
+			self.final_counts[team] += 1
+		self.title_counts[season.champion] += 1
+
+	def merge(self, other):
+		self.seasons += other.seasons
+		for team in range(self.team_count):
+			for (points, count) in other.points_counts[team].items():
+				self.points_counts[team][points] = self.points_counts[team].get(points, 0) + count
+			for position in range(self.team_count):
+				self.position_counts[team][position] += other.position_counts[team][position]
+			self.qualified_counts[team] += other.qualified_counts[team]
+			self.final_counts[team] += other.final_counts[team]
+			self.title_counts[team] += other.title_counts[team]
+		return self
+
+	def to_dict(self, teams):
+		seasons = max(1, self.seasons)
+		table = []
+		for (team_index, team) in enumerate(teams):
+			points_counts = self.points_counts[team_index]
+			table.append({
+				"team_id": team.team_id,
+				"team": team.name,
+				"short_name": team.short_name,
+				"mean_points": sum(points * count for (points, count) in points_counts.items()) / seasons,
+				"points_distribution": {points: points_counts[points] / seasons for points in sorted(points_counts)},
+				"position_probabilities": [count / seasons for count in self.position_counts[team_index]],
+				"qualification_odds": self.qualified_counts[team_index] / seasons,
+				"final_odds": self.final_counts[team_index] / seasons,
+				"title_odds": self.title_counts[team_index] / seasons})
+		table.sort(key=lambda row: (row["title_odds"], row["mean_points"]), reverse=True)
+		return {"seasons": self.seasons, "teams": table}
+
+
+# TOURNAMENT
+
+class Tournament:
+	def __init__(self, teams, match_format="T20", rounds=2, playoff_teams=4, easy_bowling_on=False, conditions_seed=0, points_for_win=2, points_for_tie=1):
+		if len(teams) < 2:
+			raise ValueError("A tournament needs at least two teams")
+		if playoff_teams < 2 or playoff_teams > len(teams) or playoff_teams & (playoff_teams - 1):
+			raise ValueError("playoff_teams must be a power of two no larger than the number of teams")
+		self.teams = list(teams)
+		self.match_format = get_format(match_format) if isinstance(match_format, str) else match_format
+		self.rounds = rounds
+		self.playoff_teams = playoff_teams
+		self.easy_bowling_on = easy_bowling_on
+		# Pitch conditions for each pairing are drawn once from this seed and shared by every season
+		self.conditions_seed = conditions_seed
+		self.points_for_win = points_for_win
+		self.points_for_tie = points_for_tie
+		# Home and away alternate between rounds
+		self.fixtures = [(home, away) if league_round % 2 == 0 else (away, home) for league_round in range(rounds) for (home, away) in combinations(range(len(self.teams)), 2)]
+
+	def get_runner(self, home, away):
+		return home_fixture_runner(self.teams[home], self.teams[away], self.match_format, self.easy_bowling_on, MatchRNG([self.conditions_seed, home, away]))
+
+	def venue(self, home):
+		return get_home_ground_code(self.teams[home].short_name)
+
+	@staticmethod
+	def bracket_order(size):
+		order = [0]
+		while len(order) < size:
+			order = [seed for position in order for seed in (position, 2 * len(order) - 1 - position)]
+		return order
+
+	@staticmethod
+	def seeded_pair(first, second, standings):
+		return (first, second) if standings.index(first) < standings.index(second) else (second, first)
+
+	def play_matches(self, matches, season_rng, resolve_ties=False, executor=None, chunks=1):
+		# matches: {(home, away): [(season, match)]}. Each pairing is played for all its seasons with one
+		# runner, built where it is played and dropped after, so a process only ever holds one set of
+		# matchup tables. Match m of season s uses season_rng.child(s).child(m)
+		pairings = list(matches.items())
+		chunk_size = max(1, -(-len(pairings) // chunks))
+		tasks = [pairings[start:start + chunk_size] for start in range(0, len(pairings), chunk_size)]
+		if executor is None:
+			records = [play_pairings(self, task, season_rng, resolve_ties) for task in tasks]
+		else:
+			records = list(executor.map(play_pairings, [self] * len(tasks), tasks, [season_rng] * len(tasks), [resolve_ties] * len(tasks)))
+		return {key: record for task_records in records for (key, record) in task_records}
+
+	def simulate(self, seasons, seed=None, workers=None, chunks_per_worker=4):
+		# Each match has its own stream, so the summary for a seed does not depend on the number of workers.
+		# The work is split by fixture rather than by season: every season's league is played first,
+		# then the knockouts round by round
+		workers = workers or os.cpu_count() or 1
+		season_rng = MatchRNG(seed)
+		if workers == 1:
+			return self.play_seasons(seasons, season_rng)
+		with ProcessPoolExecutor(max_workers=workers) as executor:
+			return self.play_seasons(seasons, season_rng, executor, workers * chunks_per_worker)
+
+	def play_seasons(self, seasons, season_rng, executor=None, chunks=1):
+		team_count = len(self.teams)
+		league = {}
+		for (match, pairing) in enumerate(self.fixtures):
+			league.setdefault(pairing, []).extend((season, match) for season in range(seasons))
+		points = [[0] * team_count for _ in range(seasons)]
+		# Net run rate: an all-out side is charged its full allocation of balls
+		(runs_for, balls_faced, runs_against, balls_bowled) = ([[0] * team_count for _ in range(seasons)] for _ in range(4))
+		for ((season, _), (first, first_runs, first_balls, second, second_runs, second_balls, winner)) in self.play_matches(league, season_rng, False, executor, chunks).items():
+			for (batting, bowling, runs, balls) in ((first, second, first_runs, first_balls), (second, first, second_runs, second_balls)):
+				runs_for[season][batting] += runs
+				balls_faced[season][batting] += balls
+				runs_against[season][bowling] += runs
+				balls_bowled[season][bowling] += balls
+			if winner is None:
+				points[season][first] += self.points_for_tie
+				points[season][second] += self.points_for_tie
+			else:
+				points[season][winner] += self.points_for_win
+		standings = []
+		for season in range(seasons):
+			net_run_rate = [runs_for[season][team] / max(1, balls_faced[season][team]) - runs_against[season][team] / max(1, balls_bowled[season][team]) for team in range(team_count)]
+			standings.append(sorted(range(team_count), key=lambda team: (points[season][team], net_run_rate[team]), reverse=True))
+
+		# Seeded bracket (1 v N, 2 v N-1, ...), the higher seed at home in every round. Knockout matches
+		# follow the league fixtures in each season's streams
+		brackets = [[table[position] for position in self.bracket_order(self.playoff_teams)] for table in standings]
+		match = len(self.fixtures)
+		while True:
+			finalists = brackets
+			knockouts = {}
+			for (season, bracket) in enumerate(brackets):
+				for slot in range(0, len(bracket), 2):
+					knockouts.setdefault(self.seeded_pair(bracket[slot], bracket[slot + 1], standings[season]), []).append((season, match + slot // 2))
+			winners = self.play_matches(knockouts, season_rng, True, executor, chunks)
+			brackets = [[winners[(season, match + slot)][6] for slot in range(len(bracket) // 2)] for (season, bracket) in enumerate(brackets)]
+			match += len(finalists[0]) // 2
+			if len(brackets[0]) == 1:
+				break
+
+		summary = TournamentSummary(team_count)
+		for season in range(seasons):
+			summary.add(SeasonResult(standings[season], points[season], standings[season][:self.playoff_teams], finalists[season], brackets[season][0]))
+		return summary
+
+def play_pairings(tournament, pairings, season_rng, resolve_ties):
+	# The result of each match as (first, runs, balls, second, runs, balls, winner), by team index
+	records = []
+	total_balls = tournament.match_format.total_balls
+	for ((home, away), matches) in pairings:
+		runner = tournament.get_runner(home, away)
+		for (season, match) in matches:
+			result = runner.play(season_rng.child(season).child(match), resolve_ties)
+			(first, second) = (home, away) if result.batting_first is runner.home_team else (away, home)
+			(first_balls, second_balls) = (total_balls if innings.total_wickets >= min(10, len(innings.batting_team.players) - 1) else innings.deliveries for innings in (result.first_innings, result.second_innings))
+			winner = None if result.winner is None else home if result.winner is runner.home_team else away
+			records.append(((season, match), (first, result.first_innings.total_runs, first_balls, second, result.second_innings.total_runs, second_balls, winner)))
+	return records
+
+def simulate_tournament(teams, seasons=1000, seed=None, workers=None, **options):
+	tournament = Tournament(teams, **options)
+	return tournament.simulate(seasons, seed, workers).to_dict(tournament.teams)
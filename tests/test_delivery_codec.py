@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from simengine import delivery_codec as codec
+from simengine import joint_outcomes as jo
+from simengine.delivery_result import DeliveryResult
+from simengine.innings import InningsState
+from simengine.match_runner import MatchRunner
+from simengine.rng import MatchRNG
+from simengine.tournament import load_squads
+
+# A delivery blob must give back every ball it was written from, and the scorecard it decodes to must be
+# the one InningsState builds from the same deliveries.
+
+BATTING_IDS = list(range(101, 112))
+BOWLING_IDS = list(range(201, 212))
+SEED = 7
+
+# Every leaf of the joint outcome tree, for pace and spin bowlers, with and without a free hit
+LEAF_RESULTS = sorted({fields for results in jo.LEAF_RESULTS.values() for fields in results}, key=repr)
+
+def test_header_round_trip():
+	blob = codec.new_blob(BATTING_IDS, BOWLING_IDS)
+	assert codec.read_header(blob) == (tuple(BATTING_IDS), tuple(BOWLING_IDS), len(blob))
+	assert codec.delivery_count(blob) == 0
+	assert codec.delivery_count(None) == 0
+
+def test_roster_cap():
+	codec.new_blob(list(range(codec.MAX_ROSTER)), BOWLING_IDS)
+	with pytest.raises(ValueError):
+		codec.new_blob(list(range(codec.MAX_ROSTER + 1)), BOWLING_IDS)
+	with pytest.raises(ValueError):
+		codec.new_blob(BATTING_IDS, list(range(codec.MAX_ROSTER + 1)))
+
+def test_unknown_version():
+	blob = codec.new_blob(BATTING_IDS, BOWLING_IDS)
+	with pytest.raises(ValueError):
+		codec.read_header(bytes([codec.VERSION + 1]) + blob[1:])
+
+@pytest.mark.parametrize("fields", LEAF_RESULTS)
+def test_leaf_round_trip(fields):
+	delivery_result = DeliveryResult(*fields)
+	# The last slot of each roster, so every bit of the slot fields is exercised
+	fielder_id = BOWLING_IDS[-1] if delivery_result.fielder_involved else None
+	blob = codec.append_delivery(codec.new_blob(BATTING_IDS, BOWLING_IDS), BATTING_IDS[-1], BATTING_IDS[0], BOWLING_IDS[-2], fielder_id, delivery_result)
+	assert codec.delivery_count(blob) == 1
+	[record] = codec.delivery_records(blob, 6)
+	assert (record["striker_id"], record["non_striker_id"], record["bowler_id"], record["fielder_id"]) == (BATTING_IDS[-1], BATTING_IDS[0], BOWLING_IDS[-2], fielder_id)
+	assert (record["delivery_type"], record["stroke_type"], record["runs_scored"], record["extras"], record["is_wicket"], record["dismissal_type"], record["fielder_involved"]) == fields
+	assert (record["total_runs_after"], record["wickets_after"]) == (delivery_result.runs_scored + delivery_result.extras, int(delivery_result.is_wicket))
+
+def test_innings_scorecard_matches_innings_state(monkeypatch):
+	# Writes the blob the simulate-delivery route would write for each ball of a simulated innings
+	(home, away) = load_squads()[:2]
+	runner = MatchRunner(home, away, "T20")
+	blobs = {}
+	innings_states = {}
+	record_delivery = InningsState.record_delivery
+	def recording(innings, delivery_result, fielder, wicketkeeper):
+		(batting_team, fielding_team) = (innings.batting_team, innings.fielding_team)
+		blob = blobs.get(innings.innings_no) or codec.new_blob([player.player_id for player in batting_team.players], [player.player_id for player in fielding_team.players])
+		involved = {"fielder": fielder, "wicketkeeper": wicketkeeper}.get(delivery_result.fielder_involved)
+		blobs[innings.innings_no] = codec.append_delivery(blob, innings.on_strike_batsman.player_id, innings.off_strike_batsman.player_id, innings.current_bowler.player_id, involved.player_id if involved else None, delivery_result)
+		innings_states[innings.innings_no] = innings
+		return record_delivery(innings, delivery_result, fielder, wicketkeeper)
+	monkeypatch.setattr(InningsState, "record_delivery", recording)
+	runner.play(MatchRNG(SEED))
+	assert sorted(blobs) == [1, 2]
+	for (innings_no, blob) in blobs.items():
+		innings = innings_states[innings_no]
+		(batting_ids, bowling_ids, scorecard, dismissals) = codec.innings_scorecard(blob)
+		expected = innings.scorecard()
+		assert np.array_equal(scorecard.batting, expected.batting)
+		assert np.array_equal(scorecard.bowling, expected.bowling)
+		assert len(dismissals) == innings.total_wickets
+		records = codec.delivery_records(blob, runner.match_format.balls_per_over)
+		assert (records[-1]["total_runs_after"], records[-1]["wickets_after"]) == (innings.total_runs, innings.total_wickets)
@@ -0,0 +1,61 @@
+from dataclasses import astuple
+
+import numpy as np
+import pytest
+
+from simengine import events
+from simengine import joint_outcomes as jo
+from simengine import outcomes as oc
+from simengine.rng import MatchRNG
+
+# events.delivery samples the compiled joint distribution; events.delivery_tree walks the original
+# bowl -> stroke -> miss/hit/slog -> caught tree. Both must give the same outcome frequencies.
+
+DELIVERIES = 40000
+# Upper 0.05% point of the chi-square distribution; the seeds are fixed, so the tests are deterministic
+Z_CRITICAL = 3.29
+
+# (batting vs pace, batting vs spin, aggression, bowling, bowling type, keeper, fielder, free hit, easy bowling, overs)
+MATCHUPS = [
+	(75, 70, 60, 80, "pace", 80, 70, False, False, 20),
+	(60, 85, 90, 70, "spinner", 75, 65, False, False, 20),
+	# A weak bowler: adjust_miss_probs goes negative here
+	(90, 90, 95, 25, "pace", 60, 50, False, False, 50),
+	(55, 50, 40, 85, "spinner", 85, 80, True, True, 10)]
+
+def chi_square_critical(degrees_of_freedom):
+	# Wilson-Hilferty approximation
+	scale = 2 / (9 * degrees_of_freedom)
+	return degrees_of_freedom * (1 - scale + Z_CRITICAL * scale ** 0.5) ** 3
+
+def outcome_counts(sampler, matchup, seed):
+	rng = MatchRNG(seed)
+	codes = [jo.get_outcome_code(astuple(sampler(*matchup, rng))) for _ in range(DELIVERIES)]
+	return np.bincount(codes, minlength=len(oc.OUTCOME_NAMES))
+
+@pytest.mark.parametrize("matchup", MATCHUPS)
+def test_tree_matches_exact_distribution(matchup):
+	distribution = jo.create_joint_distribution(*matchup[:7], *matchup[8:])
+	expected = DELIVERIES * np.array(distribution.outcome_probabilities(matchup[7]))
+	observed = outcome_counts(events.delivery_tree, matchup, 1)
+	assert observed[expected == 0].sum() == 0
+	# Outcomes expected fewer than five times are pooled into one bin
+	(rare, common) = (expected < 5, expected >= 5)
+	observed = np.append(observed[common], observed[rare].sum())
+	expected = np.append(expected[common], expected[rare].sum())
+	(observed, expected) = (observed[expected > 0], expected[expected > 0])
+	statistic = ((observed - expected) ** 2 / expected).sum()
+	assert statistic < chi_square_critical(len(expected) - 1)
+
+@pytest.mark.parametrize("matchup", MATCHUPS)
+def test_delivery_matches_tree(matchup):
+	# Two-sample test of homogeneity between the compiled sampler and the tree
+	counts = np.array([outcome_counts(events.delivery, matchup, 2), outcome_counts(events.delivery_tree, matchup, 3)])
+	counts = counts[:, counts.sum(axis=0) >= 10]
+	expected = counts.sum(axis=0) * counts.sum(axis=1, keepdims=True) / counts.sum()
+	statistic = ((counts - expected) ** 2 / expected).sum()
+	assert statistic < chi_square_critical(counts.shape[1] - 1)
+
+def test_seeded_delivery_is_reproducible():
+	(first, second) = (MatchRNG(7), MatchRNG(7))
+	assert [events.delivery(*MATCHUPS[0], first) for _ in range(1000)] == [events.delivery(*MATCHUPS[0], second) for _ in range(1000)]
@@ -0,0 +1,86 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from simengine import replay
+from simengine.tournament import load_squads
+
+# A seeded match played delivery by delivery through CricketGameEngine, as the routes play it, must come back
+# ball for ball from its decision log alone. The engine imports the database models, so this needs Flask-SQLAlchemy
+
+pytest.importorskip("flask_sqlalchemy")
+cricket_engine = pytest.importorskip("cricket_engine")
+
+SEED = 123
+# Every seventeenth delivery names its fielder, the rest draw one from the match stream
+NAMED_FIELDER_EVERY = 17
+REWIND_BALLS = [0, 1, 50, 119, 200]
+
+def team_row(team):
+	# The Team and Player rows CricketGameEngine._build_team reads, without a database
+	players = [SimpleNamespace(id=player.player_id, name=player.name, batting_vs_pace=player.batting_skill.pace, batting_vs_spin=player.batting_skill.spin, batting_aggression=player.batting_aggr, bowling_skill=player.bowling_skill, fielding_skill=player.fielding_skill, is_wicketkeeper=player.is_wicketkeeper, is_captain=player.is_captain, bowling_type=player.bowler_type) for player in team.players]
+	return SimpleNamespace(id=team.team_id, full_name=team.name, short_name=team.short_name, players=players)
+
+def new_engine():
+	(home, away) = load_squads()[:2]
+	match = SimpleNamespace(match_id=1, match_type="T20", team1=team_row(home), team2=team_row(away), location_short_code=None)
+	engine = cricket_engine.CricketGameEngine(match, SEED)
+	engine.match.batting_second_id = away.team_id
+	return engine
+
+def play_match(engine):
+	# Returns every delivery with the running score after it
+	engine.toss(engine.game.home_team.team_id, "heads")
+	engine.record_toss_decision("bat")
+	balls_per_over = engine.match_format.balls_per_over
+	deliveries = []
+	for innings in (1, 2):
+		(batting, fielding) = (engine.game.home_team, engine.game.away_team) if innings == 1 else (engine.game.away_team, engine.game.home_team)
+		order = [player.player_id for player in batting.players]
+		bowlers = [player.player_id for player in fielding.players[-5:]]
+		keeper = next((player for player in fielding.players if player.is_wicketkeeper), fielding.players[0]).player_id
+		(striker, non_striker, next_batter) = (order[0], order[1], 2)
+		(legal_balls, total, wickets) = (0, 0, 0)
+		while legal_balls < engine.max_overs * balls_per_over and wickets < 10:
+			bowler = bowlers[legal_balls // balls_per_over % len(bowlers)]
+			fielder = fielding.players[3].player_id if len(deliveries) % NAMED_FIELDER_EVERY == 0 else None
+			result = engine.simulate_delivery(bowler, striker, non_striker, fielder, keeper, legal_balls // balls_per_over + 1, legal_balls % balls_per_over + 1, innings)
+			legal_balls += result.extras == 0
+			total += result.runs_scored + result.extras
+			wickets += result.is_wicket
+			deliveries.append(((innings, striker, non_striker, bowler, result.runs_scored, result.extras, result.is_wicket, result.dismissal_type, result.fielder_involved), total, wickets))
+			if result.is_wicket:
+				if wickets == 10:
+					break
+				(striker, next_batter) = (order[next_batter], next_batter + 1)
+			elif result.runs_scored % 2:
+				(striker, non_striker) = (non_striker, striker)
+			if result.extras == 0 and legal_balls % balls_per_over == 0:
+				(striker, non_striker) = (non_striker, striker)
+	engine.play_super_overs(SEED, 2)
+	return deliveries
+
+@pytest.fixture(scope="module")
+def live_match():
+	engine = new_engine()
+	deliveries = play_match(engine)
+	return (deliveries, engine.decision_log.to_json())
+
+def test_replay_reproduces_every_delivery(live_match):
+	(deliveries, log) = live_match
+	engine = new_engine()
+	records = list(replay.replay_deliveries(engine, json.loads(log)))
+	replayed = [(record["innings_number"], record["striker_id"], record["non_striker_id"], record["bowler_id"], record["runs_scored"], record["extras"], record["is_wicket"], record["dismissal_type"], record["fielder_involved"]) for record in records]
+	assert replayed == [delivery for (delivery, _, _) in deliveries]
+	# Replaying logs the same decisions again
+	assert engine.decision_log.to_json() == log
+
+@pytest.mark.parametrize("ball", REWIND_BALLS)
+def test_rewind_matches_live_score(live_match, ball):
+	(deliveries, log) = live_match
+	state = replay.rewind(new_engine(), json.loads(log), ball).to_dict()
+	assert state["deliveries"] == ball
+	if ball > 0:
+		(_, total, wickets) = deliveries[ball - 1]
+		assert (state["total_runs"], state["wickets_lost"]) == (total, wickets)